@@ -0,0 +1,122 @@
+"""
+Benchmark of the R718X frame path, from simulated devices to ingest:
+
+simulate   a vectorised fleet model produces --devices x --steps readings as columns
+encode     r718x_codec.encode_frames: columns -> one wire buffer
+decode     r718x_codec.decode_frames: wire buffer -> columns
+uplinks    gateway.decode_uplinks + EventClock.apply: the base64 payloads, device ids and
+           receive times of a gateway batch -> archive rows ready for ingest_rows
+ingest     ingest_rows on the first --ingest rows, into the configured store (optional)
+
+Each stage reports frames per second, the best of --repeat runs.
+
+    python -m Controller.codec_bench --devices 10000 --steps 100
+    STORAGE_BACKEND=duckdb python -m Controller.codec_bench --ingest 200000 --cleanup
+"""
+
+from __future__ import annotations
+import argparse
+import base64
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+from Controller.gateway import EventClock, decode_uplinks
+from Model.r718x_codec import FRAME_B64_LEN, FRAME_SIZE, decode_frames, encode_frames
+
+
+BENCH_PREFIX = "BENCH-"
+
+
+def simulate_fleet(devices: int, steps: int, interval_sec: int = 900, seed: int = 0) -> dict[str, np.ndarray]:
+    """
+    Readings of `devices` bins over `steps` reports, step-major, as encode_frames columns.
+    Each bin fills at its own rate, overflows past 100% and is emptied when its cycle wraps.
+    """
+    rng = np.random.default_rng(seed)
+    n = devices * steps
+    t = np.repeat(np.arange(steps, dtype=np.float64), devices)
+    rate = np.tile(rng.uniform(0.5, 4.0, devices), steps) * interval_sec / 3600
+    phase = np.tile(rng.uniform(0, 110, devices), steps)
+    level = (phase + rate * t) % 110
+    prev = (phase + rate * (t - 1)) % 110
+    hours = t * interval_sec / 3600
+    return {
+        "fill_level_percent": np.minimum(level, 100.0),
+        "temperature_c": 15 + 7 * np.sin(2 * np.pi * hours / 24) + rng.normal(0, 0.2, n),
+        "battery_v": np.tile(rng.uniform(3.3, 3.6, devices), steps) - 5e-6 * hours,
+        "fill_threshold": np.full(n, 85, dtype=np.int64),
+        "overflow": level > 100,
+        "overflow_count": np.floor((phase + rate * t) / 110).astype(np.int64),
+        "emptied": (t > 0) & (level < prev),
+    }
+
+
+def _best(fn, repeat: int) -> tuple[float, object]:
+    best, out = float("inf"), None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("--devices", type=int, default=10_000)
+    ap.add_argument("--steps", type=int, default=100, help="reports per device")
+    ap.add_argument("--interval", type=int, default=900, help="seconds between a device's reports")
+    ap.add_argument("--uplink-batch", type=int, default=100_000, help="frames per gateway batch in the uplinks stage")
+    ap.add_argument("--ingest", type=int, default=0, help="also ingest this many of the uplinks stage rows into the configured store")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--cleanup", action="store_true", help="delete the ingested rows afterwards")
+    ap.add_argument("--json", help="also write the report to this file")
+    args = ap.parse_args(argv)
+
+    n = args.devices * args.steps
+    report: dict[str, object] = {"frames": n}
+
+    def rate(stage: str, seconds: float, frames: int):
+        report[stage] = {"seconds": round(seconds, 4), "frames_per_sec": round(frames / seconds) if seconds else None}
+        print(f"{stage:<9} {frames:>12,} frames  {seconds:8.3f} s  {frames / seconds / 1e6:8.2f} M frames/s")
+
+    sec, cols = _best(lambda: simulate_fleet(args.devices, args.steps, args.interval), args.repeat)
+    rate("simulate", sec, n)
+    sec, buf = _best(lambda: encode_frames(cols), args.repeat)
+    rate("encode", sec, n)
+    sec, decoded = _best(lambda: decode_frames(buf), args.repeat)
+    rate("decode", sec, n)
+    assert np.array_equal(decoded["emptied"], cols["emptied"])
+
+    #What the gateway's event loop hands a shard: ids, receive times and 16 character payloads
+    m = min(args.uplink_batch, n)
+    b64 = base64.b64encode(buf[:m * FRAME_SIZE]).decode()
+    payloads = [b64[i:i + FRAME_B64_LEN] for i in range(0, len(b64), FRAME_B64_LEN)]
+    ids = [f"{BENCH_PREFIX}{i % args.devices + 1:05d}" for i in range(m)]
+    start = pd.Timestamp.now(tz="UTC").floor("s") - pd.Timedelta(seconds=args.steps * args.interval)
+    stamps = start + pd.to_timedelta((np.arange(m) // args.devices) * args.interval, unit="s")
+    times = [t.isoformat() for t in stamps]
+    sec, rows = _best(lambda: EventClock().apply(decode_uplinks(ids, times, payloads)), args.repeat)
+    rate("uplinks", sec, m)
+
+    if args.ingest:
+        from Model.ingest import ingest_rows
+        from Model import repository as repo
+        batch = rows.iloc[:args.ingest]
+        t0 = time.perf_counter()
+        inserted = ingest_rows(batch)
+        rate("ingest", time.perf_counter() - t0, len(batch))
+        report["ingest"]["inserted"] = inserted
+        if args.cleanup:
+            print(f"Removed {repo.delete_sensor_rows(BENCH_PREFIX)} benchmark archive rows")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+if __name__ == "__main__":
+    main()
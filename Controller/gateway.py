@@ -0,0 +1,415 @@
+"""
+Ingest gateway for physical R718X bins: the HTTP endpoint a LoRaWAN network server's
+webhook posts uplinks to.
+
+POST GATEWAY_PATH   one uplink, or a JSON list of them, as sent by The Things Stack (v3)
+                    or ChirpStack (v4). Replies 202 as soon as the readings are queued,
+                    before they are committed; 503 + Retry-After when GATEWAY_MAX_PENDING
+                    rows are already waiting (the network server retries), 400 on bad JSON.
+GET  /healthz       counters as JSON
+
+Sensors are sharded over GATEWAY_WORKERS by crc32(sensor_id); each shard batches its
+queue (GATEWAY_BATCH_ROWS / GATEWAY_BATCH_WAIT_MS) and has one batch in flight on the
+worker pool, so a sensor's readings reach the estimators in order while shards write
+in parallel. The event loop only splits envelopes; the pool decodes a whole batch with
+Model.r718x_codec.decode_frames into the NetvoxR718x.to_dict() fields and writes the
+batch through Model.ingest.ingest_rows as one DataFrame.
+
+    python -m Controller.gateway
+    python -m Controller.lns_standin --devices 2000 --rate 3000   (local network server stand-in)
+"""
+
+from __future__ import annotations
+import asyncio
+import base64
+import binascii
+import json
+import os
+import signal
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Mapping, Optional
+
+import numpy as np
+import pandas as pd
+
+from Model import logs, metrics
+from Model import repository as repo
+from Model.ingest import ingest_rows
+from Model.r718x_codec import FRAME_B64_LEN, decode_frames
+from Model.storage import ARCHIVE_COLUMNS
+
+
+# === CONFIG ===
+GATEWAY_HOST = os.environ.get("GATEWAY_HOST", "0.0.0.0")
+GATEWAY_PORT = int(os.environ.get("GATEWAY_PORT", os.environ.get("PORT", "8080")))
+GATEWAY_PATH = os.environ.get("GATEWAY_PATH", "/uplinks")
+#Shared secret the webhook sends as "Authorization: Bearer <token>"; unset accepts any caller
+GATEWAY_TOKEN = os.environ.get("GATEWAY_TOKEN") or None
+GATEWAY_WORKERS = int(os.environ.get("GATEWAY_WORKERS", "4"))
+GATEWAY_BATCH_ROWS = int(os.environ.get("GATEWAY_BATCH_ROWS", "2000"))
+GATEWAY_BATCH_WAIT_MS = int(os.environ.get("GATEWAY_BATCH_WAIT_MS", "200"))
+GATEWAY_MAX_PENDING = int(os.environ.get("GATEWAY_MAX_PENDING", "100000"))
+GATEWAY_MAX_BODY = int(os.environ.get("GATEWAY_MAX_BODY", str(16 * 1024 * 1024)))
+GATEWAY_WRITE_RETRIES = int(os.environ.get("GATEWAY_WRITE_RETRIES", "3"))
+GATEWAY_DRAIN_SEC = float(os.environ.get("GATEWAY_DRAIN_SEC", "30"))
+
+_log = logs.get("gateway")
+
+_REASONS = {200: "OK", 202: "Accepted", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found",
+            405: "Method Not Allowed", 411: "Length Required", 413: "Payload Too Large",
+            431: "Request Header Fields Too Large", 503: "Service Unavailable"}
+
+# === UPLINK DECODING ===
+def uplink_fields(uplink: Mapping) -> tuple[str, Optional[str], str]:
+    """(device id, receive time, base64 payload) of a webhook uplink."""
+    if "uplink_message" in uplink:
+        #The Things Stack v3
+        msg = uplink["uplink_message"]
+        return uplink["end_device_ids"]["device_id"], uplink.get("received_at") or msg.get("received_at"), msg["frm_payload"]
+    if "deviceInfo" in uplink:
+        #ChirpStack v4
+        return uplink["deviceInfo"]["deviceName"], uplink.get("time"), uplink["data"]
+    return uplink["device_id"], uplink.get("received_at"), uplink["payload"]
+
+
+def _frame_bytes(payloads: list[str]) -> tuple[bytes, Optional[list[int]]]:
+    """Joined frames of base64 payloads, and the indexes kept when some weren't base64."""
+    try:
+        return base64.b64decode("".join(payloads), validate=True), None
+    except binascii.Error:
+        keep = []
+        for i, p in enumerate(payloads):
+            try:
+                base64.b64decode(p, validate=True)
+                keep.append(i)
+            except binascii.Error:
+                pass
+        return base64.b64decode("".join(payloads[i] for i in keep)), keep
+
+
+def decode_uplinks(ids: list[str], times: list, payloads: list[str]) -> pd.DataFrame:
+    """
+    Readings for uplinks already split into device ids, receive times and 16 character
+    base64 payloads: one base64 decode and one decode_frames call for the whole batch.
+    Frames that aren't R718X data reports are dropped; the emptied flag is kept.
+    """
+    buf, keep = _frame_bytes(payloads)
+    if keep is not None:
+        ids, times = [ids[i] for i in keep], [times[i] for i in keep]
+    cols = decode_frames(buf, strict=False)
+    valid = cols.pop("valid")
+    ts = pd.to_datetime(pd.Series(times, dtype=object), utc=True, format="ISO8601", errors="coerce")
+    df = pd.DataFrame({
+        "sensor_id": ids,
+        "timestamp": ts.fillna(pd.Timestamp.now(tz="UTC")),
+        **{c: cols[c] for c in ("fill_level_percent", "temperature_c", "battery_v", "fill_threshold",
+                                "overflow", "overflow_count", "emptied")},
+    })
+    return df[valid].reset_index(drop=True)
+
+
+class EventClock:
+    """
+    Per-sensor last_emptied / last_overflow. Frames only flag events, so their times
+    are the receive time of the flagged uplink. Seeded from the archive at startup.
+    apply() only reads the state; commit() advances it once the rows are written, so a
+    dropped batch leaves no event times behind that the archive never saw.
+    """
+
+    def __init__(self):
+        self._emptied: dict[str, pd.Timestamp] = {}
+        self._overflowed: dict[str, pd.Timestamp] = {}
+        self._overflow: dict[str, bool] = {}
+
+    def seed(self, latest: pd.DataFrame):
+        if latest.empty:
+            return
+        sid = latest["sensor_id"].astype(str)
+        for col, known in (("last_emptied", self._emptied), ("last_overflow", self._overflowed)):
+            known.update((s, t) for s, t in zip(sid, pd.to_datetime(latest[col], utc=True)) if pd.notna(t))
+        self._overflow.update(zip(sid, latest["overflow"].fillna(False).astype(bool)))
+
+    def apply(self, batch: pd.DataFrame) -> pd.DataFrame:
+        """Archive rows for decoded readings in arrival order (the state is not changed)."""
+        codes, sensors = pd.factorize(batch["sensor_id"])
+        ts = batch["timestamp"]
+        prev = batch["overflow"].groupby(codes, sort=False).shift(1)
+        known_overflow = np.array([self._overflow.get(s, False) for s in sensors], dtype=bool)
+        prev = prev.where(prev.notna(), pd.Series(known_overflow[codes], index=batch.index)).astype(bool)
+        rising = batch["overflow"] & ~prev
+
+        def latest_at(flag: pd.Series, known: dict) -> pd.Series:
+            at = ts.where(flag).groupby(codes, sort=False).ffill()
+            before = pd.DatetimeIndex([known.get(s) for s in sensors], tz="UTC")
+            return at.fillna(pd.Series(before[codes], index=batch.index))
+
+        return batch.assign(
+            last_emptied=latest_at(batch["emptied"], self._emptied),
+            last_overflow=latest_at(rising, self._overflowed),
+        )[ARCHIVE_COLUMNS]
+
+    def commit(self, rows: pd.DataFrame):
+        """Advance the per-sensor state past rows returned by apply()."""
+        last = rows.drop_duplicates("sensor_id", keep="last")
+        for col, known in (("last_emptied", self._emptied), ("last_overflow", self._overflowed)):
+            at = last[col]
+            known.update(zip(last["sensor_id"][at.notna()], at[at.notna()]))
+        self._overflow.update(zip(last["sensor_id"], last["overflow"]))
+
+
+# === GATEWAY ===
+class Gateway:
+    def __init__(
+        self,
+        *,
+        workers: int = GATEWAY_WORKERS,
+        batch_rows: int = GATEWAY_BATCH_ROWS,
+        batch_wait_ms: int = GATEWAY_BATCH_WAIT_MS,
+        max_pending: int = GATEWAY_MAX_PENDING,
+        write=ingest_rows,
+    ):
+        self.workers = max(1, workers)
+        self.batch_rows = batch_rows
+        self.batch_wait = batch_wait_ms / 1000.0
+        self.max_pending = max_pending
+        self.write = write
+        #One clock per shard: a sensor's rows are only ever decoded by its shard's writer
+        self.clocks = [EventClock() for _ in range(self.workers)]
+        self._shard_of: dict[str, int] = {}
+        self.pending = 0
+        self.closing = False
+        self.stats = dict.fromkeys(
+            ("uplinks", "accepted", "bad_frames", "refused", "batches", "inserted", "write_errors", "dropped"), 0)
+        self._queues: list[asyncio.Queue] = []
+        self._tasks: list[asyncio.Task] = []
+        self._pool: Optional[ThreadPoolExecutor] = None
+
+    # --- pipeline ---
+    def start(self):
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="gateway-write")
+        self._queues = [asyncio.Queue() for _ in range(self.workers)]
+        self._tasks = [asyncio.create_task(self._shard(q, c)) for q, c in zip(self._queues, self.clocks)]
+
+    async def drain(self, timeout: float):
+        """Wait (up to timeout) for queued rows to be written, then stop the shards."""
+        self.closing = True
+        deadline = time.monotonic() + timeout
+        while self.pending and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._pool.shutdown(wait=True)
+        if self.pending:
+            _log.warning("stopped with rows unwritten", extra=logs.fields(pending=self.pending))
+
+    def accept(self, uplinks: list) -> tuple[int, int]:
+        """
+        Queue uplinks on their sensors' shards. Returns (queued, rejected); raises
+        OverflowError when full. Only the envelope is checked here, the frames are
+        decoded in bulk by the shard's writer.
+        """
+        if self.closing or self.pending + len(uplinks) > self.max_pending:
+            self.stats["refused"] += 1
+            raise OverflowError
+        self.stats["uplinks"] += len(uplinks)
+        shards: dict[int, tuple[list, list, list]] = {}
+        bad = 0
+        for u in uplinks:
+            try:
+                sensor_id, received_at, payload = uplink_fields(u)
+            except (KeyError, TypeError, AttributeError):
+                bad += 1
+                continue
+            #A 12 byte frame is exactly 16 base64 characters, never padded
+            if not isinstance(payload, str) or len(payload) != FRAME_B64_LEN or "=" in payload:
+                bad += 1
+                continue
+            sensor_id = str(sensor_id)
+            shard = self._shard_of.get(sensor_id)
+            if shard is None:
+                shard = self._shard_of[sensor_id] = zlib.crc32(sensor_id.encode()) % self.workers
+            ids, times, payloads = shards.setdefault(shard, ([], [], []))
+            ids.append(sensor_id)
+            times.append(received_at)
+            payloads.append(payload)
+        for i, part in shards.items():
+            self._queues[i].put_nowait(part)
+        queued = len(uplinks) - bad
+        self.pending += queued
+        self.stats["accepted"] += queued
+        self.stats["bad_frames"] += bad
+        return queued, bad
+
+    async def _shard(self, q: asyncio.Queue, clock: EventClock):
+        loop = asyncio.get_running_loop()
+        while True:
+            ids, times, payloads = (list(c) for c in await q.get())
+            deadline = loop.time() + self.batch_wait
+            while len(ids) < self.batch_rows:
+                while not q.empty() and len(ids) < self.batch_rows:
+                    more_ids, more_times, more_payloads = q.get_nowait()
+                    ids += more_ids
+                    times += more_times
+                    payloads += more_payloads
+                left = deadline - loop.time()
+                if len(ids) >= self.batch_rows or left <= 0:
+                    break
+                await asyncio.sleep(min(left, 0.01))
+            try:
+                inserted, errors, bad = await loop.run_in_executor(
+                    self._pool, self._write_batch, clock, ids, times, payloads)
+            finally:
+                self.pending -= len(ids)
+            #Counters are only touched on the event loop
+            self.stats["bad_frames"] += bad
+            self.stats["write_errors"] += errors
+            if inserted is None:
+                self.stats["dropped"] += len(ids) - bad
+            else:
+                self.stats["inserted"] += inserted
+                self.stats["batches"] += 1
+
+    def _write_batch(self, clock: EventClock, ids: list, times: list, payloads: list) -> tuple[Optional[int], int, int]:
+        """
+        Decode and write one shard batch on the pool. Returns (rows inserted, or None if
+        the batch was dropped; failed attempts; frames that didn't decode).
+        """
+        try:
+            rows = clock.apply(decode_uplinks(ids, times, payloads))
+        except Exception as e:
+            _log.error("could not decode a batch: %r", e, extra=logs.fields(uplinks=len(ids)))
+            return None, 0, len(ids)
+        bad = len(ids) - len(rows)
+        if rows.empty:
+            return 0, 0, bad
+        for attempt in range(1, GATEWAY_WRITE_RETRIES + 1):
+            try:
+                inserted = self.write(rows) or 0
+            except Exception as e:
+                _log.warning("write failed: %r", e, extra=logs.fields(rows=len(rows), attempt=attempt))
+                if attempt < GATEWAY_WRITE_RETRIES:
+                    time.sleep(min(2 ** attempt * 0.25, 5.0))
+                continue
+            clock.commit(rows)
+            return inserted, attempt - 1, bad
+        _log.error("dropped rows after retries", extra=logs.fields(rows=len(rows), attempts=GATEWAY_WRITE_RETRIES))
+        return None, GATEWAY_WRITE_RETRIES, bad
+
+    # --- HTTP ---
+    def route(self, method: str, path: str, headers: dict, body: bytes) -> tuple[int, dict, dict]:
+        if path == "/healthz":
+            return 200, {**self.stats, "pending": self.pending}, {}
+        if path != GATEWAY_PATH:
+            return 404, {"error": "not found"}, {}
+        if method != "POST":
+            return 405, {"error": "POST uplinks"}, {"Allow": "POST"}
+        if GATEWAY_TOKEN and headers.get("authorization") != f"Bearer {GATEWAY_TOKEN}":
+            return 401, {"error": "bad token"}, {}
+        try:
+            doc = json.loads(body)
+        except ValueError:
+            return 400, {"error": "body is not JSON"}, {}
+        uplinks = doc if isinstance(doc, list) else doc.get("uplinks", [doc]) if isinstance(doc, dict) else None
+        if not isinstance(uplinks, list):
+            return 400, {"error": "expected an uplink or a list of uplinks"}, {}
+        try:
+            queued, bad = self.accept(uplinks)
+        except OverflowError:
+            return 503, {"error": "ingest queue full", "pending": self.pending}, {"Retry-After": "1"}
+        return 202, {"queued": queued, "rejected": bad}, {}
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """HTTP/1.1 with keep-alive and Content-Length bodies, which is all webhooks send."""
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    return
+                except asyncio.LimitOverrunError:
+                    await _respond(writer, 431, {"error": "headers too large"}, {}, keep_alive=False)
+                    return
+                request_line, *lines = head.decode("latin-1").rstrip("\r\n").split("\r\n")
+                try:
+                    method, target, version = request_line.split(" ", 2)
+                except ValueError:
+                    await _respond(writer, 400, {"error": "bad request line"}, {}, keep_alive=False)
+                    return
+                headers = {}
+                for line in lines:
+                    name, _, value = line.partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                if "transfer-encoding" in headers:
+                    await _respond(writer, 411, {"error": "send Content-Length"}, {}, keep_alive=False)
+                    return
+                length = int(headers.get("content-length") or 0)
+                if length > GATEWAY_MAX_BODY:
+                    await _respond(writer, 413, {"error": "body too large"}, {}, keep_alive=False)
+                    return
+                body = await reader.readexactly(length) if length else b""
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                status, doc, extra = self.route(method, target.split("?", 1)[0], headers, body)
+                await _respond(writer, status, doc, extra, keep_alive=keep_alive)
+                if not keep_alive:
+                    return
+        except (asyncio.IncompleteReadError, ConnectionError):
+            return
+        finally:
+            writer.close()
+
+
+async def _respond(writer: asyncio.StreamWriter, status: int, doc: dict, extra: dict, *, keep_alive: bool):
+    body = json.dumps(doc).encode()
+    head = [f"HTTP/1.1 {status} {_REASONS.get(status, '')}", "Content-Type: application/json",
+            f"Content-Length: {len(body)}", f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+    head += [f"{k}: {v}" for k, v in extra.items()]
+    writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+    await writer.drain()
+
+
+# === MAIN ===
+async def serve(gateway: Gateway, host: str = GATEWAY_HOST, port: int = GATEWAY_PORT):
+    loop = asyncio.get_running_loop()
+    try:
+        latest = await loop.run_in_executor(None, repo.fetch_any_latest_snapshot_df)
+        for clock in gateway.clocks:
+            clock.seed(latest)
+        _log.info("seeded event times", extra=logs.fields(sensors=len(latest)))
+    except Exception as e:
+        _log.warning("could not seed event times from the archive: %r", e)
+
+    gateway.start()
+    metrics.gauge("smartbins_gateway_pending_rows", "Accepted uplinks not yet written.").set_function(lambda: gateway.pending)
+    for key in gateway.stats:
+        metrics.gauge(f"smartbins_gateway_{key}", f"Gateway '{key}' count since start.").set_function(
+            lambda key=key: gateway.stats[key])
+    metrics.serve_from_env()
+    server = await asyncio.start_server(gateway.handle, host, port, limit=64 * 1024, backlog=1024)
+    _log.info("listening", extra=logs.fields(
+        address=f"{host}:{port}{GATEWAY_PATH}", workers=gateway.workers, batch_rows=gateway.batch_rows,
+        batch_wait_ms=int(gateway.batch_wait * 1000), max_pending=gateway.max_pending))
+
+    stop = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            pass
+    await stop.wait()
+
+    _log.info("stopping: draining queued rows")
+    server.close()
+    await server.wait_closed()
+    await gateway.drain(GATEWAY_DRAIN_SEC)
+    _log.info("stopped", extra=logs.fields(**gateway.stats))
+
+
+def main():
+    asyncio.run(serve(Gateway()))
+
+
+if __name__ == "__main__":
+    main()
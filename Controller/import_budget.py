@@ -0,0 +1,124 @@
+"""
+Import-time budget for the Streamlit app's modules.
+
+Each module is imported in a fresh interpreter with -X importtime, so its figure is
+the cold-start cost of everything it pulls in. A module fails the check when it
+exceeds its budget, or when it imports a library that should only load on first
+use (DEFERRED). --json saves the report; --baseline compares against a saved one
+so regressions show up per module.
+
+    python -m Controller.import_budget
+    python -m Controller.import_budget --json import_times.json
+    python -m Controller.import_budget --baseline import_times.json --tolerance 0.25
+"""
+
+from __future__ import annotations
+import argparse
+import json
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parents[1]
+
+#Cumulative import time in ms, measured on a dyno with a warm disk cache
+BUDGETS_MS = {
+    "Model.repository": 600,
+    "Model.data_loader": 700,
+    "View.Utilities": 1500,
+    "View.Dashboard": 1600,
+    "View.Analytics": 2200,
+}
+
+#Libraries a module must leave to first use
+DEFERRED = {
+    "Model.repository": ("sqlalchemy", "requests", "psycopg2", "duckdb", "pydeck", "plotly"),
+    "Model.data_loader": ("sqlalchemy", "requests", "psycopg2", "duckdb", "pydeck", "plotly"),
+    "View.Utilities": ("sqlalchemy", "requests", "psycopg2", "duckdb", "pydeck", "plotly"),
+    "View.Dashboard": ("sqlalchemy", "requests", "psycopg2", "duckdb", "plotly"),
+    "View.Analytics": ("sqlalchemy", "requests", "psycopg2", "duckdb", "pydeck"),
+}
+
+
+def measure(module: str) -> dict:
+    """Cold import of module: total ms, self ms per top-level package, packages imported."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        return {"error": (proc.stderr.strip().splitlines() or ["import failed"])[-1]}
+
+    total_us = None
+    by_package: dict[str, int] = defaultdict(int)
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        name = name.strip()
+        by_package[name.split(".")[0]] += int(self_us)
+        if name == module:
+            total_us = int(cumulative_us)
+    return {
+        "ms": round((total_us or 0) / 1000, 1),
+        "packages": {k: round(v / 1000, 1) for k, v in sorted(by_package.items(), key=lambda kv: -kv[1])},
+    }
+
+
+def check(module: str, runs: int, budget_ms: float | None, baseline: dict, tolerance: float) -> dict:
+    results = [measure(module) for _ in range(runs)]
+    if "error" in results[0]:
+        return {"module": module, "ok": False, "problems": [results[0]["error"]]}
+    #The fastest run is the least noisy estimate of the import cost itself
+    best = min(results, key=lambda r: r["ms"])
+    problems = []
+    if budget_ms is not None and best["ms"] > budget_ms:
+        problems.append(f"{best['ms']:.0f} ms over the {budget_ms:.0f} ms budget")
+    eager = [p for p in DEFERRED.get(module, ()) if p in best["packages"]]
+    if eager:
+        problems.append("imports at load time: " + ", ".join(eager))
+    before = (baseline.get(module) or {}).get("ms")
+    if before and best["ms"] > before * (1 + tolerance):
+        problems.append(f"{best['ms']:.0f} ms vs {before:.0f} ms in the baseline")
+    return {"module": module, "ok": not problems, "ms": best["ms"], "budget_ms": budget_ms,
+            "packages": best["packages"], "problems": problems}
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("modules", nargs="*", help="modules to check (default: every budgeted module)")
+    ap.add_argument("--runs", type=int, default=3, help="imports per module; the fastest counts")
+    ap.add_argument("--top", type=int, default=5, help="heaviest packages to list per module")
+    ap.add_argument("--scale", type=float, default=1.0, help="multiply every budget, e.g. for slower machines")
+    ap.add_argument("--baseline", help="earlier --json report to compare against")
+    ap.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown vs the baseline")
+    ap.add_argument("--json", help="write the report to this file")
+    args = ap.parse_args(argv)
+
+    baseline = {}
+    if args.baseline:
+        baseline = {r["module"]: r for r in json.loads(Path(args.baseline).read_text())["modules"]}
+
+    report = []
+    for module in args.modules or list(BUDGETS_MS):
+        budget = BUDGETS_MS.get(module)
+        r = check(module, max(1, args.runs), budget * args.scale if budget else None, baseline, args.tolerance)
+        report.append(r)
+        status = "ok  " if r["ok"] else "FAIL"
+        if "ms" in r:
+            heavy = ", ".join(f"{k} {v:.0f}" for k, v in list(r["packages"].items())[:args.top])
+            print(f"{status} {module:<20} {r['ms']:>7.0f} ms  (budget {r['budget_ms'] or '-'})  {heavy}")
+        else:
+            print(f"{status} {module:<20}")
+        for p in r["problems"]:
+            print(f"       - {p}")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps({"python": sys.version.split()[0], "modules": report}, indent=2))
+    return 0 if all(r["ok"] for r in report) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
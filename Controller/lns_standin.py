@@ -0,0 +1,182 @@
+"""
+Local stand-in for the LoRaWAN network server: simulated R718X devices post their
+uplinks to Controller.gateway in The Things Stack webhook format, and the gateway's
+acceptance rate and webhook latency are reported.
+
+Devices are NetvoxR718x models named LNS-0001 ...; each uplink advances one device
+by --interval seconds of simulated time and encodes it with Model.r718x_codec.
+Uplinks go out in webhook calls of --batch over --connections keep-alive connections,
+paced to --rate uplinks per second (0 = as fast as the gateway accepts them).
+
+    python -m Controller.lns_standin --devices 2000 --rate 3000 --duration 60
+    python -m Controller.lns_standin --rate 0 --batch 200 --connections 16 --cleanup
+"""
+
+from __future__ import annotations
+import argparse
+import asyncio
+import base64
+import json
+import random
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from Model.NetvoxR718x import NetvoxR718x
+
+
+STANDIN_PREFIX = "LNS-"
+
+
+class Devices:
+    """Round-robin over simulated devices, producing webhook uplinks."""
+
+    def __init__(self, count: int, interval_sec: int, seed: int = 0):
+        random.seed(seed)
+        self.interval_sec = interval_sec
+        self.sensors = [
+            NetvoxR718x(
+                sensor_id=f"{STANDIN_PREFIX}{i + 1:04d}",
+                fill_level_percent=random.randint(0, 60),
+                temperature_c=random.uniform(16.0, 24.0),
+                fill_sentivity=random.randint(1, 5),
+            )
+            for i in range(count)
+        ]
+        self._next = 0
+
+    def uplinks(self, n: int) -> list[dict]:
+        out = []
+        for _ in range(n):
+            s = self.sensors[self._next]
+            self._next = (self._next + 1) % len(self.sensors)
+            emptied = s.last_emptied
+            s.simulate_changes(dt_minutes=self.interval_sec // 60, write_interval_seconds=self.interval_sec)
+            s.attempt_empty_event(base_threshold=s.fill_threshold, p_max=0.2)
+            frame = s.to_frame(emptied=s.last_emptied is not emptied)
+            out.append({
+                "end_device_ids": {"device_id": s.sensor_id},
+                "received_at": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
+                "uplink_message": {"f_port": 6, "frm_payload": base64.b64encode(frame).decode()},
+            })
+        return out
+
+
+class Connection:
+    """One keep-alive HTTP/1.1 connection to the gateway."""
+
+    def __init__(self, host: str, port: int, path: str, token: str | None):
+        self.host, self.port, self.path, self.token = host, port, path, token
+        self._reader = self._writer = None
+
+    async def post(self, doc) -> tuple[int, dict]:
+        if self._writer is None:
+            self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        body = json.dumps(doc).encode()
+        head = [f"POST {self.path} HTTP/1.1", f"Host: {self.host}:{self.port}",
+                "Content-Type: application/json", f"Content-Length: {len(body)}"]
+        if self.token:
+            head.append(f"Authorization: Bearer {self.token}")
+        self._writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+        await self._writer.drain()
+        status_line, *lines = (await self._reader.readuntil(b"\r\n\r\n")).decode("latin-1").rstrip().split("\r\n")
+        headers = {k.strip().lower(): v.strip() for k, _, v in (l.partition(":") for l in lines)}
+        reply = await self._reader.readexactly(int(headers.get("content-length") or 0))
+        if headers.get("connection", "").lower() == "close":
+            self.close()
+        return int(status_line.split(" ", 2)[1]), json.loads(reply or b"{}")
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._reader = self._writer = None
+
+
+async def run(args) -> dict:
+    devices = Devices(args.devices, args.interval)
+    conns = [Connection(args.host, args.port, args.path, args.token) for _ in range(args.connections)]
+    latencies: list[float] = []
+    counts = {"sent": 0, "queued": 0, "rejected": 0, "refused_calls": 0, "failed_calls": 0}
+    began = time.monotonic()
+    stop_at = began + args.duration
+
+    async def sender(conn: Connection):
+        while time.monotonic() < stop_at:
+            #Uplink k is due at k / rate; the slot is taken before sleeping so senders don't overlap
+            k = counts["sent"]
+            counts["sent"] += args.batch
+            if args.rate > 0:
+                delay = began + k / args.rate - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            batch = devices.uplinks(args.batch)
+            t0 = time.monotonic()
+            try:
+                status, reply = await conn.post(batch if args.batch > 1 else batch[0])
+            except (ConnectionError, asyncio.IncompleteReadError, OSError) as e:
+                counts["failed_calls"] += 1
+                conn.close()
+                print("WARNING: webhook call failed:", repr(e))
+                await asyncio.sleep(0.5)
+                continue
+            latencies.append(time.monotonic() - t0)
+            if status == 202:
+                counts["queued"] += reply.get("queued", 0)
+                counts["rejected"] += reply.get("rejected", 0)
+            elif status == 503:
+                counts["refused_calls"] += 1
+                await asyncio.sleep(1.0)
+            else:
+                counts["failed_calls"] += 1
+                print(f"WARNING: gateway replied {status}: {reply}")
+
+    await asyncio.gather(*(sender(c) for c in conns))
+    for c in conns:
+        c.close()
+    wall = time.monotonic() - began
+    lat = np.asarray(latencies or [0.0])
+    return {
+        **counts,
+        "seconds": round(wall, 2),
+        "queued_per_sec": round(counts["queued"] / wall, 1) if wall > 0 else None,
+        "webhook_latency_ms": {
+            "n": len(latencies),
+            "p50": round(float(np.percentile(lat, 50)) * 1000, 2),
+            "p95": round(float(np.percentile(lat, 95)) * 1000, 2),
+            "p99": round(float(np.percentile(lat, 99)) * 1000, 2),
+        },
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8080)
+    ap.add_argument("--path", default="/uplinks")
+    ap.add_argument("--token", default=None, help="GATEWAY_TOKEN of the gateway")
+    ap.add_argument("--devices", type=int, default=500)
+    ap.add_argument("--interval", type=int, default=900, help="simulated seconds between a device's uplinks")
+    ap.add_argument("--rate", type=float, default=1000.0, help="uplinks per second; 0 = unthrottled")
+    ap.add_argument("--batch", type=int, default=50, help="uplinks per webhook call")
+    ap.add_argument("--connections", type=int, default=8)
+    ap.add_argument("--duration", type=float, default=30.0, help="seconds to send for")
+    ap.add_argument("--cleanup", action="store_true", help="delete the stand-in's archive rows afterwards")
+    ap.add_argument("--json", help="also write the report to this file")
+    args = ap.parse_args(argv)
+
+    report = asyncio.run(run(args))
+    print(json.dumps(report, indent=2))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.cleanup:
+        from Model import repository as repo
+        #Let the gateway flush its queue first
+        time.sleep(2.0)
+        print(f"Removed {repo.delete_sensor_rows(STANDIN_PREFIX)} stand-in archive rows")
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+"""
+Replay load generator: re-emits archive history (or a generated dataset) through the
+normal ingest path at a speed multiplier and sensor count, and measures
+
+- ingest throughput (rows/s, per-batch write latency)
+- freshness: time from a reading's write until it is visible in
+  repository.fetch_latest_snapshot_df and data_loader.load_live_with_coords
+
+Source readings are fanned out to --sensors replay ids (REPLAY-0001 ...), and their
+times are mapped onto the wall clock as start + (t - t0) / speed, so a 15 minute
+reporting interval replayed at --speed 60 arrives every 15 seconds.
+
+    python -m Controller.replay --source generated --sensors 600 --speed 60 --duration 300
+    python -m Controller.replay --source archive --days 7 --sensors 200 --speed 100 --cleanup
+"""
+
+from __future__ import annotations
+import argparse
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+from Model import logs, repository as repo
+from Model.data_loader import load_live_with_coords
+from Model.ingest import ingest_rows
+from Model.NetvoxR718x import NetvoxR718x
+
+
+REPLAY_PREFIX = "REPLAY-"
+_TIME_COLUMNS = ("timestamp", "last_emptied", "last_overflow")
+
+_log = logs.get("replay")
+
+
+# === SOURCES ===
+def archive_source(days: float) -> pd.DataFrame:
+    since = pd.Timestamp.now(tz="UTC") - pd.Timedelta(days=days)
+    df = repo.fetch_archive_df(since=since)
+    #Never replay earlier replays
+    return df[~df["sensor_id"].astype(str).str.startswith(REPLAY_PREFIX)].drop(columns=["id"], errors="ignore")
+
+
+def generated_source(sensors: int, hours: float, interval_sec: int = 900, seed: int = 0) -> pd.DataFrame:
+    """Synthetic history from the R718x model, interval_sec apart per sensor."""
+    random.seed(seed)
+    t0 = pd.Timestamp.now(tz="UTC").floor("h") - pd.Timedelta(hours=hours)
+    steps = int(hours * 3600 // interval_sec)
+    rows = []
+    for i in range(sensors):
+        s = NetvoxR718x(
+            sensor_id=f"GEN-{i:04d}",
+            fill_level_percent=random.randint(0, 60),
+            temperature_c=random.uniform(16.0, 24.0),
+            fill_sentivity=random.randint(1, 5),
+        )
+        for k in range(steps):
+            ts = t0 + pd.Timedelta(seconds=k * interval_sec + random.randint(0, 30))
+            emptied, overflowed = s.last_emptied, s.last_overflow
+            s.simulate_changes(dt_minutes=interval_sec // 60, write_interval_seconds=interval_sec)
+            s.attempt_empty_event(base_threshold=s.fill_threshold, p_max=0.2)
+            s.update_temperature()
+            #The model stamps events with the wall clock; move them onto the synthetic timeline
+            if s.last_emptied is not emptied:
+                s.last_emptied = ts.to_pydatetime()
+            if s.last_overflow is not overflowed:
+                s.last_overflow = ts.to_pydatetime()
+            row = s.to_dict()
+            row["timestamp"] = ts
+            rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def fan_out(source: pd.DataFrame, sensors: int) -> pd.DataFrame:
+    """Map source sensors onto `sensors` replay ids, cycling through the source's sensors."""
+    src_ids = sorted(source["sensor_id"].astype(str).unique())
+    if not src_ids:
+        return source.iloc[0:0]
+    by_sensor = dict(tuple(source.groupby(source["sensor_id"].astype(str))))
+    parts = []
+    for i in range(sensors):
+        part = by_sensor[src_ids[i % len(src_ids)]].copy()
+        part["sensor_id"] = f"{REPLAY_PREFIX}{i + 1:04d}"
+        parts.append(part)
+    out = pd.concat(parts, ignore_index=True)
+    for c in _TIME_COLUMNS:
+        if c in out.columns:
+            out[c] = pd.to_datetime(out[c], utc=True)
+    return out.sort_values("timestamp", kind="stable").reset_index(drop=True)
+
+
+# === MEASUREMENT ===
+@dataclass
+class FreshnessProbe:
+    """Polls a reader and records, for each written reading, how long until it was visible."""
+    name: str
+    read: Callable[[], dict]
+    every_sec: float
+    lags: list[float] = field(default_factory=list)
+    errors: int = 0
+    polls: int = 0
+
+    def __post_init__(self):
+        self._pending: dict[str, list[tuple[pd.Timestamp, float]]] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"probe-{self.name}", daemon=True)
+
+    def written(self, rows: pd.DataFrame, wall: float):
+        with self._lock:
+            for sid, ts in zip(rows["sensor_id"], rows["timestamp"]):
+                self._pending.setdefault(sid, []).append((ts, wall))
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=30)
+
+    def _run(self):
+        while not self._stop.wait(self.every_sec):
+            try:
+                visible = self.read()
+            except Exception as e:
+                self.errors += 1
+                _log.warning("probe failed: %r", e, extra=logs.fields(probe=self.name))
+                continue
+            seen_at = time.time()
+            self.polls += 1
+            with self._lock:
+                for sid, latest in visible.items():
+                    pending = self._pending.get(sid)
+                    if not pending or pd.isna(latest):
+                        continue
+                    keep = []
+                    for ts, wall in pending:
+                        if ts <= latest:
+                            self.lags.append(seen_at - wall)
+                        else:
+                            keep.append((ts, wall))
+                    self._pending[sid] = keep
+
+    def unseen(self) -> int:
+        with self._lock:
+            return sum(len(v) for v in self._pending.values())
+
+
+def _latest_by_sensor(df: pd.DataFrame, sid_col: str, ts_col: str, unit: str | None = None) -> dict:
+    if df is None or df.empty or sid_col not in df.columns:
+        return {}
+    ts = pd.to_datetime(df[ts_col], unit=unit, utc=True) if unit else pd.to_datetime(df[ts_col], utc=True)
+    return dict(zip(df[sid_col].astype(str), ts))
+
+
+def snapshot_visible(within_seconds: int) -> dict:
+    return _latest_by_sensor(repo.fetch_latest_snapshot_df(within_seconds), "sensor_id", "timestamp")
+
+
+def live_with_coords_visible() -> dict:
+    df = load_live_with_coords()
+    if "DeviceID" not in df.columns:
+        df = df.reset_index()
+    #FRAME_SCHEMA keeps Timestamp as epoch milliseconds
+    return _latest_by_sensor(df, "DeviceID", "Timestamp", unit="ms")
+
+
+def _percentiles(values: list[float]) -> dict:
+    if not values:
+        return {"n": 0}
+    a = np.asarray(values, dtype="float64")
+    return {
+        "n": int(a.size),
+        "p50": round(float(np.percentile(a, 50)), 3),
+        "p95": round(float(np.percentile(a, 95)), 3),
+        "p99": round(float(np.percentile(a, 99)), 3),
+        "max": round(float(a.max()), 3),
+    }
+
+
+# === REPLAY ===
+def replay(
+    readings: pd.DataFrame,
+    *,
+    speed: float,
+    duration_sec: float | None,
+    tick_sec: float = 0.5,
+    path: str = "ingest",
+    probes: list[FreshnessProbe] = (),
+) -> dict:
+    """Emit readings on the mapped wall-clock schedule; returns throughput figures."""
+    write = ingest_rows if path == "ingest" else repo.write_archive_rows
+    t0 = readings["timestamp"].min()
+    start = pd.Timestamp.now(tz="UTC")
+    offsets = ((readings["timestamp"] - t0).dt.total_seconds() / speed).to_numpy()
+    if duration_sec:
+        keep = offsets <= duration_sec
+        readings, offsets = readings[keep], offsets[keep]
+
+    #Every time column moves onto the replay timeline, so event times stay consistent with readings.
+    #Millisecond precision matches what the UI frames carry, so probes can compare exactly.
+    mapped = readings.copy()
+    for c in _TIME_COLUMNS:
+        if c in mapped.columns:
+            mapped[c] = (start + (mapped[c] - t0) / speed).dt.floor("ms")
+
+    for p in probes:
+        p.start()
+    latencies: list[float] = []
+    sent = 0
+    i = 0
+    began = time.time()
+    while i < len(mapped):
+        elapsed = time.time() - began
+        j = int(np.searchsorted(offsets, elapsed, side="right"))
+        if j > i:
+            batch = mapped.iloc[i:j]
+            rows = batch.astype(object).where(batch.notna(), None).to_dict(orient="records")
+            w0 = time.time()
+            write(rows)
+            w1 = time.time()
+            latencies.append(w1 - w0)
+            for p in probes:
+                p.written(batch, w0)
+            sent += j - i
+            i = j
+        else:
+            time.sleep(min(tick_sec, max(0.0, offsets[i] - elapsed)))
+    wall = time.time() - began
+    return {
+        "rows": sent,
+        "seconds": round(wall, 2),
+        "rows_per_sec": round(sent / wall, 1) if wall > 0 else None,
+        #Rows per second of time spent inside the write call: the ceiling at this batch size
+        "write_capacity_rows_per_sec": round(sent / sum(latencies), 1) if sum(latencies) > 0 else None,
+        "batches": len(latencies),
+        "write_latency_s": _percentiles(latencies),
+    }
+
+
+def cleanup():
+    removed = repo.delete_sensor_rows(REPLAY_PREFIX)
+    print(f"Removed {removed} replayed archive rows")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("--source", choices=("archive", "generated"), default="generated")
+    ap.add_argument("--days", type=float, default=7.0, help="archive history to replay")
+    ap.add_argument("--hours", type=float, default=24.0, help="generated history length")
+    ap.add_argument("--interval", type=int, default=900, help="generated reporting interval (s)")
+    ap.add_argument("--sensors", type=int, default=60, help="replay sensor count")
+    ap.add_argument("--speed", type=float, default=10.0, help="time compression factor")
+    ap.add_argument("--duration", type=float, default=None, help="stop after this many wall seconds")
+    ap.add_argument("--path", choices=("ingest", "archive"), default="ingest",
+                    help="ingest_rows (archive + estimators) or write_archive_rows only")
+    ap.add_argument("--probe-every", type=float, default=1.0)
+    ap.add_argument("--within", type=int, default=3600, help="snapshot live window (s)")
+    ap.add_argument("--cleanup", action="store_true", help="delete replayed rows afterwards")
+    ap.add_argument("--json", help="also write the report to this file")
+    args = ap.parse_args(argv)
+
+    source = archive_source(args.days) if args.source == "archive" else \
+        generated_source(min(args.sensors, 200), args.hours, args.interval)
+    readings = fan_out(source, args.sensors)
+    if readings.empty:
+        raise SystemExit("Nothing to replay.")
+    span = readings["timestamp"].max() - readings["timestamp"].min()
+    rate = len(readings) / max(span.total_seconds(), 1.0)
+    print(f"Replaying {len(readings):,} readings over {span} of history for {args.sensors} sensors "
+          f"at {args.speed}x: ~{rate * args.speed:.1f} rows/s (source rate {rate * 60:.1f} rows/min)")
+
+    probes = [
+        FreshnessProbe("fetch_latest_snapshot_df", lambda: snapshot_visible(args.within), args.probe_every),
+        FreshnessProbe("load_live_with_coords", live_with_coords_visible, args.probe_every),
+    ]
+    try:
+        report = replay(readings, speed=args.speed, duration_sec=args.duration, path=args.path, probes=probes)
+        #Let the probes catch up with the last batches
+        time.sleep(max(2 * args.probe_every, 1.0))
+    finally:
+        for p in probes:
+            p.stop()
+        if args.cleanup:
+            cleanup()
+
+    report["freshness_s"] = {
+        p.name: {**_percentiles(p.lags), "unseen": p.unseen(), "polls": p.polls, "errors": p.errors} for p in probes
+    }
+    report.update({"source": args.source, "sensors": args.sensors, "speed": args.speed, "path": args.path})
+    print(json.dumps(report, indent=2))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,51 @@
 import time
 import random
+import logging
 import os
+import base64
 import pandas as pd
 import _pydatetime
 from datetime import datetime, timezone
 from typing import List
 
 from Model.NetvoxR718x import NetvoxR718x
+from Model import logs, metrics
 from Model import repository as repo
+from Model.ingest import ingest_rows
+from Model.report_policy import ReportGate, ReportPolicy
+from Model.r718x_codec import encode_frame
+from Controller.sim_profiler import TickProfiler
 
 # === CONFIG ===
 SIM_COUNT = int(os.environ.get("SIM_COUNT", "6"))
 WRITE_INTERVAL_SECONDS = int(os.environ.get("WRITE_INTERVAL_SECONDS", "900"))
 SKIP_STARTUP_EMIT = os.environ.get("SKIP_STARTUP_EMIT", "1") == "1"
 MANAGE_STATIC = os.environ.get("MANAGE_STATIC", "0") == "1"
-HEARTBEAT_SECS = int(os.environ.get("HEARTBEAT_SECS", "3600"))
+#Report-on-change: rows are only archived past a deadband, on an event or on heartbeat.
+#Keep HEARTBEAT_SECS under the dashboard's one hour live window.
+REPORT_ON_CHANGE = os.environ.get("REPORT_ON_CHANGE", "1") == "1"
+HEARTBEAT_SECS = int(os.environ.get("HEARTBEAT_SECS", "1800"))
+FILL_DEADBAND = float(os.environ.get("FILL_DEADBAND", "2"))
+TEMP_DEADBAND = float(os.environ.get("TEMP_DEADBAND", "1.0"))
+BATTERY_DEADBAND = float(os.environ.get("BATTERY_DEADBAND", "0.01"))
 REPORT_JITTER_SECONDS = int(os.environ.get("REPORT_JITTER_SECONDS", "0"))
 MIN_SLEEP_SECONDS = int(os.environ.get("MIN_SLEEP_SECONDS", "1"))
+#Derive bin_events for history archived before event extraction existed (one archive scan)
+BACKFILL_BIN_EVENTS = os.environ.get("BACKFILL_BIN_EVENTS", "0") == "1"
+#With ARCHIVE_TIER_DIR set, closed months are moved to Parquet at startup and then every TIER_EVERY_HOURS
+TIER_EVERY_HOURS = float(os.environ.get("TIER_EVERY_HOURS", "24"))
+#With GATEWAY_URL set (e.g. http://localhost:8080/uplinks), readings go out as R718X uplink
+#frames to Controller.gateway, like physical bins, instead of straight into ingest_rows
+GATEWAY_URL = os.environ.get("GATEWAY_URL") or None
+GATEWAY_TOKEN = os.environ.get("GATEWAY_TOKEN") or None
+#SIM_PROFILE=1: per-cycle phase timings, sleep drift and emission lateness, logged to sim.profile
+#every SIM_PROFILE_SUMMARY_SEC; kill -USR1 <pid> samples the stack for SIM_PROFILE_SAMPLE_SEC into SIM_PROFILE_DIR.
+SIM_PROFILE = os.environ.get("SIM_PROFILE", "0") == "1"
+SIM_PROFILE_SUMMARY_SEC = float(os.environ.get("SIM_PROFILE_SUMMARY_SEC", "300"))
+SIM_PROFILE_SAMPLE_SEC = float(os.environ.get("SIM_PROFILE_SAMPLE_SEC", "30"))
+SIM_PROFILE_DIR = os.environ.get("SIM_PROFILE_DIR", ".")
+#With METRICS_PORT set, the loop's counters and timings are served at :METRICS_PORT/metrics
+#One sim.cycle line per cycle; per-sensor sim.sensor lines are DEBUG (see Model/logs.py for LOG_*)
 
 LAT_MIN, LAT_MAX = -37.7942, -37.7923
 LNG_MIN, LNG_MAX = 144.8988, 144.9002
@@ -24,6 +53,32 @@ LNG_MIN, LNG_MAX = 144.8988, 144.9002
 USE_WEATHER_TEMP = os.environ.get("USE_WEATHER_TEMP", "1") == "1"
 WEATHER_JITTER_C = float(os.environ.get("WEATHER_JITTER_C", "0.0"))
 
+_log = logs.get("sim")
+_cycle_log = logs.get("sim.cycle")
+_sensor_log = logs.get("sim.sensor")
+
+# === METRICS ===
+_CYCLES = metrics.counter("smartbins_sim_cycles_total", "Simulator scheduler cycles.")
+_CYCLE_SECONDS = metrics.histogram("smartbins_sim_cycle_seconds", "Busy time per simulator cycle.")
+_PHASE_SECONDS = metrics.histogram("smartbins_sim_phase_seconds", "Simulator cycle time per phase.", ("phase",))
+_READINGS = metrics.counter("smartbins_sim_readings_total", "Sensor readings sampled.")
+_SUPPRESSED = metrics.counter("smartbins_sim_rows_suppressed_total", "Readings dropped by report-on-change.")
+_SENT = metrics.counter("smartbins_sim_rows_sent_total", "Rows handed to the sink (ingest or gateway).", ("sink",))
+_WRITE_ERRORS = metrics.counter("smartbins_sim_write_errors_total", "Cycles whose rows failed to reach the sink.", ("sink",))
+_LATENESS = metrics.histogram(
+    "smartbins_sim_emission_lateness_seconds", "How long after its due time each sensor was sampled.",
+    buckets=(0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0))
+_SENSORS = metrics.gauge("smartbins_sim_sensors", "Simulated sensors.")
+_LAST_CYCLE = metrics.gauge("smartbins_sim_last_cycle_timestamp_seconds", "Unix time the last cycle finished.")
+
+
+def _phase_done(profiler, phase: str, started: float):
+    elapsed = time.perf_counter() - started
+    _PHASE_SECONDS.labels(phase=phase).observe(elapsed)
+    if profiler:
+        profiler.add_phase(phase, elapsed)
+
+
 # === HELPER ===
 
 def _advance_sensor(s, dt_minutes: int | None = None):
@@ -38,18 +93,44 @@ def _advance_sensor(s, dt_minutes: int | None = None):
                     overflow_cap=100.0
                     )
             except Exception as e:
-                print(f"Attempted bin empty error: {e}")
+                _sensor_log.warning("attempt_empty_event failed: %r", e, extra=logs.fields(sensor_id=s.sensor_id))
         if hasattr(s, "update_temperature"):
             try:
                 s.update_temperature()
             except Exception as e:
-                print(f"update_temperature error", {e})
+                _sensor_log.warning("update_temperature failed: %r", e, extra=logs.fields(sensor_id=s.sensor_id))
         return
     for m in ("step", "tick", "advance", "simulate_step", "simulate", "update"):
         if hasattr(s, m):
             getattr(s, m)()
             return
 
+def _post_uplinks(rows: list, sent_emptied: dict):
+    """Send rows to the gateway as one webhook call of The Things Stack uplinks."""
+    import requests
+    uplinks = []
+    for r in rows:
+        sid = r["sensor_id"]
+        #The frame only flags an empty; the gateway stamps it with the receive time
+        emptied = r.get("last_emptied") is not None and r.get("last_emptied") != sent_emptied.get(sid)
+        sent_emptied[sid] = r.get("last_emptied")
+        uplinks.append({
+            "end_device_ids": {"device_id": sid},
+            "received_at": pd.Timestamp(r["timestamp"]).isoformat(),
+            "uplink_message": {"f_port": 6, "frm_payload": base64.b64encode(encode_frame(r, emptied=emptied)).decode()},
+        })
+    headers = {"Authorization": f"Bearer {GATEWAY_TOKEN}"} if GATEWAY_TOKEN else {}
+    resp = requests.post(GATEWAY_URL, json=uplinks, headers=headers, timeout=10)
+    resp.raise_for_status()
+
+def _tier_archive():
+    try:
+        moved = repo.tier_archive()
+        if moved:
+            _log.info("archive tiering", extra=logs.fields(rows=sum(moved.values()), months=",".join(moved)))
+    except Exception as e:
+        _log.warning("archive tiering failed: %r", e)
+
 # === MAIN ===
 
 def main():
@@ -57,16 +138,44 @@ def main():
         f"Booting simulators: SIM_COUNT={SIM_COUNT}, WRITE_INTERVAL_SECONDS={WRITE_INTERVAL_SECONDS}, "
         f"MANAGE_STATIC={MANAGE_STATIC}, SKIP_STARTUP_EMIT={SKIP_STARTUP_EMIT}, HEARTBEAT_SECS={HEARTBEAT_SECS}, "
         f"REPORT_JITTER_SECONDS={REPORT_JITTER_SECONDS}, MIN_SLEEP_SECONDS={MIN_SLEEP_SECONDS}, "
-        f"USE_WEATHER_TEMP={USE_WEATHER_TEMP}, WEATHER_JITTER_C={WEATHER_JITTER_C}"
+        f"USE_WEATHER_TEMP={USE_WEATHER_TEMP}, WEATHER_JITTER_C={WEATHER_JITTER_C}, "
+        f"REPORT_ON_CHANGE={REPORT_ON_CHANGE}, GATEWAY_URL={GATEWAY_URL}"
     )
     
-    repo.ensure_archive_unique_index()
+    #Other storage backends create their own tables; these indexes, derived tables and tiering are Postgres-only
+    postgres = repo.uses_postgres()
+    if postgres:
+        repo.ensure_latest_state_indexes()
+        repo.ensure_ingest_version_table()
+        repo.ensure_static_spatial_index()
+        repo.ensure_fill_rate_state_table()
+        repo.ensure_anomaly_tables()
+        repo.ensure_bin_event_tables()
+    if postgres and BACKFILL_BIN_EVENTS:
+        repo.backfill_bin_events()
+    next_tier = None
+    if postgres and repo.ARCHIVE_TIER_DIR:
+        _tier_archive()
+        next_tier = pd.Timestamp.utcnow() + pd.Timedelta(hours=TIER_EVERY_HOURS)
 
     last = repo.fetch_any_latest_snapshot_df()
     last_idx = last.set_index("sensor_id") if not last.empty else pd.DataFrame()
 
+    gate = ReportGate(ReportPolicy(
+        fill_deadband=FILL_DEADBAND,
+        temp_deadband=TEMP_DEADBAND,
+        battery_deadband=BATTERY_DEADBAND,
+        heartbeat_sec=HEARTBEAT_SECS,
+    ))
+    #The latest archived row counts as sent, so a restart doesn't re-report every sensor
+    if not last.empty:
+        for r in last.to_dict(orient="records"):
+            gate.seed(r)
+
     sensors: List[NetvoxR718x] = []
     coords_rows = []
+    #last_emptied as of the last frame sent per sensor, so only new empties are flagged
+    sent_emptied = {}
 
     for i in range (1, SIM_COUNT + 1):
         sensor_id = f"R718X-{i:03d}"
@@ -101,6 +210,7 @@ def main():
 
             if pd.notna(row.get("last_emptied")):
                 s.last_emptied = pd.to_datetime(row["last_emptied"], utc=True).to_pydatetime()
+                sent_emptied[sensor_id] = s.last_emptied
 
             if pd.notna(row.get("last_overflow")):
                 s.last_overflow = pd.to_datetime(row["last_overflow"], utc=True).to_pydatetime()
@@ -127,6 +237,20 @@ def main():
     else:
         print(f"Static sync skipped (MANAGE_STATIC=0).")
 
+    profiler = None
+    if SIM_PROFILE:
+        profiler = TickProfiler(
+            summary_every_sec=SIM_PROFILE_SUMMARY_SEC,
+            sample_sec=SIM_PROFILE_SAMPLE_SEC,
+            profile_dir=SIM_PROFILE_DIR,
+        )
+        if profiler.install_signal():
+            _log.info("profiler on: kill -USR1 to sample the stack",
+                      extra=logs.fields(pid=os.getpid(), sample_sec=SIM_PROFILE_SAMPLE_SEC))
+
+    metrics.serve_from_env()
+    _SENSORS.set(len(sensors))
+
     #=== STAGGERED SCHEDULER ===
     now_utc = pd.Timestamp.utcnow()
     next_due = {}
@@ -143,12 +267,25 @@ def main():
     while True:
         now = pd.Timestamp.utcnow()
         rows_to_write = []
+        if profiler:
+            profiler.start_cycle()
+        t_advance = time.perf_counter()
+        #Checked once per cycle so the per-sensor diagnostics cost nothing when they're off
+        sensor_debug = _sensor_log.isEnabledFor(logging.DEBUG)
+        max_late = 0.0
+        sampled = suppressed = 0
+        sink = "none"
 
         for s in sensors:
             sid = s.sensor_id
             due = next_due[sid]
 
             if now >= due:
+                late = (now - due).total_seconds()
+                _LATENESS.observe(late)
+                max_late = max(max_late, late)
+                if profiler:
+                    profiler.emitted(sid, late)
                 last_ts = getattr(s, "timestamp", None)
                 if last_ts is None:
                     dt_min = max(1, WRITE_INTERVAL_SECONDS // 60)
@@ -156,19 +293,17 @@ def main():
                     last_ts = pd.to_datetime(last_ts, utc=True)
                     dt_min = max(1, int((pd.Timestamp.utcnow() - last_ts).total_seconds() // 60))
 
-                #Diagnostics
-                before_fill = float(getattr(s, "fill_level_percent", 0.0))
-                before_ts = getattr(s, "timestamp", None)
+                if sensor_debug:
+                    before_fill = float(getattr(s, "fill_level_percent", 0.0))
+                    before_ts = getattr(s, "timestamp", None)
 
                 _advance_sensor(s, dt_minutes=dt_min)
 
-                #Diagnositics
-                after_fill = int(getattr(s, "fill_level_percent", before_fill))
-                after_ts = getattr(s, "timestamp", None)
-
-                print(f"[{pd.Timestamp.now().strftime('%H:%M:%S')}] {sid}: dt={dt_min}m "
-                    f"fill {before_fill:.2f} -> {after_fill:.2f} "
-                    f"(ts {before_ts} -> {after_ts})")
+                if sensor_debug:
+                    _sensor_log.debug("advanced", extra=logs.fields(
+                        sensor_id=sid, dt_min=dt_min,
+                        fill_before=before_fill, fill_after=float(getattr(s, "fill_level_percent", before_fill)),
+                        ts_before=before_ts, ts_after=getattr(s, "timestamp", None)))
 
                 row = s.to_dict()
 
@@ -187,12 +322,16 @@ def main():
                     jitter = random.randint(-max_jitter, max_jitter)
                 next_due[sid] = due + pd.Timedelta(seconds=max(1, WRITE_INTERVAL_SECONDS + jitter))
 
+        _phase_done(profiler, "advance", t_advance)
+        sampled = len(rows_to_write)
+        _READINGS.inc(sampled)
 
+        temp_map = {}
+        t_weather = time.perf_counter()
         if rows_to_write and USE_WEATHER_TEMP:
             try:
                 sensor_ids = list({r["sensor_id"] for r in rows_to_write})
                 wx = repo.fetch_weather_now_for_sensors(sensor_ids=sensor_ids)
-                temp_map = {}
                 if wx is not None and not wx.empty:
                     for _, r in wx.iterrows():
                         t = r.get("temperature_c")
@@ -206,25 +345,65 @@ def main():
                             t += random.uniform(-WEATHER_JITTER_C, WEATHER_JITTER_C)
                         r["temperature_c"] = round(float(t), 1)
             except Exception as e:
-                print("WARNING: weather fetch failed; using simulated temperatures", repr(e))
+                _log.warning("weather fetch failed; using simulated temperatures: %r", e)
+            _phase_done(profiler, "weather", t_weather)
 
 
-        if rows_to_write:
+        if rows_to_write and REPORT_ON_CHANGE:
+            t_gate = time.perf_counter()
+            rows_to_write = gate.filter(rows_to_write, horizon_sec=WRITE_INTERVAL_SECONDS)
+            _phase_done(profiler, "gate", t_gate)
+            suppressed = sampled - len(rows_to_write)
+            _SUPPRESSED.inc(suppressed)
+
+        t_write = time.perf_counter()
+        if rows_to_write and GATEWAY_URL:
+            try:
+                _post_uplinks(rows_to_write, sent_emptied)
+                _SENT.labels(sink="gateway").inc(len(rows_to_write))
+                sink = "gateway"
+            except Exception as e:
+                _WRITE_ERRORS.labels(sink="gateway").inc()
+                sink = "gateway-failed"
+                _log.error("sending uplinks to the gateway failed: %r", e)
+        elif rows_to_write:
             try:
-                repo.write_archive_rows(rows_to_write)
-                ids = ", ".join(r["sensor_id"] for r in rows_to_write)
-                print(f"[{pd.Timestamp.now().strftime('%H:%M:%S')}] "
-                    f"Wrote {len(rows_to_write)} records -> {ids}")
+                ingest_rows(rows_to_write, weather_temps=temp_map)
+                _SENT.labels(sink="ingest").inc(len(rows_to_write))
+                sink = "ingest"
             except Exception as e:
-                print("ERROR writing archive rows:", repr(e))
-        else:
-            print(f"[{pd.Timestamp.now().strftime('%H:%M:%S')}] No rows written this cycle")
+                _WRITE_ERRORS.labels(sink="ingest").inc()
+                sink = "ingest-failed"
+                _log.error("writing archive rows failed: %r", e)
+        if rows_to_write:
+            _phase_done(profiler, "write", t_write)
+
+        if next_tier is not None and pd.Timestamp.utcnow() >= next_tier:
+            t_tier = time.perf_counter()
+            _tier_archive()
+            next_tier = pd.Timestamp.utcnow() + pd.Timedelta(hours=TIER_EVERY_HOURS)
+            _phase_done(profiler, "tier", t_tier)
+        busy = time.perf_counter() - t_advance
+        _CYCLE_SECONDS.observe(busy)
+        _CYCLES.inc()
+        _LAST_CYCLE.set(time.time())
+        _cycle_log.info("cycle", extra=logs.fields(
+            sampled=sampled, suppressed=suppressed, sent=len(rows_to_write), sink=sink,
+            late_max_s=round(max_late, 1), busy_ms=round(busy * 1000, 1),
+            total_sent=gate.sent, total_suppressed=gate.suppressed))
+        if profiler:
+            profiler.end_cycle(len(rows_to_write))
 
         soonest = min(next_due.values()) if next_due else (now + pd.Timedelta(seconds=WRITE_INTERVAL_SECONDS))
-        wait_s = int((soonest - pd.Timestamp.utcnow()).total_seconds())
+        until_due = (soonest - pd.Timestamp.utcnow()).total_seconds()
+        wait_s = int(until_due)
         if wait_s < MIN_SLEEP_SECONDS:
             wait_s = MIN_SLEEP_SECONDS
-        time.sleep(wait_s)         
+        slept_at = time.monotonic()
+        time.sleep(wait_s)
+        if profiler:
+            #Intended wake is the next due time (or the minimum sleep); whole-second sleeps wake early
+            profiler.woke(slept_at + max(until_due, MIN_SLEEP_SECONDS), time.monotonic())
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
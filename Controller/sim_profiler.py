@@ -0,0 +1,279 @@
+"""
+Per-cycle timing for Controller.sim_main.
+
+TickProfiler records, for every scheduler cycle:
+- time per phase (advance, weather, gate, write, tier) and for the whole cycle
+- sleep drift: actual wake time minus the wake time asked for
+- emission lateness: how long after its due time each sensor was sampled, with the
+  worst lateness seen per sensor
+
+into fixed-size log-scale histograms (LogHistogram), so memory stays bounded however
+long the simulator runs, and logs a summary to the sim.profile category every
+summary_every_sec.
+
+On SIGUSR1 a StackSampler samples the main thread's stack for sample_sec and writes
+the collapsed stacks (flamegraph.pl / speedscope input) to profile_dir, logging the
+hottest functions:
+
+    kill -USR1 <sim_main pid>
+"""
+
+from __future__ import annotations
+import math
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Optional
+
+from Model import logs
+
+
+_log = logs.get("sim.profile")
+
+
+class LogHistogram:
+    """
+    Positive values (seconds) in buckets growing by 2**(1/per_octave) from `low`,
+    plus count / sum / min / max. Quantiles are bucket upper bounds, so within ~19%
+    at the default resolution.
+    """
+
+    def __init__(self, low: float = 1e-6, octaves: int = 32, per_octave: int = 4):
+        self.low = low
+        self.per_octave = per_octave
+        self.counts = [0] * (octaves * per_octave + 1)
+        self.reset()
+
+    def reset(self):
+        self.counts[:] = [0] * len(self.counts)
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def add(self, value: float):
+        v = max(value, 0.0)
+        i = 0 if v <= self.low else min(int(math.log2(v / self.low) * self.per_octave) + 1, len(self.counts) - 1)
+        self.counts[i] += 1
+        self.count += 1
+        self.total += v
+        self.min = min(self.min, v)
+        self.max = max(self.max, v)
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank and c:
+                return min(self.low * 2 ** (i / self.per_octave), self.max)
+        return self.max
+
+    def summary(self) -> dict:
+        if not self.count:
+            return {"n": 0}
+        return {
+            "n": self.count,
+            "mean": self.total / self.count,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "max": self.max,
+        }
+
+
+def _ms_fields(prefix: str, summary: dict) -> dict:
+    """p50 / p95 / max of a LogHistogram summary as <prefix>_<stat>_ms fields."""
+    if not summary.get("n"):
+        return {}
+    return {f"{prefix}_{k}_ms": round(summary[k] * 1000, 1) for k in ("p50", "p95", "max")}
+
+
+class StackSampler:
+    """Samples one thread's Python stack on a timer thread and counts collapsed stacks."""
+
+    def __init__(self, thread_id: int, interval_sec: float = 0.005, max_depth: int = 64):
+        self.thread_id = thread_id
+        self.interval = interval_sec
+        self.max_depth = max_depth
+        self.stacks: Counter[str] = Counter()
+        self.samples = 0
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, duration_sec: float, on_done):
+        with self._lock:
+            if self.running:
+                return False
+            self.stacks.clear()
+            self.samples = 0
+            self._thread = threading.Thread(
+                target=self._run, args=(duration_sec, on_done), name="sim-stack-sampler", daemon=True)
+            self._thread.start()
+            return True
+
+    def _run(self, duration_sec: float, on_done):
+        stop_at = time.monotonic() + duration_sec
+        while time.monotonic() < stop_at:
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                names = []
+                while frame is not None and len(names) < self.max_depth:
+                    code = frame.f_code
+                    names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(names))] += 1
+                self.samples += 1
+            time.sleep(self.interval)
+        on_done(self)
+
+    def top_functions(self, n: int = 15) -> list[tuple[str, int, int]]:
+        """(function, self samples, total samples) of the n functions with most self samples."""
+        own: Counter[str] = Counter()
+        total: Counter[str] = Counter()
+        for stack, c in self.stacks.items():
+            frames = stack.split(";")
+            own[frames[-1]] += c
+            for f in set(frames):
+                total[f] += c
+        return [(f, c, total[f]) for f, c in own.most_common(n)]
+
+
+class TickProfiler:
+    PHASES = ("advance", "weather", "gate", "write", "tier")
+
+    def __init__(
+        self,
+        *,
+        summary_every_sec: float = 300.0,
+        sample_sec: float = 30.0,
+        profile_dir: str = ".",
+        worst_sensors: int = 5,
+    ):
+        self.summary_every = summary_every_sec
+        self.sample_sec = sample_sec
+        self.profile_dir = profile_dir
+        self.worst_sensors = worst_sensors
+        self.phases = {p: LogHistogram() for p in self.PHASES}
+        self.cycle = LogHistogram()
+        self.drift = LogHistogram()
+        self.early = 0
+        self.lateness = LogHistogram()
+        #Worst lateness per sensor in the current window; bounded by the sensor count
+        self.sensor_lateness: dict[str, float] = {}
+        self.cycles = 0
+        self.rows = 0
+        self._cycle_start: Optional[float] = None
+        self._window_start = time.monotonic()
+        self._sampler = StackSampler(threading.main_thread().ident)
+
+    # === RECORDING ===
+    def start_cycle(self):
+        self._cycle_start = time.perf_counter()
+
+    def add_phase(self, name: str, seconds: float):
+        self.phases[name].add(seconds)
+
+    def emitted(self, sensor_id: str, lateness_sec: float):
+        """A sensor was sampled lateness_sec after it was due."""
+        self.lateness.add(lateness_sec)
+        if lateness_sec > self.sensor_lateness.get(sensor_id, -math.inf):
+            self.sensor_lateness[sensor_id] = lateness_sec
+
+    def end_cycle(self, rows: int):
+        if self._cycle_start is not None:
+            self.cycle.add(time.perf_counter() - self._cycle_start)
+            self._cycle_start = None
+        self.cycles += 1
+        self.rows += rows
+        if time.monotonic() - self._window_start >= self.summary_every:
+            self.log_summary()
+
+    def woke(self, intended: float, actual: float):
+        """Sleep drift, both times from time.monotonic()."""
+        d = actual - intended
+        if d < 0:
+            self.early += 1
+        self.drift.add(d)
+
+    # === REPORTING ===
+    def summary(self) -> dict:
+        window = time.monotonic() - self._window_start
+        worst = sorted(self.sensor_lateness.items(), key=lambda kv: -kv[1])[:self.worst_sensors]
+        return {
+            "window_sec": window,
+            "cycles": self.cycles,
+            "rows": self.rows,
+            "rows_per_sec": self.rows / window if window > 0 else 0.0,
+            "cycle": self.cycle.summary(),
+            "phases": {p: h.summary() for p, h in self.phases.items()},
+            "sleep_drift": {**self.drift.summary(), "early": self.early},
+            "emission_lateness": self.lateness.summary(),
+            "worst_sensors": worst,
+        }
+
+    def log_summary(self):
+        s = self.summary()
+        busy = sum(h.total for h in self.phases.values())
+        out = {
+            "cycles": s["cycles"],
+            "rows": s["rows"],
+            "window_s": round(s["window_sec"], 1),
+            "rows_per_s": round(s["rows_per_sec"], 1),
+            "busy_pct": round(100 * busy / max(s["window_sec"], 1e-9), 1),
+            **_ms_fields("cycle", s["cycle"]),
+        }
+        for p in self.PHASES:
+            out.update(_ms_fields(p, s["phases"][p]))
+        out.update(_ms_fields("drift", s["sleep_drift"]), early=self.early)
+        out.update(_ms_fields("lateness", s["emission_lateness"]))
+        if s["worst_sensors"]:
+            out["worst"] = ",".join(f"{sid}:{late:.1f}s" for sid, late in s["worst_sensors"])
+        _log.info("profile", extra=logs.fields(**out))
+        self.reset_window()
+
+    def reset_window(self):
+        for h in (*self.phases.values(), self.cycle, self.drift, self.lateness):
+            h.reset()
+        self.sensor_lateness.clear()
+        self.early = 0
+        self.cycles = 0
+        self.rows = 0
+        self._window_start = time.monotonic()
+
+    # === ON-DEMAND SAMPLING ===
+    def install_signal(self, signum: Optional[int] = None) -> bool:
+        """Start a stack sample on signum (default SIGUSR1). False where there is no such signal."""
+        signum = signum if signum is not None else getattr(signal, "SIGUSR1", None)
+        if signum is None:
+            return False
+        signal.signal(signum, lambda *_: self.sample())
+        return True
+
+    def sample(self, duration_sec: Optional[float] = None):
+        duration = duration_sec or self.sample_sec
+        if self._sampler.start(duration, self._write_sample):
+            _log.info("sampling the stack", extra=logs.fields(seconds=duration))
+
+    def _write_sample(self, sampler: StackSampler):
+        path = os.path.join(self.profile_dir, f"sim_profile_{time.strftime('%Y%m%d-%H%M%S')}.folded")
+        try:
+            with open(path, "w") as f:
+                for stack, c in sampler.stacks.most_common():
+                    f.write(f"{stack} {c}\n")
+        except OSError as e:
+            _log.warning("could not write the stack profile: %r", e)
+            path = None
+        _log.info("stack sample", extra=logs.fields(samples=sampler.samples, path=path or "-"))
+        for fn, own, total in sampler.top_functions():
+            _log.info("hot function", extra=logs.fields(
+                fn=fn, self_pct=round(100 * own / sampler.samples, 1), total_pct=round(100 * total / sampler.samples, 1)))
@@ -5,6 +5,16 @@ from datetime import datetime, timezone
 from zoneinfo import ZoneInfo
 from typing import Optional
 
+from Model.r718x_codec import encode_frame
+
+#Relative fill rate by local hour (1.0 = average); shared with Model.fill_forecast
+FILL_TRAFFIC_PROFILE = (
+    0.6, 0.55, 0.5, 0.5, 0.55, 0.6, # midnight to 5am
+    0.75, 0.9, 1.05, 1.15, 1.25, 1.35, # 6am to 11am
+    1.4, 1.4, 1.3, 1.15, 1.0, 0.9, # noon to 5pm
+    0.8, 0.75, 0.7, 0.65, 0.6, 0.6 # 6pm to 11pm
+    )
+
 class NetvoxR718x:
     def __init__(self, 
                  sensor_id: str, 
@@ -78,6 +88,11 @@ class NetvoxR718x:
         
 
 
+    def to_frame(self, emptied: bool = False) -> bytes:
+        """This reading as an R718X uplink payload (Model.r718x_codec); emptied flags an empty since the last one."""
+        return encode_frame(self.to_dict(), emptied=emptied)
+
+
     def print_json(self) -> None:
         print(json.dumps(self.to_dict(), indent=2))
 
@@ -170,14 +185,7 @@ class NetvoxR718x:
         if not self.enable_traffic:
             return 1.0
         hour = datetime.now(self._tz).hour
-        profile = [
-            0.6, 0.55, 0.5, 0.5, 0.55, 0.6, # midnight to 5am
-            0.75, 0.9, 1.05, 1.15, 1.25, 1.35, # 6am to 11am
-            1.4, 1.4, 1.3, 1.15, 1.0, 0.9, # noon to 5pm
-            0.8, 0.75, 0.7, 0.65, 0.6, 0.6 # 6pm to 11pm
-            ]
-            
-        return profile[hour]
+        return FILL_TRAFFIC_PROFILE[hour]
 
 
 """
@@ -0,0 +1,166 @@
+"""
+Declarative alert rules evaluated over whole columns.
+
+A rule is plain data: a condition, a severity, a label and a priority (lower
+number wins when several rules match the same row). Conditions are tuples of
+(column, op, value) clauses combined with match="all" (AND) or match="any" (OR).
+
+compile_rules() turns a list of rules into one CompiledRules object that can be
+evaluated over a live snapshot (one row per bin) or over archive history (many
+rows per bin, where transitions() reports every change of alert state).
+Evaluation is a handful of numpy comparisons per rule - no per-row Python.
+"""
+
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Iterable, Sequence
+
+import numpy as np
+import pandas as pd
+
+
+_OPS = {
+    ">=": np.greater_equal,
+    ">": np.greater,
+    "<=": np.less_equal,
+    "<": np.less,
+    "==": np.equal,
+    "!=": np.not_equal,
+}
+_UNARY = {"isna", "notna"}
+
+
+@dataclass(frozen=True)
+class AlertRule:
+    label: str
+    severity: str
+    priority: int
+    condition: tuple[tuple, ...]
+    match: str = "all"
+
+
+def default_rules(*, fill_thresh: float = 85, temp_thresh: float = 40, battery_thresh: float = 3.2) -> list[AlertRule]:
+    """The dashboard's urgent alert rules (UI column names)."""
+    return [
+        AlertRule("Overflowing", "critical", 10, (("Fill", ">=", 100),)),
+        AlertRule("Approaching full", "high", 20, (("Fill", ">=", fill_thresh),)),
+        #Set from the latest recent Model.anomaly finding, joined into the live snapshot
+        AlertRule("Sensor fault", "high", 25, (("Anomaly", "notna"),)),
+        AlertRule("Heat Warning", "high", 30, (("Temperature", ">=", temp_thresh),)),
+        AlertRule("Low Battery", "medium", 40, (("Battery", "<=", battery_thresh),)),
+    ]
+
+
+class CompiledRules:
+    def __init__(self, rules: Iterable[AlertRule]):
+        self.rules: list[AlertRule] = sorted(rules, key=lambda r: r.priority)
+        for r in self.rules:
+            if r.match not in ("all", "any"):
+                raise ValueError(f"Rule {r.label!r}: match must be 'all' or 'any'")
+            for clause in r.condition:
+                op = clause[1]
+                if op not in _OPS and op not in _UNARY:
+                    raise ValueError(f"Rule {r.label!r}: unknown operator {op!r}")
+
+        self.labels = np.array([r.label for r in self.rules] + [None], dtype=object)
+        self.severities = np.array([r.severity for r in self.rules] + [None], dtype=object)
+        self.priorities = np.array([r.priority for r in self.rules] + [-1])
+        self.columns = sorted({c[0] for r in self.rules for c in r.condition})
+
+    # === EVALUATION ===
+    def _column(self, df: pd.DataFrame, name: str, cache: dict) -> np.ndarray | None:
+        if name not in cache:
+            if name not in df.columns:
+                cache[name] = None
+            else:
+                col = df[name]
+                if pd.api.types.is_numeric_dtype(col) or pd.api.types.is_bool_dtype(col):
+                    cache[name] = pd.to_numeric(col, errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+                else:
+                    cache[name] = col.to_numpy(dtype=object)
+        return cache[name]
+
+    def _clause(self, df: pd.DataFrame, clause: tuple, n: int, cache: dict) -> np.ndarray:
+        name, op = clause[0], clause[1]
+        values = self._column(df, name, cache)
+        if values is None:
+            #A missing column can only satisfy "isna"
+            return np.full(n, op == "isna")
+        if op in _UNARY:
+            na = pd.isna(values)
+            return na if op == "isna" else ~na
+        with np.errstate(invalid="ignore"):
+            return np.asarray(_OPS[op](values, clause[2]), dtype=bool)
+
+    def masks(self, df: pd.DataFrame) -> np.ndarray:
+        """Boolean matrix (n_rules x n_rows), rows ordered by priority."""
+        n = len(df)
+        cache: dict = {}
+        out = np.zeros((len(self.rules), n), dtype=bool)
+        for i, r in enumerate(self.rules):
+            parts = [self._clause(df, c, n, cache) for c in r.condition]
+            if not parts:
+                continue
+            out[i] = np.logical_and.reduce(parts) if r.match == "all" else np.logical_or.reduce(parts)
+        return out
+
+    def codes(self, df: pd.DataFrame) -> np.ndarray:
+        """Index of the winning rule per row, or len(rules) where nothing matched."""
+        m = self.masks(df)
+        if m.shape[0] == 0:
+            return np.full(len(df), 0)
+        first = m.argmax(axis=0)
+        return np.where(m.any(axis=0), first, len(self.rules))
+
+    def classify(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Alert, Severity and Priority for every row (None where no rule matched)."""
+        c = self.codes(df)
+        return pd.DataFrame(
+            {"Alert": self.labels[c], "Severity": self.severities[c], "Priority": self.priorities[c]},
+            index=df.index,
+        )
+
+    def evaluate(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Only the rows that raise an alert, with Alert/Severity/Priority columns added."""
+        c = self.codes(df)
+        hit = c < len(self.rules)
+        out = df.loc[hit].copy()
+        out["Alert"] = self.labels[c[hit]]
+        out["Severity"] = self.severities[c[hit]]
+        out["Priority"] = self.priorities[c[hit]]
+        return out
+
+    def transitions(self, history: pd.DataFrame, *, id_col: str = "DeviceID", time_col: str = "Timestamp") -> pd.DataFrame:
+        """
+        Every change of alert state per id over a history frame: raised, changed to
+        another rule, or cleared (Alert is None). Rows need not be pre-sorted.
+        """
+        cols = [id_col, time_col, "Alert", "Severity", "Previous"]
+        if history is None or history.empty:
+            return pd.DataFrame(columns=cols)
+
+        h = history.reset_index() if id_col not in history.columns else history
+        h = h.sort_values([id_col, time_col], kind="stable")
+        c = self.codes(h)
+        none = len(self.rules)
+
+        ids = h[id_col].to_numpy()
+        new_group = np.ones(len(h), dtype=bool)
+        new_group[1:] = ids[1:] != ids[:-1]
+        prev = np.empty_like(c)
+        prev[0] = none
+        prev[1:] = c[:-1]
+        prev[new_group] = none
+
+        changed = c != prev
+        return pd.DataFrame({
+            id_col: ids[changed],
+            time_col: h[time_col].to_numpy()[changed],
+            "Alert": self.labels[c[changed]],
+            "Severity": self.severities[c[changed]],
+            "Previous": self.labels[prev[changed]],
+        })
+
+
+def compile_rules(rules: Sequence[AlertRule]) -> CompiledRules:
+    return CompiledRules(rules)
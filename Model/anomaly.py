@@ -0,0 +1,212 @@
+"""
+Streaming sensor-fault detection over ingested readings.
+
+Each sensor keeps one row of online statistics (STATE_COLUMNS, persisted in
+repository.ANOMALY_STATE), updated per reading in O(1) - the archive is never
+rescanned:
+
+stuck_fill - fill unchanged for at least STUCK_MIN_HOURS while neither empty nor full,
+             over a stretch where the sensor's fill rate (Model.fill_forecast)
+             predicts a rise of STUCK_EXPECTED_POINTS or more
+unrecorded_drop - fill fell by more than DROP_POINTS without last_emptied changing
+battery_drop - battery drain rate (V/h) more than BATT_Z standard deviations above
+               the sensor's own history (Welford mean / variance)
+temp_divergence - EWMA of (reported - weather feed) temperature beyond TEMP_DIVERGE_C
+                  (needs a weather_temp_c column on the readings)
+
+detect(state, readings, rates) returns (updated state rows, anomalies). Batches are
+applied in vectorised rounds of one reading per sensor. Each condition is reported
+once when it starts, not on every reading while it lasts. Readings at or before a
+sensor's last_ts are ignored, so running a batch twice changes nothing.
+"""
+
+from __future__ import annotations
+from functools import partial
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from Model import sensor_state
+from Model.fill_forecast import expected_rise
+
+
+STATE_DTYPES = {
+    "sensor_id": "object",
+    "last_ts": "datetime64[ns, UTC]",
+    "last_fill": "float64",
+    "fill_since": "datetime64[ns, UTC]",
+    "run_rate": "float64",
+    "stuck_flag": "bool",
+    "last_emptied": "datetime64[ns, UTC]",
+    "last_batt": "float64",
+    "batt_n": "int64",
+    "batt_mean": "float64",
+    "batt_m2": "float64",
+    "batt_flag": "bool",
+    "temp_resid": "float64",
+    "temp_flag": "bool",
+}
+STATE_COLUMNS = list(STATE_DTYPES)
+ANOMALY_COLUMNS = ["sensor_id", "ts", "kind", "value", "detail"]
+
+#A quiet bin holds its level for hours; only flag when the fill rate says it should have moved
+STUCK_MIN_HOURS = 6.0
+STUCK_EXPECTED_POINTS = 10.0
+DROP_POINTS = 10.0
+#Battery rate z-score needs this many samples first; std floor covers 0.001 V rounding steps
+BATT_MIN_SAMPLES = 20
+BATT_Z = 4.0
+BATT_MIN_STD = 0.002
+BATT_MIN_RATE = 0.01
+TEMP_ALPHA = 0.3
+TEMP_DIVERGE_C = 8.0
+
+
+def empty_state() -> pd.DataFrame:
+    return sensor_state.empty_state(STATE_DTYPES)
+
+
+def _anomalies(rd: pd.DataFrame, hit: np.ndarray, kind: str, value: np.ndarray, fmt: str) -> pd.DataFrame:
+    if not hit.any():
+        return pd.DataFrame(columns=ANOMALY_COLUMNS)
+    v = value[hit]
+    return pd.DataFrame({
+        "sensor_id": rd.index[hit],
+        "ts": rd["timestamp"].to_numpy()[hit],
+        "kind": kind,
+        "value": v,
+        "detail": [fmt.format(x) for x in v],
+    })
+
+
+def _apply_round(state: pd.DataFrame, prev: pd.DataFrame, rd: pd.DataFrame, rates: pd.Series) -> list[pd.DataFrame]:
+    """One newer reading per sensor (rd, indexed by sensor_id) written into state over its rows prev; returns the hits."""
+    t0, t1 = prev["last_ts"], rd["timestamp"]
+    dt_h = ((t1 - t0).dt.total_seconds() / 3600.0).to_numpy()
+    known = prev["last_ts"].notna().to_numpy()
+
+    fill0 = prev["last_fill"].to_numpy(dtype="float64")
+    fill1 = rd["fill"].to_numpy(dtype="float64")
+    found: list[pd.DataFrame] = []
+
+    # --- stuck fill (how long the value has held vs the rise the fill rate predicts) ---
+    same = known & (fill1 == fill0)
+    rate_now = rates.reindex(rd.index)
+    #Rows from before run tracking start their run at the previous reading
+    since = t1.where(~same, prev["fill_since"].fillna(t0))
+    #The rate is frozen at the run's start: a stuck sensor otherwise teaches the estimator a rate of 0
+    run_rate = np.where(
+        same, prev["run_rate"].fillna(rate_now).to_numpy(dtype="float64"), rate_now.to_numpy(dtype="float64")
+    )
+    held_h = ((t1 - since).dt.total_seconds() / 3600.0).to_numpy()
+    with np.errstate(invalid="ignore"):
+        stuck = (same & (held_h >= STUCK_MIN_HOURS) & (fill1 > 0) & (fill1 < 100)
+                 & (expected_rise(run_rate, since, t1) >= STUCK_EXPECTED_POINTS))
+    stuck_flag0 = prev["stuck_flag"].fillna(False).to_numpy(dtype=bool)
+    stuck_flag = same & (stuck | stuck_flag0)
+    found.append(_anomalies(
+        rd, stuck & ~stuck_flag0, "stuck_fill", fill1,
+        f"fill stuck at {{:.0f}}% for {STUCK_MIN_HOURS:g}h+ against an expected rise of {STUCK_EXPECTED_POINTS:g}+ points",
+    ))
+
+    # --- fill drop without an empty event ---
+    e0, e1 = prev["last_emptied"], rd["last_emptied"]
+    emptied = ((e1.notna() & e0.isna()) | (e1 > e0)).to_numpy()
+    with np.errstate(invalid="ignore"):
+        drop = fill0 - fill1
+        unrecorded = known & (drop > DROP_POINTS) & ~emptied
+    found.append(_anomalies(rd, unrecorded, "unrecorded_drop", drop, "fill fell {:.0f} points with no empty event"))
+
+    # --- battery drain rate (Welford) ---
+    b0 = prev["last_batt"].to_numpy(dtype="float64")
+    b1 = rd["battery"].to_numpy(dtype="float64")
+    n = prev["batt_n"].fillna(0).to_numpy(dtype="float64")
+    mean = prev["batt_mean"].fillna(0).to_numpy(dtype="float64")
+    m2 = prev["batt_m2"].fillna(0).to_numpy(dtype="float64")
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rate = (b0 - b1) / dt_h
+        valid = known & np.isfinite(rate)
+        std = np.maximum(np.sqrt(m2 / np.maximum(n - 1, 1)), BATT_MIN_STD)
+        z = (rate - mean) / std
+        batt_hit = valid & (n >= BATT_MIN_SAMPLES) & (z > BATT_Z) & (rate > BATT_MIN_RATE)
+    batt_flag0 = prev["batt_flag"].fillna(False).to_numpy(dtype=bool)
+    batt_flag = np.where(valid, batt_hit, batt_flag0)
+    found.append(_anomalies(rd, batt_hit & ~batt_flag0, "battery_drop", rate, "battery draining at {:.3f} V/h"))
+
+    #Anomalous samples are kept out of the baseline
+    learn = valid & ~batt_hit
+    n1 = n + learn
+    d = np.where(learn, rate - mean, 0.0)
+    mean1 = mean + np.where(learn, d / np.maximum(n1, 1), 0.0)
+    m2_1 = m2 + np.where(learn, d * (rate - mean1), 0.0)
+
+    # --- temperature vs weather feed (EWMA of the residual) ---
+    resid = rd["temperature"].to_numpy(dtype="float64") - rd["weather_temp_c"].to_numpy(dtype="float64")
+    ew0 = prev["temp_resid"].to_numpy(dtype="float64")
+    has = ~np.isnan(resid)
+    ew = np.where(has & np.isnan(ew0), resid, np.where(has, ew0 + TEMP_ALPHA * (resid - ew0), ew0))
+    flag0 = prev["temp_flag"].fillna(False).to_numpy(dtype=bool)
+    with np.errstate(invalid="ignore"):
+        diverged = np.where(has, np.abs(ew) > TEMP_DIVERGE_C, flag0)
+    temp_hit = diverged & ~flag0
+    found.append(_anomalies(rd, temp_hit, "temp_divergence", ew, "temperature {:+.1f}C off the weather feed"))
+
+    # --- write back ---
+    idx = rd.index
+    state.loc[idx, "last_ts"] = t1
+    state.loc[idx, "last_fill"] = fill1
+    state.loc[idx, "fill_since"] = since
+    state.loc[idx, "run_rate"] = run_rate
+    state.loc[idx, "stuck_flag"] = stuck_flag
+    state.loc[idx, "last_emptied"] = e1.where(e1.notna(), e0)
+    state.loc[idx, "last_batt"] = np.where(np.isnan(b1), b0, b1)
+    state.loc[idx, "batt_n"] = n1
+    state.loc[idx, "batt_mean"] = mean1
+    state.loc[idx, "batt_m2"] = m2_1
+    state.loc[idx, "batt_flag"] = batt_flag
+    state.loc[idx, "temp_resid"] = ew
+    state.loc[idx, "temp_flag"] = diverged
+    return found
+
+
+def detect(
+    state: Optional[pd.DataFrame], readings: pd.DataFrame, rates: Optional[pd.Series] = None
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Run the detectors over archive-shaped readings (sensor_id, timestamp,
+    fill_level_percent, battery_v, temperature_c, last_emptied[, weather_temp_c]).
+    rates maps sensor_id -> fill_forecast base_rate; sensors without one are never
+    reported as stuck. Returns (state rows for the batch's sensors, anomalies).
+    """
+    if readings is None or readings.empty:
+        return empty_state(), pd.DataFrame(columns=ANOMALY_COLUMNS)
+
+    col = partial(sensor_state.column, readings)
+    rd = pd.DataFrame({
+        "sensor_id": readings["sensor_id"].astype(str),
+        "timestamp": pd.to_datetime(readings["timestamp"], utc=True),
+        "fill": pd.to_numeric(col("fill_level_percent"), errors="coerce"),
+        "battery": pd.to_numeric(col("battery_v"), errors="coerce"),
+        "temperature": pd.to_numeric(col("temperature_c"), errors="coerce"),
+        "weather_temp_c": pd.to_numeric(col("weather_temp_c"), errors="coerce"),
+        "last_emptied": pd.to_datetime(col("last_emptied"), utc=True, errors="coerce"),
+    }).dropna(subset=["timestamp", "fill"])
+
+    st = sensor_state.batch_state(state, rd["sensor_id"], empty_state())
+    rd = sensor_state.drop_stale(rd, st)
+
+    if rates is None:
+        rates = pd.Series(dtype="float64")
+    rates = pd.Series(pd.to_numeric(rates, errors="coerce").to_numpy(dtype="float64"), index=rates.index.astype(str))
+
+    found: list[pd.DataFrame] = []
+    for prev, rnd in sensor_state.rounds(st, rd):
+        found.extend(h for h in _apply_round(st, prev, rnd, rates) if not h.empty)
+
+    out = st.rename_axis("sensor_id").reset_index()
+    out["batt_n"] = out["batt_n"].fillna(0).astype("int64")
+    for c in ("stuck_flag", "batt_flag", "temp_flag"):
+        out[c] = out[c].fillna(False).astype(bool)
+    anomalies = pd.concat(found, ignore_index=True) if found else pd.DataFrame(columns=ANOMALY_COLUMNS)
+    return out[STATE_COLUMNS], anomalies
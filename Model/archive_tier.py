@@ -0,0 +1,262 @@
+"""
+Cold tier for the reading archive: month partitions of compressed Parquet on local disk.
+
+Layout under root:
+    month=YYYY-MM/part-0.parquet - one month's rows, sorted by (sensor_id, timestamp),
+                                   zstd, row groups small enough that sensor filters prune
+    month=YYYY-MM/part-N.parquet - batches appended while a month is being moved,
+                                   folded into part-0 by compact_month()
+    manifest.json                - tiered months and `boundary`, the end of the last
+                                   month registered for the tier
+
+The store itself knows nothing about Postgres: repository.tier_archive() moves rows
+in and deletes them from the hot table, and repository.fetch_archive_df() reads
+through read() for ranges before the boundary. Rows before the boundary can still be
+in Postgres (a month mid-move, late readings), so reads check there too while it
+holds any. Requires pyarrow.
+"""
+
+from __future__ import annotations
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Optional, Sequence
+
+import pandas as pd
+
+
+ROW_GROUP_SIZE = 64_000
+
+_TIME_COLUMNS = ("timestamp", "last_emptied", "last_overflow")
+
+
+#Known archive columns are written with fixed types, so every month file has the same schema
+def _archive_types() -> dict:
+    import pyarrow as pa
+    ts = pa.timestamp("us", tz="UTC")
+    return {
+        "id": pa.int64(),
+        "sensor_id": pa.string(),
+        "timestamp": ts,
+        "fill_level_percent": pa.float64(),
+        "temperature_c": pa.float64(),
+        "battery_v": pa.float64(),
+        "fill_threshold": pa.int32(),
+        "last_emptied": ts,
+        "overflow": pa.bool_(),
+        "overflow_count": pa.int32(),
+        "last_overflow": ts,
+    }
+
+
+def _with_archive_types(schema):
+    """schema with the known archive columns set to their tier types."""
+    import pyarrow as pa
+    types = _archive_types()
+    return pa.schema([pa.field(f.name, types.get(f.name, f.type)) for f in schema])
+
+
+def _utc(ts) -> pd.Timestamp:
+    t = pd.Timestamp(ts)
+    return t.tz_localize("UTC") if t.tzinfo is None else t.tz_convert("UTC")
+
+
+def month_key(ts) -> str:
+    return _utc(ts).strftime("%Y-%m")
+
+
+def month_bounds(key: str) -> tuple[pd.Timestamp, pd.Timestamp]:
+    start = pd.Timestamp(f"{key}-01", tz="UTC")
+    return start, start + pd.DateOffset(months=1)
+
+
+def to_table(df: pd.DataFrame):
+    """Archive rows as a pyarrow Table with the tier schema, sorted for pruning."""
+    import pyarrow as pa
+
+    df = df.copy()
+    for c in _TIME_COLUMNS:
+        if c in df.columns:
+            df[c] = pd.to_datetime(df[c], utc=True)
+    types = _archive_types()
+    schema = pa.schema([pa.field(c, types.get(c) or pa.infer_type(df[c].dropna().tolist())) for c in df.columns])
+    table = pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+    return table.sort_by([("sensor_id", "ascending"), ("timestamp", "ascending")])
+
+
+class ParquetTier:
+    def __init__(self, root: str | os.PathLike):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    # === MANIFEST ===
+    def _manifest_path(self) -> Path:
+        return self.root / "manifest.json"
+
+    def manifest(self) -> dict:
+        try:
+            return json.loads(self._manifest_path().read_text())
+        except (OSError, ValueError):
+            return {"boundary": None, "months": {}}
+
+    def boundary(self) -> Optional[pd.Timestamp]:
+        b = self.manifest().get("boundary")
+        return pd.Timestamp(b) if b else None
+
+    def months(self) -> list[str]:
+        return sorted(self.manifest()["months"])
+
+    def _save_manifest(self, manifest: dict):
+        _atomic_write(self._manifest_path(), json.dumps(manifest, indent=1, sort_keys=True).encode("utf-8"))
+
+    # === WRITE ===
+    def _month_dir(self, key: str) -> Path:
+        return self.root / f"month={key}"
+
+    def _parts(self, key: str) -> list[Path]:
+        return sorted(self._month_dir(key).glob("part-*.parquet"), key=lambda p: int(p.stem.split("-")[1]))
+
+    def begin_month(self, key: str):
+        """
+        Register a month and move the boundary past it. Its rows are still in Postgres
+        until tier_archive() deletes them; readers find them there because they also
+        read Postgres while it holds anything older than the boundary.
+        """
+        with self._lock:
+            self._month_dir(key).mkdir(parents=True, exist_ok=True)
+            manifest = self.manifest()
+            manifest["months"].setdefault(key, {"rows": 0, "bytes": 0})
+            end = month_bounds(key)[1]
+            if manifest.get("boundary") is None or pd.Timestamp(manifest["boundary"]) < end:
+                manifest["boundary"] = end.isoformat()
+            self._save_manifest(manifest)
+
+    def write_part(self, key: str, df: pd.DataFrame) -> Path:
+        """Persist one batch of a month as a new part file (durable before returning)."""
+        with self._lock:
+            parts = self._parts(key)
+            n = int(parts[-1].stem.split("-")[1]) + 1 if parts else 1
+            path = self._month_dir(key) / f"part-{n}.parquet"
+            _write_parquet(path, to_table(df))
+            return path
+
+    def compact_month(self, key: str) -> int:
+        """Fold a month's parts into one sorted, de-duplicated part-0. Returns its row count."""
+        import pyarrow.parquet as pq
+
+        with self._lock:
+            parts = self._parts(key)
+            if not parts:
+                return 0
+            if len(parts) > 1 or parts[0].stem != "part-0":
+                merged = pd.concat([pq.read_table(p).to_pandas() for p in parts], ignore_index=True)
+                merged = merged.drop_duplicates(["sensor_id", "timestamp"], keep="first")
+                _write_parquet(self._month_dir(key) / "part-0.parquet", to_table(merged))
+                for p in parts:
+                    if p.stem != "part-0":
+                        p.unlink()
+
+            path = self._month_dir(key) / "part-0.parquet"
+            rows = pq.ParquetFile(path).metadata.num_rows
+            manifest = self.manifest()
+            manifest["months"][key] = {"rows": rows, "bytes": path.stat().st_size}
+            self._save_manifest(manifest)
+            return rows
+
+    # === READ ===
+    def read(
+        self,
+        *,
+        since=None,
+        until=None,
+        sensor_ids: Optional[Sequence[str]] = None,
+        columns: Optional[Sequence[str]] = None,
+        limit: Optional[int] = None,
+    ):
+        """Cold rows in [since, until) as a pyarrow Table ordered by sensor_id, timestamp (None if no month matches)."""
+        import pyarrow.dataset as ds
+
+        since = _utc(since) if since is not None else None
+        until = _utc(until) if until is not None else None
+        paths = []
+        partial = False
+        for key in self.months():
+            start, end = month_bounds(key)
+            if (since is None or end > since) and (until is None or start < until):
+                parts = self._parts(key)
+                partial = partial or len(parts) > 1
+                paths.extend(str(p) for p in parts)
+        if not paths:
+            return None
+
+        dataset = ds.dataset(paths, format="parquet")
+        #Months written while the integer columns were float64 are cast on read
+        dataset = ds.dataset(paths, format="parquet", schema=_with_archive_types(dataset.schema))
+        expr = None
+        def _and(e):
+            return e if expr is None else expr & e
+        if since is not None:
+            expr = _and(ds.field("timestamp") >= since.to_pydatetime())
+        if until is not None:
+            expr = _and(ds.field("timestamp") < until.to_pydatetime())
+        if sensor_ids:
+            expr = _and(ds.field("sensor_id").isin(list(sensor_ids)))
+
+        need = None
+        if columns:
+            #Sort keys are read even when not requested, then dropped
+            need = list(dict.fromkeys(list(columns) + ["sensor_id", "timestamp"]))
+        table = dataset.to_table(columns=need, filter=expr)
+        if partial:
+            #A month mid-move can hold the same reading in two parts
+            import pyarrow as pa
+            table = pa.Table.from_pandas(
+                table.to_pandas().drop_duplicates(["sensor_id", "timestamp"]), schema=table.schema, preserve_index=False
+            )
+        table = table.sort_by([("sensor_id", "ascending"), ("timestamp", "ascending")])
+        if limit:
+            table = table.slice(0, int(limit))
+        return table.select(list(columns)) if columns else table
+
+
+def _write_parquet(path: Path, table):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    sink = pa.BufferOutputStream()
+    pq.write_table(table, sink, compression="zstd", row_group_size=ROW_GROUP_SIZE)
+    #Written in full before the rename, so readers never see a partial file
+    _atomic_write(path, sink.getvalue().to_pybytes())
+
+
+def _atomic_write(path: Path, data: bytes):
+    """Replace path with data, on disk (file and directory entry) before returning."""
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+    _fsync_dir(path.parent)
+
+
+def _fsync_dir(path: Path):
+    #Makes the rename durable; directories can't be opened for fsync on Windows
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
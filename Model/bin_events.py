@@ -0,0 +1,121 @@
+"""
+Bin state transitions extracted from ingested readings.
+
+Archive rows only carry running state (last_emptied, overflow, overflow_count,
+last_overflow), so questions like "empties per bin last month" would otherwise
+diff the whole archive. extract(state, readings) compares each reading with the
+sensor's previous one and emits at most one row per transition:
+
+emptied - last_emptied moved forward (ts = last_emptied, fill = level before)
+overflow_start - overflow flag rose or overflow_count increased (ts = last_overflow)
+overflow_clear - overflow flag fell, or an overflow began and ended between readings
+
+The previous reading per sensor is one row of STATE_COLUMNS, persisted in
+repository.BIN_EVENT_STATE. Events go to repository's bin_events table.
+"""
+
+from __future__ import annotations
+from functools import partial
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from Model import sensor_state
+
+
+STATE_DTYPES = {
+    "sensor_id": "object",
+    "last_ts": "datetime64[ns, UTC]",
+    "last_fill": "float64",
+    "overflow": "bool",
+    "overflow_count": "int64",
+    "last_emptied": "datetime64[ns, UTC]",
+}
+STATE_COLUMNS = list(STATE_DTYPES)
+EVENT_COLUMNS = ["sensor_id", "ts", "kind", "fill"]
+EVENT_KINDS = ("emptied", "overflow_start", "overflow_clear")
+
+
+def empty_state() -> pd.DataFrame:
+    return sensor_state.empty_state(STATE_DTYPES)
+
+
+def _events(rows: pd.DataFrame, hit: np.ndarray, kind: str, ts: pd.Series, fill: np.ndarray) -> pd.DataFrame:
+    return pd.DataFrame({
+        "sensor_id": rows["sensor_id"].to_numpy()[hit],
+        "ts": ts.to_numpy()[hit],
+        "kind": kind,
+        "fill": fill[hit],
+    })
+
+
+def extract(state: Optional[pd.DataFrame], readings: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Transitions in archive-shaped readings (sensor_id, timestamp, fill_level_percent,
+    overflow, overflow_count, last_emptied, last_overflow) relative to state.
+    Returns (state rows for the batch's sensors, events ordered by sensor and time).
+    A sensor's first ever reading only seeds its state.
+    """
+    if readings is None or readings.empty:
+        return empty_state(), pd.DataFrame(columns=EVENT_COLUMNS)
+
+    col = partial(sensor_state.column, readings)
+    rd = pd.DataFrame({
+        "sensor_id": readings["sensor_id"].astype(str),
+        "last_ts": pd.to_datetime(readings["timestamp"], utc=True),
+        "last_fill": pd.to_numeric(col("fill_level_percent"), errors="coerce"),
+        "overflow": col("overflow").astype("boolean").fillna(False).astype(bool),
+        "overflow_count": pd.to_numeric(col("overflow_count"), errors="coerce"),
+        "last_emptied": pd.to_datetime(col("last_emptied"), utc=True, errors="coerce"),
+        "last_overflow": pd.to_datetime(col("last_overflow"), utc=True, errors="coerce"),
+    }).dropna(subset=["last_ts"])
+
+    st = sensor_state.batch_state(state, rd["sensor_id"], empty_state())
+    st["overflow"] = st["overflow"].astype("boolean").fillna(False).astype(bool)
+    rd = sensor_state.drop_stale(rd, st, ts="last_ts")
+
+    #Each sensor's stored row goes in front of its readings, so one shift gives every reading its predecessor
+    #(a first-seen sensor's stored row is all NaN, so its first reading only seeds state)
+    seed = st.rename_axis("sensor_id").reset_index()
+    seq = pd.concat([seed.assign(_seed=True), rd.assign(_seed=False)], ignore_index=True)
+    seq = seq.sort_values(["sensor_id", "_seed", "last_ts"], ascending=[True, False, True], kind="stable")
+    prev = seq.groupby("sensor_id", sort=False).shift(1)
+    rows = seq[~seq["_seed"].to_numpy()]
+    prev = prev.loc[rows.index]
+
+    known = prev["last_ts"].notna().to_numpy()
+    e0, e1 = prev["last_emptied"], rows["last_emptied"]
+    emptied = known & (e1.notna() & (e0.isna() | (e1 > e0))).to_numpy()
+
+    ov0 = prev["overflow"].astype("boolean").fillna(False).to_numpy(dtype=bool)
+    ov1 = rows["overflow"].to_numpy(dtype=bool)
+    with np.errstate(invalid="ignore"):
+        counted = (rows["overflow_count"].to_numpy(dtype="float64") > prev["overflow_count"].to_numpy(dtype="float64"))
+    started = known & ((ov1 & ~ov0) | counted)
+    cleared = known & ((ov0 & ~ov1) | (counted & ~ov0 & ~ov1))
+
+    fill0 = prev["last_fill"].to_numpy(dtype="float64")
+    fill1 = rows["last_fill"].to_numpy(dtype="float64")
+    start_ts = rows["last_overflow"].where(rows["last_overflow"].notna(), rows["last_ts"])
+    clear_ts = e1.where(emptied, rows["last_ts"])
+    found = [
+        _events(rows, emptied, "emptied", e1, fill0),
+        _events(rows, started, "overflow_start", start_ts, fill1),
+        _events(rows, cleared, "overflow_clear", clear_ts, fill0),
+    ]
+    events = pd.concat([f for f in found if not f.empty] or [pd.DataFrame(columns=EVENT_COLUMNS)], ignore_index=True)
+    if not events.empty:
+        events = events.sort_values(["sensor_id", "ts"], kind="stable").reset_index(drop=True)
+
+    #New state is each sensor's last reading; last_emptied never moves backwards to NULL
+    last = rows.groupby("sensor_id", sort=False).tail(1).set_index("sensor_id")
+    out = st
+    for c in ("last_ts", "last_fill", "overflow", "overflow_count"):
+        out.loc[last.index, c] = last[c]
+    out.loc[last.index, "last_emptied"] = last["last_emptied"].where(last["last_emptied"].notna(), out.loc[last.index, "last_emptied"])
+
+    out = out.rename_axis("sensor_id").reset_index()
+    out["overflow"] = out["overflow"].astype("boolean").fillna(False).astype(bool)
+    out["overflow_count"] = pd.to_numeric(out["overflow_count"], errors="coerce").fillna(0).astype("int64")
+    return out[STATE_COLUMNS], events[EVENT_COLUMNS]
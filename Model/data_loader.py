@@ -1,43 +1,36 @@
+import threading
+import numpy as np
 import pandas as pd
 from zoneinfo import ZoneInfo
 from typing import Optional, Sequence
-from Model import repository as repo
+from Model import logs, repository as repo
+from Model.storage import SNAPSHOT_UI_COLUMNS
 
 MEL_TZ = ZoneInfo("Australia/Melbourne")
 
+_log = logs.get("data_loader")
+
 # ===HELPER FUNCTIONS===
 
-def _to_melbourne(ts) -> pd.Series:
-    s = pd.to_datetime(ts, errors="coerce", utc=True)
-    if not isinstance(s, pd.Series):
-        s=pd.Series(s)
-    return s.dt.tz_convert(MEL_TZ)
-
-def _numeric(df: pd.DataFrame, cols: Sequence[str]) -> None:
-    for c in cols:
-        if c in df.columns:
-            df[c] = pd.to_numeric(df[c], errors="coerce")
+_UI_NAMES = {
+    "bin_id": "BinID",
+    "sensor_id": "DeviceID",
+    "timestamp": "Timestamp",
+    "fill_level_percent": "Fill",
+    "temperature_c": "Temperature",
+    "battery_v": "Battery",
+    "lat": "Latitude",
+    "lng": "Longitude",
+    "overflow_count": "Overflow #",
+    "last_overflow": "Last Overflow",
+    "last_emptied": "Last Emptied"
+}
 
 def _rename_ui(df: pd.DataFrame) -> pd.DataFrame:
-    return df.rename(
-        columns={
-            "bin_id": "BinID",
-            "sensor_id": "DeviceID",
-            "timestamp": "Timestamp",
-            "fill_level_percent": "Fill",
-            "temperature_c": "Temperature",
-            "battery_v": "Battery",
-            "lat": "Latitude",
-            "lng": "Longitude",
-            "overflow_count": "Overflow #",
-            "last_overflow": "Last Overflow",
-            "last_emptied": "Last Emptied"
-        }
-    )
+    return df.rename(columns=_UI_NAMES)
 
 def _finalise(df: pd.DataFrame) -> pd.DataFrame:
-    if "Fill" in df.columns:
-        df["Fill"] = pd.to_numeric(df["Fill"], errors="coerce").clip(0, 100)
+    df = apply_frame_schema(df)
 
     preferred = [
         "BinID", "DeviceID", "Timestamp",
@@ -55,6 +48,136 @@ def _finalise(df: pd.DataFrame) -> pd.DataFrame:
         df = df.set_index("DeviceID", drop=True)
     return df
 
+# === FRAME SCHEMA ===
+    #Every UI frame is typed once, at read time, with these dtypes and kept that way.
+    #Times stay int64 milliseconds since the UTC epoch until they are rendered
+    #(to_local_time / format_local_time / display_frame).
+FRAME_SCHEMA = {
+    "BinID": "category",
+    "DeviceID": "category",
+    "Fill": "UInt8",
+    "fill_threshold": "UInt8",
+    "Temperature": "float32",
+    "Battery": "float32",
+    "Latitude": "float64",
+    "Longitude": "float64",
+    "Overflow #": "Int32",
+    "overflow": "bool",
+    "Anomaly": "category",
+}
+TIME_COLUMNS = ("Timestamp", "Last Overflow", "Last Emptied", "Anomaly At")
+#Reading precision of the float32 columns (0.01 C, 1 mV); display_frame rounds to it
+#so tables and exports show 21.3, not the float32 value 21.2999992371
+FLOAT32_DECIMALS = {"Temperature": 2, "Battery": 3}
+_EPOCH = pd.Timestamp(0, tz="UTC")
+_MS = pd.Timedelta(milliseconds=1)
+
+def _epoch_ms(values: pd.Series) -> pd.Series:
+    if pd.api.types.is_integer_dtype(values):
+        return values
+    t = pd.to_datetime(values, errors="coerce", utc=True)
+    return ((t - _EPOCH) // _MS).astype("Int64")
+
+def apply_frame_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """Cast UI-named columns to FRAME_SCHEMA. Already-typed columns are left alone."""
+    df = df.copy(deep=False)
+    for c, dtype in FRAME_SCHEMA.items():
+        if c not in df.columns or str(df[c].dtype) == dtype:
+            continue
+        if dtype == "category":
+            df[c] = df[c].astype("category")
+        elif dtype == "bool":
+            df[c] = df[c].astype("boolean").fillna(False).astype(bool)
+        elif dtype in ("UInt8", "Int32"):
+            vals = pd.to_numeric(df[c], errors="coerce").round()
+            df[c] = (vals.clip(0, 100) if dtype == "UInt8" else vals).astype(dtype)
+        else:
+            df[c] = pd.to_numeric(df[c], errors="coerce").astype(dtype)
+
+    for c in TIME_COLUMNS:
+        if c in df.columns:
+            ms = _epoch_ms(df[c])
+            #Reading time is always set; plain int64 when there are no gaps
+            df[c] = ms.astype("int64") if c == "Timestamp" and not ms.hasnans else ms
+    return df
+
+#Render-time conversions
+def to_local_time(values) -> pd.Series:
+    """Epoch-ms (or any datetime-like) values as Melbourne tz-aware datetimes."""
+    s = values if isinstance(values, pd.Series) else pd.Series(values)
+    if pd.api.types.is_numeric_dtype(s):
+        s = pd.to_datetime(s, unit="ms", utc=True)
+    else:
+        s = pd.to_datetime(s, errors="coerce", utc=True)
+    return s.dt.tz_convert(MEL_TZ)
+
+def format_local_time(values, fmt: str = "%d/%m/%Y %H:%M") -> pd.Series:
+    return to_local_time(values).dt.strftime(fmt)
+
+def epoch_ms(ts) -> int:
+    """One instant (datetime, Timestamp or string; naive means UTC) as epoch milliseconds."""
+    t = pd.Timestamp(ts)
+    t = t.tz_localize("UTC") if t.tzinfo is None else t.tz_convert("UTC")
+    return int((t - _EPOCH) // _MS)
+
+def display_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Copy of a schema frame with epoch-ms times as Melbourne datetimes and float32
+    readings as float64 at their reading precision, for tables and downloads.
+    """
+    out = df.copy(deep=False)
+    for c, decimals in FLOAT32_DECIMALS.items():
+        if c in out.columns and out[c].dtype == np.float32:
+            out[c] = out[c].astype("float64").round(decimals)
+    for c in TIME_COLUMNS:
+        #Columns already formatted for display are left as they are
+        if c in out.columns and pd.api.types.is_numeric_dtype(out[c]):
+            out[c] = to_local_time(out[c]).to_numpy()
+    return out
+
+# === ARCHIVE EXPORTS ===
+#Every export format (text via pandas, Parquet/Feather via Arrow) carries these columns
+EXPORT_COLUMNS = [
+    "BinID", "DeviceID", "Timestamp",
+    "Fill", "Temperature", "Battery",
+    "Latitude", "Longitude",
+    "Overflow #", "Last Overflow", "Last Emptied",
+    "fill_threshold", "overflow",
+]
+
+def export_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Archive rows (archive or UI names, bin-indexed or not) as typed EXPORT_COLUMNS; display_frame renders the times."""
+    if df.index.name in ("BinID", "DeviceID"):
+        df = df.reset_index()
+    df = apply_frame_schema(_rename_ui(df))
+    return df.loc[:, [c for c in EXPORT_COLUMNS if c in df.columns]]
+
+def export_table(table):
+    """
+    export_frame for a pyarrow Table straight from the archive: UI names, the
+    FRAME_SCHEMA types and Melbourne times, so Parquet/Feather match the text formats.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    table = table.rename_columns([_UI_NAMES.get(c, c) for c in table.column_names])
+    cols = {}
+    for c in EXPORT_COLUMNS:
+        if c not in table.column_names:
+            continue
+        col = table.column(c)
+        if c in TIME_COLUMNS:
+            #Archive times are naive UTC, which the cast reads as UTC
+            col = col.cast(pa.timestamp("ms")).cast(pa.timestamp("ms", tz=str(MEL_TZ)))
+        elif c in FLOAT32_DECIMALS:
+            col = pc.round(col.cast(pa.float64()), FLOAT32_DECIMALS[c])
+        elif FRAME_SCHEMA.get(c) == "UInt8":
+            col = pc.min_element_wise(pc.max_element_wise(pc.round(col.cast(pa.float64())), 0), 100).cast(pa.uint8())
+        elif FRAME_SCHEMA.get(c) == "Int32":
+            col = col.cast(pa.int32())
+        cols[c] = col
+    return pa.table(cols)
+
 # === WEATHER API HELPERS ===
 def fetch_bins_weather_now() -> pd.DataFrame:
     """
@@ -85,9 +208,6 @@ def load_weather_now_with_coords() -> pd.DataFrame:
         "wx_time_utc": "Timestamp"
     })
 
-    if "Timestamp" in df.columns:
-        df["Timestamp"] = _to_melbourne(df["Timestamp"])
-    
     return _finalise(df)
 
 #=== LOAD LIVE DATA WITH COORDINATES===
@@ -116,18 +236,6 @@ def load_live_with_coords() -> pd.DataFrame:
             # wx_time_utc is informational; drop for UI
             live.drop(columns=["wx_time_utc"], errors="ignore", inplace=True)       
 
-    #Converting timestamps to Melbourne time
-    if "timestamp" in live.columns:
-        live["timestamp"] = _to_melbourne(live["timestamp"])
-
-    _numeric(live, ["fill_level_percent", "temperature_c", "battery_v",
-                    "fill_threshold", "overflow_count"])
-    
-    if "last_overflow" in live.columns:
-        live["last_overflow"] = _to_melbourne(live["last_overflow"])
-    if "last_emptied" in live.columns:
-        live["last_emptied"] = _to_melbourne(live["last_emptied"])
-
     #merge static coordinates onto live data snapshot
     df = live.merge(
         coords[["bin_id", "sensor_id", "lat", "lng"]],
@@ -140,6 +248,133 @@ def load_live_with_coords() -> pd.DataFrame:
     df = _rename_ui(df)
     return _finalise(df)
 
+#=== LIVE SNAPSHOT (SINGLE QUERY) ===
+    #Join, numeric casts, clipping and column names are done in SQL;
+    #only FRAME_SCHEMA is applied here
+def _live_ui_index(df: pd.DataFrame) -> pd.DataFrame:
+    if df["BinID"].notna().any():
+        return df.set_index("BinID", drop=True)
+    return df.set_index("DeviceID", drop=True)
+
+def _live_fallbacks(df: pd.DataFrame, bbox: Optional[Sequence[float]] = None) -> pd.DataFrame:
+    """
+    Same fallbacks as load_live_with_coords, on an unindexed UI frame: the static bins
+    (without readings) when no bin is live, and current weather as Temperature when
+    no live reading carries one.
+    """
+    if df.empty:
+        coords = repo.fetch_static_bins_df() if bbox is None else repo.fetch_static_bins_in_bbox_df(*bbox)
+        if coords.empty:
+            return df
+        static = _rename_ui(coords[["bin_id", "sensor_id", "lat", "lng"]])
+        return apply_frame_schema(static.reindex(columns=SNAPSHOT_UI_COLUMNS)).reset_index(drop=True)
+
+    if df["Temperature"].isna().all():
+        try:
+            wx = repo.fetch_weather_now_for_sensors(sensor_ids=df["DeviceID"].dropna().astype(str).unique().tolist())
+        except Exception as e:
+            #Readings are still worth showing without a temperature
+            _log.warning("weather fallback failed: %r", e)
+            return df
+        if not wx.empty:
+            temps = wx.drop_duplicates("sensor_id").set_index("sensor_id")["temperature_c"]
+            df = df.assign(Temperature=df["DeviceID"].astype(str).map(temps).astype(FRAME_SCHEMA["Temperature"]))
+    return df
+
+def load_live_snapshot(within_seconds: int = 3600, *, bbox: Optional[Sequence[float]] = None) -> pd.DataFrame:
+    """
+    Latest reading per bin in the final UI shape, from one round trip.
+    bbox=(min_lat, min_lng, max_lat, max_lng) loads only bins in that viewport.
+    Falls back to static bins / current weather like load_live_with_coords.
+    """
+    df = repo.fetch_latest_snapshot_ui_df(within_seconds=within_seconds, bbox=bbox)
+    return _live_ui_index(_live_fallbacks(apply_frame_schema(df), bbox))
+
+#=== PAGINATED STATUS TABLE ===
+def load_status_page(*, page: int = 1, page_size: int = 25, **filters) -> tuple[pd.DataFrame, int]:
+    """
+    One UI-typed page of the latest-state table (sorting/filtering/paging run in SQL),
+    plus the number of matching bins. filters are passed to repo.fetch_latest_state_page_df.
+    """
+    df, total = repo.fetch_latest_state_page_df(
+        offset=(max(1, int(page)) - 1) * int(page_size), limit=int(page_size), **filters
+    )
+    return _live_ui_index(apply_frame_schema(df)), total
+
+#=== LIVE SNAPSHOT DELTAS ===
+def load_live_snapshot_delta(
+    since: Optional[int] = None,
+    within_seconds: int = 3600,
+    *,
+    bbox: Optional[Sequence[float]] = None,
+) -> tuple[pd.DataFrame, int]:
+    """
+    Only the bins whose latest reading changed since the `since` watermark, as
+    unindexed UI-typed rows, plus the new watermark. since=None is a full load.
+    """
+    df, watermark = repo.fetch_latest_snapshot_ui_delta_df(since, within_seconds, bbox=bbox)
+    return apply_frame_schema(df), watermark
+
+def apply_snapshot_delta(base: pd.DataFrame, delta: pd.DataFrame, *, within_seconds: int = 3600) -> pd.DataFrame:
+    """
+    Patch an unindexed live frame with changed rows (matched on DeviceID) and drop
+    bins that have aged out of the live window. Returns `base` itself when nothing
+    changed, otherwise a new frame - frames already handed out are never mutated.
+    """
+    if base.empty:
+        return base if delta.empty else delta.sort_values("DeviceID", kind="stable").reset_index(drop=True)
+
+    cutoff = epoch_ms(pd.Timestamp.now(tz="UTC")) - int(within_seconds) * 1000
+    keep = base["Timestamp"] >= cutoff
+    if not delta.empty:
+        keep &= ~base["DeviceID"].isin(delta["DeviceID"])
+    if delta.empty and keep.all():
+        return base
+
+    if delta.empty:
+        out = base.loc[keep]
+    else:
+        #Categoricals with different categories concat to object - re-apply the schema
+        out = apply_frame_schema(pd.concat([base.loc[keep], delta], ignore_index=True))
+    return out.sort_values("DeviceID", kind="stable").reset_index(drop=True)
+
+class LiveSnapshotFeed:
+    """
+    Loader for SnapshotRefresher that transfers only changed bins.
+
+    The first call (and every resync_every-th call, to self-heal) loads the full
+    snapshot; the rest fetch a delta since the last watermark and patch the
+    cached frame. Returns the same object when nothing changed.
+    """
+
+    def __init__(self, within_seconds: int = 3600, *, bbox: Optional[Sequence[float]] = None, resync_every: int = 150):
+        self.within_seconds = within_seconds
+        self.bbox = bbox
+        self.resync_every = max(1, int(resync_every))
+        self.watermark: Optional[int] = None
+        self._calls = 0
+        self._base: Optional[pd.DataFrame] = None
+        self._frame: Optional[pd.DataFrame] = None
+        #watermark and _base move together; interleaved calls would lose a delta
+        self._lock = threading.Lock()
+
+    def __call__(self) -> pd.DataFrame:
+        with self._lock:
+            full = self._base is None or self._calls % self.resync_every == 0
+            self._calls += 1
+
+            delta, watermark = load_live_snapshot_delta(
+                None if full else self.watermark, self.within_seconds, bbox=self.bbox
+            )
+            base = delta if full else apply_snapshot_delta(self._base, delta, within_seconds=self.within_seconds)
+            self.watermark = watermark
+
+            if base is not self._base or self._frame is None:
+                self._base = base
+                #Fallbacks only shape what is handed out; deltas keep patching the live rows
+                self._frame = _live_ui_index(_live_fallbacks(base, self.bbox))
+            return self._frame
+
 def load_archive_with_coords(
     device_id: str,
     *,
@@ -147,8 +382,12 @@ def load_archive_with_coords(
     until: Optional[str | pd.Timestamp] = None,
     limit: Optional[int] = None,
     with_coords: bool = False,
+    fill_step: Optional[str | pd.Timedelta] = None,
 ) -> pd.DataFrame:
-    """time series data from the archive table for downloads and analytics"""
+    """
+    time series data from the archive table for downloads and analytics
+    fill_step (e.g. "15min") forward-fills report-on-change gaps, see fill_gaps.
+    """
     raw = repo.fetch_archive_df(
         since=since,
         until=until,
@@ -158,18 +397,6 @@ def load_archive_with_coords(
     if raw.empty:
         return raw
     
-    #Types
-    raw["timestamp"] = _to_melbourne(raw["timestamp"])
-
-    _numeric(raw, ["fill_level_percent", "temperature_c", "battery_v",
-                   "fill_threshold", "overflow_count"])
-    
-    if "last_overflow" in raw.columns:
-        raw["last_overflow"] = _to_melbourne(raw["last_overflow"])
-
-    if "last_emptied" in raw.columns:
-        raw["last_emptied"] = _to_melbourne(raw["last_emptied"])
-    
     if with_coords:
         coords = repo.fetch_static_bins_df()
         raw = raw.merge(
@@ -179,5 +406,34 @@ def load_archive_with_coords(
             validate="many_to_one"
         )
     
-    out = _rename_ui(raw)
-    return _finalise(out)
\ No newline at end of file
+    out = _finalise(_rename_ui(raw))
+    return fill_gaps(out, fill_step) if fill_step else out
+
+def fill_gaps(df: pd.DataFrame, step: str | pd.Timedelta, *, max_gap: str | pd.Timedelta = "6h") -> pd.DataFrame:
+    """
+    Sensors only report on change or on heartbeat, so the archive has gaps where the
+    value was held. Adds a carried-forward copy of the previous reading every `step`
+    inside each gap (per index value, i.e. per bin), up to max_gap after a reading -
+    longer silences are left empty. Nothing is added after a bin's last reading.
+    """
+    if df is None or df.empty or "Timestamp" not in df.columns:
+        return df
+    step_ms = pd.Timedelta(step) // pd.Timedelta(milliseconds=1)
+    cap = pd.Timedelta(max_gap) // pd.Timedelta(step)
+
+    df = df.sort_values("Timestamp", kind="stable")
+    ts = df["Timestamp"].to_numpy(dtype="float64")
+    nxt = df["Timestamp"].groupby(level=0, sort=False).shift(-1).to_numpy(dtype="float64")
+    with np.errstate(invalid="ignore"):
+        n = np.clip(np.floor((nxt - ts - 1) / step_ms), 0, cap)
+    n = np.nan_to_num(n).astype("int64")
+    if not n.any():
+        return df
+
+    filled = df.iloc[np.repeat(np.arange(len(df)), n)].copy()
+    k = np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n) + 1
+    filled["Timestamp"] = (np.repeat(ts, n) + k * step_ms).astype("int64")
+
+    out = pd.concat([df, filled])
+    order = np.lexsort((out["Timestamp"].to_numpy(dtype="float64"), pd.factorize(out.index)[0]))
+    return apply_frame_schema(out.iloc[order])
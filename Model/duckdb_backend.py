@@ -0,0 +1,430 @@
+"""
+Embedded DuckDB storage backend (STORAGE_BACKEND=duckdb).
+
+The archive, static bins and the ingest version live in one local columnar file
+(DUCKDB_PATH), so the app and simulator run without a database server, and
+scans/aggregations over millions of readings run vectorised on every core.
+Requires the duckdb package.
+
+A DuckDB file has one writer process at a time, so every call opens a short-lived
+connection and retries while another process (e.g. the simulator while the
+dashboard reads) holds the file lock. Connections in the same process share one
+database instance; opening and closing them, and write transactions, are serialised
+per process, since concurrent writers would only conflict on the ingest version row.
+
+Estimator state, anomalies, bin events, LISTEN/NOTIFY and archive tiering are
+Postgres-only: readers poll fetch_ingest_version() and the UI snapshot's anomaly
+columns are always NULL.
+"""
+
+from __future__ import annotations
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Sequence
+
+import pandas as pd
+
+from Model.storage import (
+    ARCHIVE_COLUMNS, ARCHIVE_TIME_COLUMNS, NAMED_PARAM, SNAPSHOT_UI_COLUMNS, SNAPSHOT_UI_TIMES,
+    SUMMARY_COLUMNS, StorageBackend, like_prefix,
+)
+
+
+#How long a call waits for another process to release the file
+LOCK_TIMEOUT_SEC = float(os.environ.get("DUCKDB_LOCK_TIMEOUT_SEC", "10"))
+
+_archive = "smartbins.archive_bin_data"
+_static = "smartbins.static_bin_data"
+_ingest_version = "smartbins.ingest_version"
+
+_DDL = f"""
+    CREATE SCHEMA IF NOT EXISTS smartbins;
+    CREATE SEQUENCE IF NOT EXISTS smartbins.archive_id_seq;
+    CREATE TABLE IF NOT EXISTS {_archive} (
+        id                  BIGINT NOT NULL DEFAULT nextval('smartbins.archive_id_seq'),
+        sensor_id           VARCHAR NOT NULL,
+        "timestamp"         TIMESTAMP NOT NULL,
+        fill_level_percent  DOUBLE,
+        temperature_c       DOUBLE,
+        battery_v           DOUBLE,
+        fill_threshold      DOUBLE,
+        last_emptied        TIMESTAMP,
+        overflow            BOOLEAN,
+        overflow_count      INTEGER,
+        last_overflow       TIMESTAMP,
+        PRIMARY KEY (sensor_id, "timestamp")
+    );
+    CREATE TABLE IF NOT EXISTS {_static} (
+        bin_id      VARCHAR PRIMARY KEY,
+        sensor_id   VARCHAR,
+        lat         DOUBLE,
+        lng         DOUBLE
+    );
+    CREATE TABLE IF NOT EXISTS {_ingest_version} (
+        id          INTEGER PRIMARY KEY,
+        version     BIGINT NOT NULL,
+        updated_at  TIMESTAMP
+    );
+    INSERT INTO {_ingest_version} VALUES (1, 0, NULL) ON CONFLICT DO NOTHING;
+"""
+
+
+def _duckdb():
+    try:
+        import duckdb
+    except ImportError as e:
+        raise ImportError("STORAGE_BACKEND=duckdb needs the duckdb package (pip install duckdb)") from e
+    return duckdb
+
+
+def _utc_naive(ts) -> Optional[datetime]:
+    #The archive stores naive UTC, as in Postgres
+    if ts is None:
+        return None
+    t = pd.Timestamp(ts)
+    return (t.tz_convert("UTC").tz_localize(None) if t.tzinfo else t).to_pydatetime()
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _bind(sql: str, params: Optional[dict]) -> tuple[str, Optional[dict]]:
+    """:name placeholders as DuckDB $name, passing only the params the statement uses."""
+    if not params:
+        return sql, None
+    used = set(NAMED_PARAM.findall(sql))
+    return NAMED_PARAM.sub(r"$\1", sql), {k: v for k, v in params.items() if k in used}
+
+
+def _archive_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """ARCHIVE_COLUMNS with the table's types, one row per (sensor_id, timestamp)."""
+    df = df.reindex(columns=ARCHIVE_COLUMNS)
+    out = pd.DataFrame({"sensor_id": df["sensor_id"].astype(str)})
+    for c in ARCHIVE_COLUMNS[1:]:
+        if c in ARCHIVE_TIME_COLUMNS:
+            out[c] = pd.to_datetime(df[c], utc=True, errors="coerce").dt.tz_localize(None)
+        elif c == "overflow":
+            out[c] = df[c].astype("boolean")
+        elif c == "overflow_count":
+            out[c] = pd.to_numeric(df[c], errors="coerce").round().astype("Int64")
+        else:
+            out[c] = pd.to_numeric(df[c], errors="coerce").astype("float64")
+    return out.drop_duplicates(["sensor_id", "timestamp"], keep="first")
+
+
+def _static_frame(df: pd.DataFrame) -> pd.DataFrame:
+    return pd.DataFrame({
+        "bin_id": df["bin_id"].astype(str),
+        "sensor_id": df["sensor_id"].astype("string"),
+        "lat": pd.to_numeric(df["lat"], errors="coerce").astype("float64"),
+        "lng": pd.to_numeric(df["lng"], errors="coerce").astype("float64"),
+    }).drop_duplicates("bin_id", keep="last")
+
+
+def _archive_where(since, until, sensor_ids) -> tuple[str, dict]:
+    where: list[str] = []
+    params: dict[str, object] = {}
+    if since is not None:
+        where.append('"timestamp" >= :since')
+        params["since"] = _utc_naive(since)
+    if until is not None:
+        where.append('"timestamp" < :until')
+        params["until"] = _utc_naive(until)
+    if sensor_ids:
+        where.append("list_contains(:sensor_ids, sensor_id)")
+        params["sensor_ids"] = [str(s) for s in sensor_ids]
+    return ("WHERE " + " AND ".join(where)) if where else "", params
+
+
+_BBOX_SQL = "lat BETWEEN :min_lat AND :max_lat AND lng BETWEEN :min_lng AND :max_lng"
+
+def _bbox_params(bbox: Sequence[float]) -> dict:
+    min_lat, min_lng, max_lat, max_lng = (float(v) for v in bbox)
+    return {"min_lat": min_lat, "min_lng": min_lng, "max_lat": max_lat, "max_lng": max_lng}
+
+
+class DuckDBBackend(StorageBackend):
+    name = "duckdb"
+
+    def __init__(self, path: str | os.PathLike):
+        self.path = str(path)
+        self._ready = False
+        self._lock = threading.Lock()
+        #The shared instance is created by the first open connection and dropped with the last
+        self._open_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+    # === CONNECTION ===
+    @contextmanager
+    def _connect(self):
+        duckdb = _duckdb()
+        deadline = time.monotonic() + LOCK_TIMEOUT_SEC
+        delay = 0.05
+        while True:
+            try:
+                with self._open_lock:
+                    con = duckdb.connect(self.path)
+                break
+            except duckdb.IOException as e:
+                #Another process has the file open for writing
+                if "lock" not in str(e).lower() or time.monotonic() >= deadline:
+                    raise
+                time.sleep(delay)
+                delay = min(delay * 2, 0.5)
+        try:
+            if not self._ready:
+                with self._lock:
+                    con.execute(_DDL)
+                    self._ready = True
+            yield con
+        finally:
+            with self._open_lock:
+                con.close()
+
+    @contextmanager
+    def _write(self):
+        with self._write_lock, self._connect() as con:
+            yield con
+
+    def _df(self, sql: str, params: Optional[dict] = None) -> pd.DataFrame:
+        with self._connect() as con:
+            return con.execute(*_bind(sql, params)).df()
+
+    # === WRITES ===
+    def write_archive_rows(self, df: pd.DataFrame) -> int:
+        rows = _archive_frame(df)
+        cols = ", ".join(f'"{c}"' for c in ARCHIVE_COLUMNS)
+        with self._write() as con:
+            con.begin()
+            try:
+                con.register("incoming", rows)
+                inserted = len(con.execute(f"""
+                    INSERT INTO {_archive} ({cols})
+                    SELECT {cols} FROM incoming
+                    ON CONFLICT DO NOTHING
+                    RETURNING 1;
+                """).fetchall())
+                con.unregister("incoming")
+                if inserted:
+                    con.execute(
+                        f"UPDATE {_ingest_version} SET version = version + 1, updated_at = $now WHERE id = 1;",
+                        {"now": _utcnow()},
+                    )
+                con.commit()
+            except Exception:
+                con.rollback()
+                raise
+        return inserted
+
+    def upsert_static_bins(self, df: pd.DataFrame):
+        with self._write() as con:
+            con.register("incoming", _static_frame(df))
+            con.execute(f"""
+                INSERT INTO {_static} (bin_id, sensor_id, lat, lng)
+                SELECT bin_id, sensor_id, lat, lng FROM incoming
+                ON CONFLICT (bin_id) DO UPDATE
+                SET sensor_id = EXCLUDED.sensor_id, lat = EXCLUDED.lat, lng = EXCLUDED.lng;
+            """)
+
+    def sync_static_bins(self, df: pd.DataFrame, *, delete_missing: bool, update_existing: bool):
+        if update_existing:
+            self.upsert_static_bins(df)
+        with self._write() as con:
+            con.register("incoming", _static_frame(df))
+            con.execute(f"""
+                INSERT INTO {_static} (bin_id, sensor_id, lat, lng)
+                SELECT bin_id, sensor_id, lat, lng FROM incoming
+                ON CONFLICT (bin_id) DO NOTHING;
+            """)
+            if delete_missing:
+                con.execute(f"DELETE FROM {_static} WHERE bin_id NOT IN (SELECT bin_id FROM incoming);")
+
+    def delete_sensor_rows(self, sensor_prefix: str) -> int:
+        with self._write() as con:
+            return int(con.execute(
+                f"DELETE FROM {_archive} WHERE sensor_id LIKE $pattern ESCAPE '\\';",
+                {"pattern": like_prefix(sensor_prefix)},
+            ).fetchone()[0])
+
+    # === READS ===
+    def fetch_ingest_version(self) -> int:
+        with self._connect() as con:
+            row = con.execute(f"SELECT version FROM {_ingest_version} WHERE id = 1;").fetchone()
+        return int(row[0]) if row else 0
+
+    def fetch_static_bins_df(self) -> pd.DataFrame:
+        return self._df(f"SELECT * FROM {_static}")
+
+    def fetch_static_bins_in_bbox_df(self, bbox: Sequence[float]) -> pd.DataFrame:
+        return self._df(f"SELECT * FROM {_static} WHERE {_BBOX_SQL}", _bbox_params(bbox))
+
+    def fetch_nearest_static_bins_df(self, lat: float, lng: float, k: int) -> pd.DataFrame:
+        #No KNN index here; the static registry is small enough for a top-k scan
+        return self._df(f"""
+            SELECT *, sqrt(power(lng - :lng, 2) + power(lat - :lat, 2)) AS distance_deg
+            FROM {_static}
+            ORDER BY distance_deg
+            LIMIT {int(k)}
+        """, {"lat": float(lat), "lng": float(lng)})
+
+    def fetch_static_cell_counts_df(self, cell_deg: float) -> pd.DataFrame:
+        return self._df(f"""
+            SELECT floor(lat / :cell) * :cell AS cell_lat,
+                   floor(lng / :cell) * :cell AS cell_lng,
+                   COUNT(*) AS bins
+            FROM {_static}
+            WHERE lat IS NOT NULL AND lng IS NOT NULL
+            GROUP BY 1, 2
+            ORDER BY 1, 2
+        """, {"cell": float(cell_deg)})
+
+    def _archive_sql(self, since, until, sensor_ids, limit, columns) -> tuple[str, dict]:
+        where_sql, params = _archive_where(since, until, sensor_ids)
+        lim_sql = f"LIMIT {int(limit)}" if limit else ""
+        return f'SELECT {columns} FROM {_archive} {where_sql} ORDER BY sensor_id, "timestamp" {lim_sql}', params
+
+    def fetch_archive_df(self, since, until, sensor_ids, limit, columns) -> pd.DataFrame:
+        return self._df(*self._archive_sql(since, until, sensor_ids, limit, columns))
+
+    def fetch_archive_arrow(self, since, until, sensor_ids, limit, columns, with_coords):
+        sql, params = self._archive_sql(since, until, sensor_ids, limit, columns)
+        if with_coords:
+            sql = f"""
+                SELECT q.*, s.bin_id, s.lat, s.lng
+                FROM ({sql}) q
+                LEFT JOIN {_static} s ON s.sensor_id = q.sensor_id
+                ORDER BY q.sensor_id, q."timestamp"
+            """
+        with self._connect() as con:
+            return con.execute(*_bind(sql, params)).fetch_arrow_table()
+
+    def fetch_archive_summary_df(self, since, until, sensor_ids, bucket_sec: int, per_sensor: bool) -> pd.DataFrame:
+        where_sql, params = _archive_where(since, until, sensor_ids)
+        params["bucket_sec"] = int(bucket_sec)
+        sensor_sql = "sensor_id" if per_sensor else "CAST(NULL AS VARCHAR)"
+        group_sql = "sensor_id, bucket" if per_sensor else "bucket"
+        return self._df(f"""
+            SELECT {sensor_sql}                                                         AS sensor_id,
+                   time_bucket(to_seconds(:bucket_sec), "timestamp", TIMESTAMP '1970-01-01') AS bucket,
+                   COUNT(*)                                                             AS readings,
+                   AVG(fill_level_percent)                                              AS fill_avg,
+                   MAX(fill_level_percent)                                              AS fill_max,
+                   AVG(temperature_c)                                                   AS temp_avg,
+                   MIN(battery_v)                                                       AS battery_min
+            FROM {_archive}
+            {where_sql}
+            GROUP BY {group_sql}
+            ORDER BY {group_sql}
+        """, params)[SUMMARY_COLUMNS]
+
+    def fetch_any_latest_snapshot_df(self) -> pd.DataFrame:
+        return self._df(f"""
+            SELECT * FROM {_archive}
+            QUALIFY row_number() OVER (PARTITION BY sensor_id ORDER BY "timestamp" DESC) = 1
+            ORDER BY sensor_id
+        """)
+
+    def fetch_latest_snapshot_df(self, within_seconds: int) -> pd.DataFrame:
+        return self._df(f"""
+            SELECT * FROM {_archive}
+            WHERE "timestamp" >= :cutoff
+            QUALIFY row_number() OVER (PARTITION BY sensor_id ORDER BY "timestamp" DESC) = 1
+            ORDER BY sensor_id
+        """, {"cutoff": _utcnow() - timedelta(seconds=int(within_seconds))})
+
+    # === UI SNAPSHOT ===
+    def _snapshot_ui_sql(
+        self,
+        within_seconds: int,
+        bbox: Optional[Sequence[float]] = None,
+        since_id: Optional[int] = None,
+    ) -> tuple[str, dict]:
+        params: dict[str, object] = {"cutoff": _utcnow() - timedelta(seconds=int(within_seconds))}
+        filters = ""
+        if bbox is not None:
+            params.update(_bbox_params(bbox))
+            filters += f"\n                AND a.sensor_id IN (SELECT sensor_id FROM {_static} WHERE {_BBOX_SQL})"
+        if since_id is not None:
+            params["since_id"] = int(since_id)
+            filters += f"\n                AND a.sensor_id IN (SELECT DISTINCT sensor_id FROM {_archive} WHERE id > :since_id)"
+
+        sql = f"""
+            WITH latest AS (
+                SELECT a.* FROM {_archive} a
+                WHERE a."timestamp" >= :cutoff{filters}
+                QUALIFY row_number() OVER (PARTITION BY a.sensor_id ORDER BY a."timestamp" DESC) = 1
+            )
+            SELECT
+                s.bin_id                                                    AS "BinID",
+                l.sensor_id                                                 AS "DeviceID",
+                l."timestamp"                                               AS "Timestamp",
+                LEAST(GREATEST(l.fill_level_percent, 0), 100)               AS "Fill",
+                l.temperature_c                                             AS "Temperature",
+                l.battery_v                                                 AS "Battery",
+                s.lat                                                       AS "Latitude",
+                s.lng                                                       AS "Longitude",
+                CAST(l.overflow_count AS INTEGER)                           AS "Overflow #",
+                l.last_overflow                                             AS "Last Overflow",
+                l.last_emptied                                              AS "Last Emptied",
+                CAST(l.fill_threshold AS INTEGER)                           AS fill_threshold,
+                l.overflow                                                  AS overflow,
+                CAST(NULL AS VARCHAR)                                       AS "Anomaly",
+                CAST(NULL AS TIMESTAMP)                                     AS "Anomaly At"
+            FROM latest l
+            LEFT JOIN {_static} s ON s.sensor_id = l.sensor_id
+        """
+        return sql, params
+
+    @staticmethod
+    def _ui_frame(df: pd.DataFrame) -> pd.DataFrame:
+        #Stored naive UTC; the UI frames carry tz-aware instants like the Postgres path
+        for c in SNAPSHOT_UI_TIMES:
+            if c in df.columns:
+                df[c] = pd.to_datetime(df[c]).dt.tz_localize("UTC")
+        return df
+
+    def fetch_latest_snapshot_ui_df(self, within_seconds: int, bbox: Optional[Sequence[float]]) -> pd.DataFrame:
+        sql, params = self._snapshot_ui_sql(within_seconds, bbox)
+        return self._ui_frame(self._df(sql + ' ORDER BY "DeviceID"', params))
+
+    def fetch_latest_snapshot_ui_delta_df(
+        self, since_id: Optional[int], within_seconds: int, bbox: Optional[Sequence[float]]
+    ) -> tuple[pd.DataFrame, int]:
+        with self._connect() as con:
+            con.begin()
+            watermark = int(con.execute(f"SELECT COALESCE(MAX(id), 0) FROM {_archive};").fetchone()[0])
+            if since_id is not None and watermark <= int(since_id):
+                con.rollback()
+                return pd.DataFrame(columns=SNAPSHOT_UI_COLUMNS), int(since_id)
+            sql, params = self._snapshot_ui_sql(within_seconds, bbox, since_id)
+            df = con.execute(*_bind(sql + ' ORDER BY "DeviceID"', params)).df()
+            con.rollback()
+        return self._ui_frame(df), watermark
+
+    def fetch_latest_state_page_df(
+        self, *, sort_by: str, descending: bool, where_sql: str, params: dict,
+        offset: int, limit: int, within_seconds: int,
+    ) -> tuple[pd.DataFrame, int]:
+        sql, query_params = self._snapshot_ui_sql(within_seconds)
+        params = {**params, **query_params, "offset": offset, "limit": limit}
+        direction = "DESC" if descending else "ASC"
+        page_sql = f"""
+            SELECT q.*, COUNT(*) OVER () AS "_total"
+            FROM ({sql}) q
+            {where_sql}
+            ORDER BY "{sort_by}" {direction} NULLS LAST, "DeviceID"
+            LIMIT :limit OFFSET :offset
+        """
+        with self._connect() as con:
+            page = con.execute(*_bind(page_sql, params)).df()
+            if page.empty and offset > 0:
+                #Past the last page - still report how many rows match
+                count_sql = f"SELECT COUNT(*) FROM ({sql}) q {where_sql}"
+                total = int(con.execute(*_bind(count_sql, params)).fetchone()[0])
+            else:
+                total = int(page["_total"].iloc[0]) if not page.empty else 0
+        return self._ui_frame(page.drop(columns="_total")), total
@@ -0,0 +1,253 @@
+"""
+Disk-backed cache of finished export files, shared by every session in the process.
+
+Entries are content-addressed: the key is a sha256 of the normalised query
+(device, UTC window, row limit, format), so two users asking for the same export
+get the same file. Windows that ended in the past are immutable and kept until
+evicted; windows that reach "now" still receive rows and expire after live_ttl_sec.
+
+Exports are built by submit() on a small thread pool. Jobs report progress, and
+concurrent requests for the same key share one job. The cache directory is trimmed
+to max_bytes, least recently used first.
+"""
+
+from __future__ import annotations
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Optional
+
+import pandas as pd
+
+
+#Bump when the export contents change shape, so old files are not served again
+EXPORT_FORMAT_VERSION = 2
+
+#A window counts as closed once it ended this long ago (late rows / clock skew)
+CLOSED_AFTER_SEC = 300
+
+Progress = Callable[[float, str], None]
+
+
+def _utc_iso(ts) -> Optional[str]:
+    if ts is None:
+        return None
+    t = pd.Timestamp(ts)
+    t = t.tz_localize("UTC") if t.tzinfo is None else t.tz_convert("UTC")
+    return t.floor("s").isoformat()
+
+
+def normalise_query(device_id: Optional[str], since, until, limit: Optional[int], fmt: str) -> dict:
+    return {
+        "device": device_id or "*",
+        "since": _utc_iso(since),
+        "until": _utc_iso(until),
+        "limit": int(limit) if limit else None,
+        "fmt": fmt.upper(),
+        "v": EXPORT_FORMAT_VERSION,
+    }
+
+
+def is_closed_window(query: dict, *, now: Optional[datetime] = None) -> bool:
+    """True when the query's window ended far enough in the past that its rows can't change."""
+    if query.get("until") is None:
+        return False
+    now = now or datetime.now(timezone.utc)
+    return (now - pd.Timestamp(query["until"]).to_pydatetime()).total_seconds() >= CLOSED_AFTER_SEC
+
+
+@dataclass(frozen=True)
+class ExportArtifact:
+    key: str
+    path: Path
+    mime: str
+    ext: str
+    size: int
+    immutable: bool
+    created_at: float
+
+    def read_bytes(self) -> bytes:
+        return self.path.read_bytes()
+
+
+@dataclass
+class ExportJob:
+    key: str
+    progress: float = 0.0
+    stage: str = "queued"
+    done: bool = False
+    error: Optional[Exception] = None
+    artifact: Optional[ExportArtifact] = None
+    started_at: float = field(default_factory=time.time)
+    _event: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    def update(self, progress: float, stage: str):
+        self.progress = min(max(float(progress), 0.0), 1.0)
+        self.stage = stage
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._event.wait(timeout)
+
+
+class ExportCache:
+    def __init__(
+        self,
+        root: str | os.PathLike,
+        *,
+        max_bytes: int = 512 * 1024 * 1024,
+        live_ttl_sec: float = 60.0,
+        workers: int = 2,
+    ):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = int(max_bytes)
+        self.live_ttl_sec = float(live_ttl_sec)
+
+        self._lock = threading.Lock()
+        self._jobs: dict[str, ExportJob] = {}
+        self._pool = ThreadPoolExecutor(max_workers=max(1, int(workers)), thread_name_prefix="export")
+
+    # === KEYS / PATHS ===
+    @staticmethod
+    def key(query: dict) -> str:
+        blob = json.dumps(query, sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+    def _meta_path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.json"
+
+    def _data_path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.bin"
+
+    # === LOOKUP ===
+    def get(self, key: str) -> Optional[ExportArtifact]:
+        """Finished export for key, or None if missing or expired. A hit counts as a use for LRU."""
+        meta_path, data_path = self._meta_path(key), self._data_path(key)
+        try:
+            meta = json.loads(meta_path.read_text())
+        except (OSError, ValueError):
+            return None
+        if not data_path.exists():
+            return None
+        if not meta["immutable"] and time.time() - meta["created_at"] > self.live_ttl_sec:
+            self._remove(key)
+            return None
+
+        os.utime(meta_path)
+        return ExportArtifact(
+            key=key, path=data_path, mime=meta["mime"], ext=meta["ext"],
+            size=meta["size"], immutable=meta["immutable"], created_at=meta["created_at"],
+        )
+
+    def put(self, key: str, data: bytes, *, mime: str, ext: str, immutable: bool) -> ExportArtifact:
+        data_path, meta_path = self._data_path(key), self._meta_path(key)
+        data_path.parent.mkdir(parents=True, exist_ok=True)
+        meta = {"mime": mime, "ext": ext, "size": len(data), "immutable": bool(immutable), "created_at": time.time()}
+
+        #Write-then-rename so readers in other sessions never see a partial file
+        self._atomic_write(data_path, data)
+        self._atomic_write(meta_path, json.dumps(meta).encode("utf-8"))
+        self.evict()
+        return ExportArtifact(key=key, path=data_path, **{k: meta[k] for k in ("mime", "ext", "size", "immutable", "created_at")})
+
+    @staticmethod
+    def _atomic_write(path: Path, data: bytes):
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+
+    # === EVICTION ===
+    def _remove(self, key: str):
+        for p in (self._meta_path(key), self._data_path(key)):
+            try:
+                p.unlink()
+            except FileNotFoundError:
+                pass
+
+    def evict(self) -> int:
+        """Delete least recently used entries until the cache fits max_bytes. Returns entries removed."""
+        entries = []
+        total = 0
+        for meta_path in self.root.glob("*/*.json"):
+            key = meta_path.stem
+            try:
+                used = meta_path.stat().st_mtime
+                size = self._data_path(key).stat().st_size
+            except FileNotFoundError:
+                continue
+            entries.append((used, key, size))
+            total += size
+
+        removed = 0
+        with self._lock:
+            busy = {k for k, j in self._jobs.items() if not j.done}
+        for _, key, size in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if key in busy:
+                continue
+            self._remove(key)
+            total -= size
+            removed += 1
+        return removed
+
+    # === BACKGROUND BUILDS ===
+    def job(self, key: str) -> Optional[ExportJob]:
+        with self._lock:
+            return self._jobs.get(key)
+
+    def submit(
+        self,
+        key: str,
+        build: Callable[[Progress], tuple[bytes, str, str]],
+        *,
+        immutable: bool,
+    ) -> ExportJob:
+        """
+        Build the export for key in the background unless a build is already
+        running. build(progress) returns (data, mime, ext) and may call
+        progress(fraction, stage) as it goes.
+        """
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None and not job.done:
+                return job
+            #Finished jobs are rebuilt: callers only submit after get() missed (expired / evicted / failed)
+            job = self._jobs[key] = ExportJob(key=key)
+        self._pool.submit(self._run, job, build, immutable)
+        return job
+
+    def _run(self, job: ExportJob, build: Callable[[Progress], tuple[bytes, str, str]], immutable: bool):
+        try:
+            job.update(0.0, "starting")
+            data, mime, ext = build(job.update)
+            job.update(0.95, "saving")
+            job.artifact = self.put(job.key, data, mime=mime, ext=ext, immutable=immutable)
+            job.update(1.0, "done")
+        except Exception as e:
+            job.error = e
+            job.stage = "failed"
+        finally:
+            job.done = True
+            job._event.set()
+            self._forget_finished()
+
+    def _forget_finished(self, keep_sec: float = 600.0):
+        #Finished jobs are only kept long enough for their sessions to pick up the result
+        cutoff = time.time() - keep_sec
+        with self._lock:
+            for k in [k for k, j in self._jobs.items() if j.done and j.started_at < cutoff]:
+                del self._jobs[k]
@@ -0,0 +1,182 @@
+"""
+Online fill-rate estimate and time-to-full forecast per sensor.
+
+A bin's fill rate is modelled as base_rate * FILL_TRAFFIC_PROFILE[local hour] (%/h),
+the same time-of-day shape the R718x simulator uses. Every reading updates
+base_rate with a time-decayed exponentially weighted average of the rate seen since
+the previous reading, so a reading costs O(1) and a sensor's whole state is one row
+(STATE_COLUMNS), persisted in repository.FILL_RATE_STATE.
+
+update_state(state, readings) - apply a batch of readings (vectorised per round)
+forecast(state, now=None) - fleet-wide hours until fill_threshold and until 100%
+"""
+
+from __future__ import annotations
+from typing import Optional
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import pandas as pd
+
+from Model import sensor_state
+from Model.NetvoxR718x import FILL_TRAFFIC_PROFILE
+
+
+MEL_TZ = ZoneInfo("Australia/Melbourne")
+
+STATE_DTYPES = {
+    "sensor_id": "object",
+    "last_ts": "datetime64[ns, UTC]",
+    "last_fill": "float64",
+    "fill_threshold": "float64",
+    "base_rate": "float64",
+    "samples": "int64",
+}
+STATE_COLUMNS = list(STATE_DTYPES)
+
+#Weight of a rate sample halves every HALF_LIFE_H hours of newer data
+HALF_LIFE_H = 6.0
+#A fall of more than this many points between readings means the bin was emptied
+EMPTY_DROP = 5.0
+DEFAULT_THRESHOLD = 85
+
+_HOURS = np.arange(25, dtype="float64")
+_CUM = np.concatenate([[0.0], np.cumsum(np.asarray(FILL_TRAFFIC_PROFILE, dtype="float64"))])
+_DAY = _CUM[-1]
+
+
+# === PROFILE CLOCK ===
+def _local_hours(ts) -> np.ndarray:
+    """UTC instants as hours since the epoch on the Melbourne wall clock (NaT -> NaN)."""
+    utc = pd.to_datetime(pd.Series(ts), utc=True)
+    wall = utc.dt.tz_convert(MEL_TZ).dt.tz_localize(None)
+    return (wall - pd.Timestamp(0)).dt.total_seconds().to_numpy(dtype="float64") / 3600.0
+
+def profile_hours(u) -> np.ndarray:
+    """Profile-weighted hours elapsed up to local clock u; the difference of two is the expected fill / base_rate."""
+    u = np.asarray(u, dtype="float64")
+    days = np.floor(u / 24.0)
+    return days * _DAY + np.interp(u - days * 24.0, _HOURS, _CUM)
+
+def expected_rise(base_rate, t0, t1) -> np.ndarray:
+    """Fill points a bin filling at base_rate should gain between UTC instants t0 and t1."""
+    gained = profile_hours(_local_hours(t1)) - profile_hours(_local_hours(t0))
+    return np.asarray(base_rate, dtype="float64") * gained
+
+def _inverse_profile_hours(c) -> np.ndarray:
+    c = np.asarray(c, dtype="float64")
+    days = np.floor(c / _DAY)
+    return days * 24.0 + np.interp(c - days * _DAY, _CUM, _HOURS)
+
+
+# === ONLINE UPDATE ===
+def empty_state() -> pd.DataFrame:
+    return sensor_state.empty_state(STATE_DTYPES)
+
+def _apply_round(state: pd.DataFrame, prev: pd.DataFrame, rd: pd.DataFrame, half_life_h: float):
+    """One newer reading per sensor (rd, indexed by sensor_id) written into state over its rows prev."""
+    t0, t1 = prev["last_ts"], rd["timestamp"]
+    dt_h = ((t1 - t0).dt.total_seconds() / 3600.0).to_numpy()
+    known = prev["last_ts"].notna().to_numpy()
+
+    fill0 = prev["last_fill"].to_numpy(dtype="float64")
+    fill1 = rd["fill"].to_numpy(dtype="float64")
+    with np.errstate(invalid="ignore", divide="ignore"):
+        emptied = known & (fill1 < fill0 - EMPTY_DROP)
+        #Readings pinned at 100% say nothing about how fast the bin fills
+        learn = known & ~emptied & (fill0 < 100) & (fill1 < 100)
+
+        expected = profile_hours(_local_hours(t1)) - profile_hours(_local_hours(t0))
+        sample = np.clip(fill1 - fill0, 0, None) / expected
+        alpha = 1.0 - np.power(0.5, dt_h / half_life_h)
+
+    base = prev["base_rate"].to_numpy(dtype="float64")
+    base = np.where(learn & np.isnan(base), sample, np.where(learn, base + alpha * (sample - base), base))
+
+    thr = rd["fill_threshold"].to_numpy(dtype="float64")
+    thr = np.where(np.isnan(thr), prev["fill_threshold"].to_numpy(dtype="float64"), thr)
+
+    idx = rd.index
+    state.loc[idx, "last_ts"] = t1
+    state.loc[idx, "last_fill"] = fill1
+    state.loc[idx, "fill_threshold"] = thr
+    state.loc[idx, "base_rate"] = base
+    state.loc[idx, "samples"] = prev["samples"].fillna(0).to_numpy() + learn
+
+def update_state(state: Optional[pd.DataFrame], readings: pd.DataFrame, *, half_life_h: float = HALF_LIFE_H) -> pd.DataFrame:
+    """
+    Fold archive-shaped readings (sensor_id, timestamp, fill_level_percent[, fill_threshold])
+    into the state rows for their sensors. Returns the updated rows only (STATE_COLUMNS).
+    """
+    if readings is None or readings.empty:
+        return empty_state()
+
+    rd = pd.DataFrame({
+        "sensor_id": readings["sensor_id"].astype(str),
+        "timestamp": pd.to_datetime(readings["timestamp"], utc=True),
+        "fill": pd.to_numeric(readings["fill_level_percent"], errors="coerce"),
+        "fill_threshold": pd.to_numeric(sensor_state.column(readings, "fill_threshold"), errors="coerce"),
+    }).dropna(subset=["timestamp", "fill"])
+
+    st = sensor_state.batch_state(state, rd["sensor_id"], empty_state())
+    rd = sensor_state.drop_stale(rd, st)
+    for prev, rnd in sensor_state.rounds(st, rd):
+        _apply_round(st, prev, rnd, half_life_h)
+
+    out = st.rename_axis("sensor_id").reset_index()
+    out["samples"] = out["samples"].fillna(0).astype("int64")
+    return out[STATE_COLUMNS]
+
+
+# === FORECAST ===
+def _hours_to_reach(level, fill, rate, c0, u0) -> np.ndarray:
+    need = np.clip(level - fill, 0, None)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        c = np.where(rate > 0, c0 + need / rate, np.nan)
+    return _inverse_profile_hours(c) - u0
+
+def forecast(state: pd.DataFrame, now: Optional[pd.Timestamp] = None) -> pd.DataFrame:
+    """
+    Forecast for every sensor with state. Hours are from `now` (0 when already
+    past the level, NaN when the bin is not filling); ETAs are UTC epoch ms.
+    """
+    cols = ["DeviceID", "Fill", "Rate", "fill_threshold", "To Threshold (h)", "To Full (h)",
+            "Threshold ETA", "Full ETA", "samples"]
+    if state is None or state.empty:
+        return pd.DataFrame(columns=cols)
+
+    s = state.dropna(subset=["last_ts", "last_fill"])
+    now = pd.Timestamp.now(tz="UTC") if now is None else pd.Timestamp(now).tz_convert("UTC")
+
+    u0 = _local_hours(s["last_ts"])
+    c0 = profile_hours(u0)
+    u_now = _local_hours([now])[0]
+    base = s["base_rate"].to_numpy(dtype="float64")
+    fill = s["last_fill"].to_numpy(dtype="float64")
+    thr = s["fill_threshold"].fillna(DEFAULT_THRESHOLD).to_numpy(dtype="float64")
+
+    #Project the last reading forward to now along the profile
+    with np.errstate(invalid="ignore"):
+        fill_now = np.clip(fill + np.nan_to_num(base) * (profile_hours(u_now) - c0), 0, 100)
+    since_h = u_now - u0
+    to_thr = np.clip(_hours_to_reach(thr, fill, base, c0, u0) - since_h, 0, None)
+    to_full = np.clip(_hours_to_reach(100.0, fill, base, c0, u0) - since_h, 0, None)
+
+    now_ms = int(now.value // 1_000_000)
+    with np.errstate(invalid="ignore"):
+        thr_eta = now_ms + to_thr * 3_600_000
+        full_eta = now_ms + to_full * 3_600_000
+
+    hour = int(np.floor(u_now % 24))
+    out = pd.DataFrame({
+        "DeviceID": s["sensor_id"].astype(str).to_numpy(),
+        "Fill": fill_now.round(1),
+        "Rate": (base * FILL_TRAFFIC_PROFILE[hour]).round(2),
+        "fill_threshold": thr,
+        "To Threshold (h)": to_thr.round(1),
+        "To Full (h)": to_full.round(1),
+        "Threshold ETA": pd.array(np.where(np.isnan(thr_eta), np.nan, np.floor(thr_eta)), dtype="Float64").astype("Int64"),
+        "Full ETA": pd.array(np.where(np.isnan(full_eta), np.nan, np.floor(full_eta)), dtype="Float64").astype("Int64"),
+        "samples": s["samples"].fillna(0).astype("int64").to_numpy(),
+    })
+    return out.sort_values(["To Threshold (h)", "DeviceID"], na_position="last", kind="stable").reset_index(drop=True)
@@ -0,0 +1,89 @@
+"""
+Entry point for new sensor readings.
+
+ingest_rows(rows) writes the batch to the archive (repository.write_archive_rows)
+and, once that has succeeded, folds it into the per-sensor online estimators, so
+derived state is maintained in O(1) per reading instead of being recomputed from history:
+
+- fill rate / time-to-full (Model.fill_forecast -> repository.FILL_RATE_STATE)
+- sensor faults (Model.anomaly -> repository.ANOMALY_STATE, anomalies log)
+- empties / overflows (Model.bin_events -> repository.BIN_EVENT_STATE, bin_events)
+
+A batch whose insert fails leaves no derived state or anomalies behind. Each estimator
+skips readings at or before its sensor's last_ts, so a retried batch, or rows the
+archive rejected as duplicates, are not counted twice. Estimator failures are logged
+and never fail the archive write. The estimators' tables are Postgres-only, so with
+another storage backend only the archive is written.
+"""
+
+from __future__ import annotations
+from typing import Iterable, Mapping, Optional
+
+import pandas as pd
+
+from Model import logs, repository as repo
+from Model import anomaly, bin_events, fill_forecast
+
+
+_log = logs.get("ingest")
+
+
+def _update_fill_rate(batch: pd.DataFrame) -> pd.Series:
+    """Fold the batch into the fill-rate state; returns the pre-batch base rates by sensor_id."""
+    sensor_ids = batch["sensor_id"].dropna().astype(str).unique().tolist()
+    state = repo.fetch_state_df(repo.FILL_RATE_STATE, sensor_ids)
+    repo.upsert_state_df(repo.FILL_RATE_STATE, fill_forecast.update_state(state, batch))
+    return state.set_index("sensor_id")["base_rate"] if not state.empty else None
+
+
+def _detect_anomalies(batch: pd.DataFrame, rates: Optional[pd.Series]):
+    sensor_ids = batch["sensor_id"].dropna().astype(str).unique().tolist()
+    state = repo.fetch_state_df(repo.ANOMALY_STATE, sensor_ids)
+    new_state, found = anomaly.detect(state, batch, rates)
+    repo.write_anomalies(found)
+    repo.upsert_state_df(repo.ANOMALY_STATE, new_state)
+
+
+def _extract_events(batch: pd.DataFrame):
+    sensor_ids = batch["sensor_id"].dropna().astype(str).unique().tolist()
+    state = repo.fetch_state_df(repo.BIN_EVENT_STATE, sensor_ids)
+    new_state, events = bin_events.extract(state, batch)
+    repo.write_bin_events(events)
+    repo.upsert_state_df(repo.BIN_EVENT_STATE, new_state)
+
+
+def ingest_rows(
+    rows: Iterable[Mapping] | pd.DataFrame, *, weather_temps: Optional[Mapping[str, float]] = None
+) -> int:
+    """
+    Archive a batch of readings (row mappings, or a frame with those columns) and update
+    the online estimators. Returns rows inserted.
+    weather_temps (sensor_id -> weather feed temperature) enables the temperature check.
+    """
+    rows = rows.reset_index(drop=True) if isinstance(rows, pd.DataFrame) else list(rows)
+    batch = rows.copy() if isinstance(rows, pd.DataFrame) else pd.DataFrame(rows)
+    if not repo.backend().derived_tables:
+        return repo.write_archive_rows(rows)
+    if not batch.empty and weather_temps:
+        batch["weather_temp_c"] = batch["sensor_id"].map(weather_temps)
+
+    #Derived state only follows readings that made it into the archive
+    inserted = repo.write_archive_rows(rows)
+    if batch.empty:
+        return inserted
+
+    #The stuck-fill check compares against the rates from before this batch
+    rates = None
+    try:
+        rates = _update_fill_rate(batch)
+    except Exception as e:
+        _log.warning("fill-rate state update failed: %r", e, extra=logs.fields(rows=len(batch)))
+    try:
+        _detect_anomalies(batch, rates)
+    except Exception as e:
+        _log.warning("anomaly detection failed: %r", e, extra=logs.fields(rows=len(batch)))
+    try:
+        _extract_events(batch)
+    except Exception as e:
+        _log.warning("bin event extraction failed: %r", e, extra=logs.fields(rows=len(batch)))
+    return inserted
@@ -0,0 +1,243 @@
+"""
+Structured logging for the simulator and ingest paths, on stdlib logging.
+
+    log = logs.get("sim.cycle")
+    log.info("cycle", extra=logs.fields(sampled=120, sent=40))
+
+Loggers live under "smartbins."; the part after it is the record's category. The
+calling thread only runs the level check and the category filter and enqueues the
+record. A QueueListener thread formats it (key=value text or JSON lines) and writes
+it to stdout, so neither formatting nor I/O runs on the hot path. When the queue is
+full, records are dropped rather than blocking, and the next record written carries
+the count.
+
+Environment:
+    LOG_LEVEL       level for every category (INFO)
+    LOG_LEVELS      per-category levels, e.g. "sim.sensor=DEBUG,repository=WARNING"
+    LOG_FORMAT      text or json
+    LOG_RATE        at most N records per S seconds per category, e.g. "sim.sensor=60/60";
+                    the next record let through carries the count suppressed
+    LOG_SAMPLE      keep this fraction of a category's records below WARNING, e.g. "sim.sensor=0.05"
+    LOG_QUEUE_SIZE  records waiting for the writer thread before new ones are dropped
+
+Settings apply to a category and everything below it ("sim" covers "sim.sensor").
+"""
+
+from __future__ import annotations
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+
+ROOT = "smartbins"
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_LEVELS = os.environ.get("LOG_LEVELS", "")
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "text").lower()
+#Per-sensor lines are DEBUG; if someone turns them on at fleet scale, cap them
+LOG_RATE = os.environ.get("LOG_RATE", "sim.sensor=60/60")
+LOG_SAMPLE = os.environ.get("LOG_SAMPLE", "")
+LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", "10000"))
+
+
+def fields(**kw) -> dict:
+    """extra= for a record's structured fields."""
+    return {"fields": kw}
+
+
+def _parse(spec: str, convert) -> dict:
+    """'a=1,b.c=2' -> {'a': convert('1'), 'b.c': convert('2')}; bad entries are skipped with a warning."""
+    out = {}
+    for item in filter(None, (p.strip() for p in spec.split(","))):
+        try:
+            key, value = item.split("=", 1)
+            out[key.strip()] = convert(value.strip())
+        except ValueError as e:
+            print(f"WARNING: ignoring log setting {item!r}:", repr(e))
+    return out
+
+
+def _rate(value: str) -> tuple[int, float]:
+    n, _, window = value.partition("/")
+    return int(n), float(window or 1)
+
+
+def _category(name: str) -> str:
+    return name[len(ROOT) + 1:] if name.startswith(ROOT + ".") else name
+
+
+def _lookup(table: dict, category: str):
+    """Setting for category or its nearest parent."""
+    while category:
+        if category in table:
+            return table[category]
+        category = category.rpartition(".")[0]
+    return None
+
+
+# === FILTER ===
+class CategoryFilter(logging.Filter):
+    """Sampling (below WARNING) and rate limiting per category."""
+
+    def __init__(self, rates: dict[str, tuple[int, float]], samples: dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self.samples = samples
+        #category -> [window start, records let through, suppressed]
+        self._windows: dict[str, list] = {}
+        self._policy: dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def _policy_for(self, category: str) -> tuple:
+        policy = self._policy.get(category)
+        if policy is None:
+            policy = self._policy[category] = (_lookup(self.rates, category), _lookup(self.samples, category))
+        return policy
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        category = _category(record.name)
+        rate, sample = self._policy_for(category)
+        if sample is not None and record.levelno < logging.WARNING and random.random() >= sample:
+            return False
+        if rate is None:
+            return True
+        limit, window = rate
+        with self._lock:
+            w = self._windows.setdefault(category, [record.created, 0, 0])
+            if record.created - w[0] >= window:
+                w[0], w[1] = record.created, 0
+            if w[1] >= limit:
+                w[2] += 1
+                return False
+            w[1] += 1
+            if w[2]:
+                record.suppressed = w[2]
+                w[2] = 0
+        return True
+
+
+# === FORMATTERS ===
+def _value(v) -> str:
+    if isinstance(v, float):
+        return f"{v:.4g}"
+    s = str(v)
+    return json.dumps(s) if (not s or " " in s or "=" in s or '"' in s) else s
+
+
+def _extras(record: logging.LogRecord) -> dict:
+    out = dict(getattr(record, "fields", None) or {})
+    for key in ("suppressed", "queue_dropped"):
+        if getattr(record, key, None):
+            out[key] = getattr(record, key)
+    return out
+
+
+class TextFormatter(logging.Formatter):
+    """2024-05-01T10:00:00 INFO sim.cycle cycle sampled=120 sent=40"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = " ".join((
+            time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created)),
+            record.levelname,
+            _category(record.name),
+            record.getMessage(),
+            *(f"{k}={_value(v)}" for k, v in _extras(record).items()),
+        ))
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        doc = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "category": _category(record.name),
+            "msg": record.getMessage(),
+            **_extras(record),
+        }
+        if record.exc_info:
+            doc["exc"] = self.formatException(record.exc_info)
+        return json.dumps(doc, default=str)
+
+
+# === QUEUE HANDLER ===
+class _QueueHandler(QueueHandler):
+    def __init__(self, q: queue.Queue):
+        super().__init__(q)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        #The queue never leaves the process, so the listener formats the record itself.
+        #Log scalars or immutable values: args and fields are read when the record is written.
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        #Called under the handler lock
+        if self.dropped:
+            record.queue_dropped = self.dropped
+        try:
+            self.queue.put_nowait(record)
+            self.dropped = 0
+        except queue.Full:
+            self.dropped += 1
+
+
+class _Listener(QueueListener):
+    def enqueue_sentinel(self):
+        #Wait for room rather than lose the stop signal when the queue is full
+        self.queue.put(self._sentinel)
+
+
+_listener: Optional[QueueListener] = None
+_setup_lock = threading.Lock()
+
+
+def setup(level: Optional[str] = None, fmt: Optional[str] = None, stream=None) -> logging.Logger:
+    """Attach the queue handler to the "smartbins" logger once per process, from the environment."""
+    global _listener
+    root = logging.getLogger(ROOT)
+    with _setup_lock:
+        if _listener is not None:
+            return root
+        root.setLevel(level or LOG_LEVEL)
+        for category, cat_level in _parse(LOG_LEVELS, str.upper).items():
+            logging.getLogger(f"{ROOT}.{category}").setLevel(cat_level)
+        out = logging.StreamHandler(stream or sys.stdout)
+        out.setFormatter(JsonFormatter() if (fmt or LOG_FORMAT) == "json" else TextFormatter())
+        q: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        handler = _QueueHandler(q)
+        handler.addFilter(CategoryFilter(_parse(LOG_RATE, _rate), _parse(LOG_SAMPLE, float)))
+        root.addHandler(handler)
+        root.propagate = False
+        _listener = _Listener(q, out)
+        _listener.start()
+        atexit.register(shutdown)
+    return root
+
+
+def shutdown():
+    """Write out queued records and stop the writer thread."""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+            root = logging.getLogger(ROOT)
+            for h in [h for h in root.handlers if isinstance(h, _QueueHandler)]:
+                root.removeHandler(h)
+
+
+def get(category: str) -> logging.Logger:
+    """Logger for a category ("sim.cycle", "repository.write", ...), set up on first use."""
+    setup()
+    return logging.getLogger(f"{ROOT}.{category}")
@@ -0,0 +1,326 @@
+"""
+Process metrics in the Prometheus text format, without a client library.
+
+    ROWS = metrics.counter("smartbins_archive_rows_inserted_total", "Archive rows inserted", ("backend",))
+    ROWS.labels(backend="postgres").inc(n)
+
+    LATENCY = metrics.histogram("smartbins_repository_read_seconds", "Read latency", ("op",))
+    with LATENCY.labels(op="fetch_archive_df").time():
+        ...
+
+    metrics.gauge("smartbins_db_pool_checked_out", "Connections in use").set_function(pool.checkedout)
+
+Metrics are registered once per process by name (registering again returns the same
+metric), and updates are thread-safe. serve(port) answers GET /metrics from a daemon
+thread; serve_from_env() does that on METRICS_PORT and is a no-op when it is unset,
+so the simulator, gateway and dashboard processes each opt in on their own port.
+"""
+
+from __future__ import annotations
+import math
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Optional, Sequence
+
+from Model import logs
+
+
+METRICS_HOST = os.environ.get("METRICS_HOST", "127.0.0.1")
+
+_log = logs.get("metrics")
+
+#Prometheus client defaults, stretched to cover slow archive reads
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_PROCESS_START = time.time()
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(v: float) -> str:
+    if math.isinf(v):
+        return "+Inf" if v > 0 else "-Inf"
+    if math.isnan(v):
+        return "NaN"
+    return repr(float(v)) if not float(v).is_integer() else str(int(v))
+
+
+def _label_str(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+# === METRIC TYPES ===
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children: dict[tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, **labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        key = tuple(str(labels[n]) for n in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._child())
+        return child
+
+    def _unlabelled(self):
+        if self.labelnames:
+            raise ValueError(f"{self.name} needs labels {self.labelnames}")
+        return self.labels()
+
+    def _child(self):
+        raise NotImplementedError
+
+    def samples(self) -> list[str]:
+        raise NotImplementedError
+
+    def expose(self) -> str:
+        return "\n".join([f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}", *self.samples()])
+
+
+class _CounterChild:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        if amount < 0:
+            raise ValueError("counters only go up")
+        with self._lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    kind = "counter"
+    _child = _CounterChild
+
+    def inc(self, amount: float = 1.0):
+        self._unlabelled().inc(amount)
+
+    def samples(self) -> list[str]:
+        return [f"{self.name}{_label_str(self.labelnames, k)} {_format_value(c.value)}"
+                for k, c in list(self._children.items())]
+
+
+class _GaugeChild:
+    def __init__(self):
+        self.value = 0.0
+        self.function: Optional[Callable[[], float]] = None
+        self._lock = threading.Lock()
+
+    def set(self, value: float):
+        self.value = float(value)
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.inc(-amount)
+
+    def set_function(self, fn: Callable[[], float]):
+        """Read the value from fn at scrape time."""
+        self.function = fn
+
+    def read(self) -> float:
+        if self.function is None:
+            return self.value
+        try:
+            return float(self.function())
+        except Exception:
+            return math.nan
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+    _child = _GaugeChild
+
+    def set(self, value: float):
+        self._unlabelled().set(value)
+
+    def inc(self, amount: float = 1.0):
+        self._unlabelled().inc(amount)
+
+    def dec(self, amount: float = 1.0):
+        self._unlabelled().dec(amount)
+
+    def set_function(self, fn: Callable[[], float]):
+        self._unlabelled().set_function(fn)
+
+    def samples(self) -> list[str]:
+        return [f"{self.name}{_label_str(self.labelnames, k)} {_format_value(c.read())}"
+                for k, c in list(self._children.items())]
+
+
+class _HistogramChild:
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        #First bucket whose upper bound (le) is >= value; the last slot is +Inf
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    @contextmanager
+    def time(self):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self._unlabelled().observe(value)
+
+    def time(self):
+        return self._unlabelled().time()
+
+    def samples(self) -> list[str]:
+        out = []
+        for key, c in list(self._children.items()):
+            with c._lock:
+                counts, total = list(c.counts), c.sum
+            cumulative = 0
+            for bound, n in zip((*self.buckets, math.inf), counts):
+                cumulative += n
+                le = f'le="{_format_value(bound)}"'
+                out.append(f"{self.name}_bucket{_label_str(self.labelnames, key, le)} {cumulative}")
+            out.append(f"{self.name}_sum{_label_str(self.labelnames, key)} {_format_value(total)}")
+            out.append(f"{self.name}_count{_label_str(self.labelnames, key)} {cumulative}")
+        return out
+
+
+# === REGISTRY ===
+_registry: dict[str, _Metric] = {}
+_registry_lock = threading.Lock()
+
+
+def _register(cls, name: str, help: str, labelnames: Sequence[str], **kwargs):
+    with _registry_lock:
+        metric = _registry.get(name)
+        if metric is None:
+            metric = _registry[name] = cls(name, help, labelnames, **kwargs)
+        elif type(metric) is not cls or metric.labelnames != tuple(labelnames):
+            raise ValueError(f"metric {name} is already registered as a different {metric.kind}")
+    return metric
+
+
+def counter(name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+    return _register(Counter, name, help, labelnames)
+
+
+def gauge(name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+    return _register(Gauge, name, help, labelnames)
+
+
+def histogram(name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+    return _register(Histogram, name, help, labelnames, buckets=buckets)
+
+
+def timed(metric: Histogram, errors: Optional[Counter] = None, **labels):
+    """Decorator observing the call's duration in metric (and failures in errors) with labels."""
+    def wrap(fn):
+        @wraps(fn)
+        def inner(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            except Exception:
+                if errors is not None:
+                    errors.labels(**labels).inc()
+                raise
+            finally:
+                metric.labels(**labels).observe(time.perf_counter() - t0)
+        return inner
+    return wrap
+
+
+def exposition() -> str:
+    """Every registered metric in the Prometheus text format (version 0.0.4)."""
+    with _registry_lock:
+        metrics = list(_registry.values())
+    return "\n".join(m.expose() for m in metrics) + "\n"
+
+
+gauge("process_start_time_seconds", "Start time of the process since unix epoch in seconds.").set(_PROCESS_START)
+
+
+# === HTTP ENDPOINT ===
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = exposition().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        #Scrapes every few seconds would drown the process's own output
+        pass
+
+
+_server: Optional[ThreadingHTTPServer] = None
+_serve_failed = False
+
+
+def serve(port: int, host: str = METRICS_HOST) -> ThreadingHTTPServer:
+    """Start the /metrics endpoint once per process; later calls return the running server."""
+    global _server
+    with _registry_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, port), _Handler)
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+            _log.info("serving", extra=logs.fields(url=f"http://{host}:{port}/metrics"))
+    return _server
+
+
+def serve_from_env() -> Optional[ThreadingHTTPServer]:
+    global _serve_failed
+    port = os.environ.get("METRICS_PORT")
+    if not port or _serve_failed:
+        return None
+    try:
+        return serve(int(port))
+    except OSError as e:
+        #e.g. a second process on the same host; the first one keeps serving. Not retried on reruns.
+        _serve_failed = True
+        _log.warning("metrics endpoint not started: %r", e, extra=logs.fields(port=port))
+        return None
@@ -0,0 +1,142 @@
+"""
+Wire format of R718X uplink payloads (the LoRaWAN frm_payload, before base64).
+
+One 12 byte big-endian report frame, framed like Netvox's data reports
+(version, device type, report type, then readings):
+
+    offset  size  field
+    0       1     version          FRAME_VERSION
+    1       1     device type      DEVICE_TYPE
+    2       1     report type      REPORT_DATA
+    3       2     battery          uint16, mV
+    5       2     temperature      int16, 0.01 C
+    7       1     fill level       uint8, percent
+    8       1     fill threshold   uint8, percent
+    9       1     flags            FLAG_* bits
+    10      2     overflow count   uint16, wraps at 65536
+
+Devices don't send event times: FLAG_EMPTIED marks the first report after an empty,
+and the gateway stamps last_emptied / last_overflow with the uplink's receive time.
+
+Batches are one contiguous buffer of frames viewed through FRAME_DTYPE, so
+decode_frames / encode_frames convert whole columns at once; decode_frame /
+encode_frame are the one-frame forms. A frame is 16 base64 characters without
+padding, so the base64 of a batch is its frames' base64 strings joined.
+"""
+
+from __future__ import annotations
+from typing import Mapping, Union
+
+import numpy as np
+
+
+FRAME_DTYPE = np.dtype([
+    ("version", "u1"),
+    ("device_type", "u1"),
+    ("report_type", "u1"),
+    ("battery_mv", ">u2"),
+    ("temp_centi", ">i2"),
+    ("fill", "u1"),
+    ("threshold", "u1"),
+    ("flags", "u1"),
+    ("overflow_count", ">u2"),
+])
+FRAME_SIZE = FRAME_DTYPE.itemsize
+FRAME_B64_LEN = 4 * FRAME_SIZE // 3
+FRAME_VERSION = 0x01
+DEVICE_TYPE = 0xB8
+REPORT_DATA = 0x01
+
+FLAG_OVERFLOW = 0x01
+FLAG_FILL_ALARM = 0x02
+FLAG_LOW_BATTERY = 0x04
+FLAG_EMPTIED = 0x08
+
+LOW_BATTERY_V = 3.0
+
+Buffer = Union[bytes, bytearray, memoryview, np.ndarray]
+
+
+class FrameError(ValueError):
+    """Payload is not an R718X data report."""
+
+
+def frames_view(buf: Buffer) -> np.ndarray:
+    """The buffer as a FRAME_DTYPE array, without copying."""
+    if isinstance(buf, np.ndarray) and buf.dtype == FRAME_DTYPE:
+        return buf
+    size = buf.nbytes if isinstance(buf, (np.ndarray, memoryview)) else len(buf)
+    if size % FRAME_SIZE:
+        raise FrameError(f"{size} bytes is not a whole number of {FRAME_SIZE} byte frames")
+    return np.frombuffer(buf, dtype=FRAME_DTYPE)
+
+
+def decode_frames(buf: Buffer, *, strict: bool = True) -> dict[str, np.ndarray]:
+    """
+    Column arrays for a buffer of frames: the reading fields of NetvoxR718x.to_dict(),
+    the alarm flags, and `valid` (header is an R718X data report). With strict, any
+    invalid frame raises FrameError instead.
+    """
+    f = frames_view(buf)
+    valid = (f["version"] == FRAME_VERSION) & (f["device_type"] == DEVICE_TYPE) & (f["report_type"] == REPORT_DATA)
+    if strict and not valid.all():
+        bad = int(np.flatnonzero(~valid)[0])
+        raise FrameError(f"frame {bad} is not an R718X data report: {f[bad:bad + 1].tobytes()[:3].hex()}")
+    flags = f["flags"]
+    return {
+        "fill_level_percent": f["fill"].astype(np.float64),
+        "temperature_c": f["temp_centi"] / 100.0,
+        "battery_v": f["battery_mv"] / 1000.0,
+        "fill_threshold": f["threshold"].astype(np.int16),
+        "overflow": (flags & FLAG_OVERFLOW) != 0,
+        "overflow_count": f["overflow_count"].astype(np.int32),
+        "emptied": (flags & FLAG_EMPTIED) != 0,
+        "fill_alarm": (flags & FLAG_FILL_ALARM) != 0,
+        "low_battery": (flags & FLAG_LOW_BATTERY) != 0,
+        "valid": valid,
+    }
+
+
+def encode_frames(columns: Mapping) -> bytes:
+    """
+    One buffer of frames from equal-length columns named as in NetvoxR718x.to_dict()
+    (fill_level_percent, temperature_c, battery_v, fill_threshold, overflow,
+    overflow_count) plus an optional boolean `emptied`.
+    """
+    fill = np.rint(np.clip(np.asarray(columns["fill_level_percent"], dtype=np.float64), 0, 100)).astype(np.uint8)
+    battery_v = np.asarray(columns["battery_v"], dtype=np.float64)
+    f = np.zeros(len(fill), dtype=FRAME_DTYPE)
+    f["version"] = FRAME_VERSION
+    f["device_type"] = DEVICE_TYPE
+    f["report_type"] = REPORT_DATA
+    f["battery_mv"] = np.rint(battery_v * 1000)
+    f["temp_centi"] = np.rint(np.asarray(columns["temperature_c"], dtype=np.float64) * 100)
+    f["fill"] = fill
+    threshold = np.asarray(columns.get("fill_threshold", 0), dtype=np.uint8)
+    f["threshold"] = threshold
+    f["overflow_count"] = np.asarray(columns.get("overflow_count", 0), dtype=np.int64) & 0xFFFF
+    f["flags"] = (
+        np.where(np.asarray(columns.get("overflow", False), dtype=bool), FLAG_OVERFLOW, 0)
+        | np.where((threshold > 0) & (fill >= threshold), FLAG_FILL_ALARM, 0)
+        | np.where(battery_v < LOW_BATTERY_V, FLAG_LOW_BATTERY, 0)
+        | np.where(np.asarray(columns.get("emptied", False), dtype=bool), FLAG_EMPTIED, 0)
+    )
+    return f.tobytes()
+
+
+def decode_frame(payload: bytes) -> dict:
+    """Reading fields and alarm flags of one frame, as Python scalars."""
+    if len(payload) != FRAME_SIZE:
+        raise FrameError(f"expected {FRAME_SIZE} bytes, got {len(payload)}")
+    cols = decode_frames(payload)
+    cols.pop("valid")
+    return {k: v[0].item() for k, v in cols.items()}
+
+
+def encode_frame(reading: Mapping, *, emptied: bool = False) -> bytes:
+    """Frame for a NetvoxR718x.to_dict() row; emptied sets FLAG_EMPTIED."""
+    cols = {k: [reading.get(k) or 0] for k in (
+        "fill_level_percent", "temperature_c", "battery_v", "fill_threshold", "overflow_count")}
+    cols["overflow"] = [bool(reading.get("overflow"))]
+    cols["emptied"] = [emptied]
+    return encode_frames(cols)
@@ -0,0 +1,109 @@
+"""
+Report-on-change policy for sensor uplinks, as configured on real Netvox devices.
+
+A sensor samples on every tick but only sends a row when:
+- an event happened (emptied, overflow started / cleared, threshold changed)
+- fill, temperature or battery moved past its deadband since the last *sent* row
+- nothing was sent for heartbeat_sec (the next tick would otherwise exceed it)
+
+ReportGate holds the last sent row per sensor and a ReportPolicy per sensor
+(falling back to a default), and filters each batch down to the rows worth
+archiving. Readers rebuild the regular series with data_loader.fill_gaps.
+"""
+
+from __future__ import annotations
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Iterable, Mapping, Optional
+
+import pandas as pd
+
+
+_EVENT_FIELDS = ("last_emptied", "overflow", "overflow_count", "fill_threshold")
+_DEADBANDS = (
+    ("fill_level_percent", "fill_deadband", "fill"),
+    ("temperature_c", "temp_deadband", "temperature"),
+    ("battery_v", "battery_deadband", "battery"),
+)
+
+
+@dataclass(frozen=True)
+class ReportPolicy:
+    fill_deadband: float = 2.0
+    temp_deadband: float = 1.0
+    battery_deadband: float = 0.01
+    heartbeat_sec: float = 1800.0
+
+    def reason(self, last: Optional[Mapping], row: Mapping, *, horizon_sec: float = 0.0) -> Optional[str]:
+        """
+        Why row should be sent given the last sent row, or None to suppress it.
+        horizon_sec is the time until the sensor's next tick.
+        """
+        if last is None:
+            return "first"
+        for f in _EVENT_FIELDS:
+            if _changed(last.get(f), row.get(f)):
+                return "event"
+        for col, band, label in _DEADBANDS:
+            a, b = _num(last.get(col)), _num(row.get(col))
+            if a is not None and b is not None and abs(b - a) >= getattr(self, band):
+                return label
+        t0, t1 = last.get("timestamp"), row.get("timestamp")
+        if t0 is None or t1 is None:
+            return "heartbeat"
+        age = (_utc(t1) - _utc(t0)).total_seconds()
+        return "heartbeat" if age + horizon_sec > self.heartbeat_sec else None
+
+
+def _num(v) -> Optional[float]:
+    try:
+        return None if v is None or pd.isna(v) else float(v)
+    except (TypeError, ValueError):
+        return None
+
+
+def _utc(v) -> pd.Timestamp:
+    #Archived rows (seed) come back naive UTC; live rows are tz-aware
+    ts = pd.Timestamp(v)
+    return ts.tz_localize("UTC") if ts.tzinfo is None else ts.tz_convert("UTC")
+
+
+def _changed(a, b) -> bool:
+    a_na, b_na = a is None or pd.isna(a), b is None or pd.isna(b)
+    if a_na or b_na:
+        return a_na != b_na
+    if isinstance(a, datetime) or isinstance(b, datetime):
+        return _utc(a) != _utc(b)
+    return a != b
+
+
+class ReportGate:
+    def __init__(self, default: Optional[ReportPolicy] = None):
+        self.default = default or ReportPolicy()
+        self._policies: dict[str, ReportPolicy] = {}
+        self._last: dict[str, dict] = {}
+        self.sent = 0
+        self.suppressed = 0
+
+    def set_policy(self, sensor_id: str, policy: ReportPolicy):
+        self._policies[str(sensor_id)] = policy
+
+    def policy(self, sensor_id: str) -> ReportPolicy:
+        return self._policies.get(str(sensor_id), self.default)
+
+    def seed(self, row: Mapping):
+        """Record a row as already sent (e.g. the latest archived row on restart)."""
+        self._last[str(row["sensor_id"])] = dict(row)
+
+    def filter(self, rows: Iterable[Mapping], *, horizon_sec: float = 0.0) -> list[dict]:
+        """Rows that pass their sensor's policy, in order; the passed rows become the new baselines."""
+        out = []
+        for row in rows:
+            sid = str(row["sensor_id"])
+            if self.policy(sid).reason(self._last.get(sid), row, horizon_sec=horizon_sec) is None:
+                self.suppressed += 1
+                continue
+            self._last[sid] = dict(row)
+            self.sent += 1
+            out.append(dict(row))
+        return out
@@ -4,57 +4,246 @@ Helper functions:
 
 engine() - returns an SQLAlchemy engine connected to the database.
 
-write_archive_rows(rows) - writes multiple rows of bin data to the archive table.
+write_archive_rows(rows) - writes multiple rows of bin data to the archive table, bumps the
+    ingest version token and NOTIFYs listeners when rows were inserted.
 
 upsert_static_bins(df_coords) - upserts static bin coordinate data to the static_bins_data table.
 
 truncate_archive(*, restart_identity: bool =True) - truncates archive table, optionally restarts id column
 
 truncate_static() - truncates static bin table data.
+
+fetch_state_df(table, sensor_ids) / upsert_state_df(table, df) - per-sensor state rows
+    kept by the online estimators (e.g. FILL_RATE_STATE for Model.fill_forecast).
+
+write_anomalies(df) / fetch_anomalies_df(...) - sensor faults found by Model.anomaly at ingest.
+
+write_bin_events(df) / fetch_bin_events_df(...) / fetch_bin_event_summary_df(...) - empties and
+    overflows extracted at ingest by Model.bin_events, so event analytics read O(events) rows.
+
+fetch_archive_summary_df(...) - archive readings aggregated per time bucket inside the store.
+
+Archive, snapshot and static-bin functions delegate to backend(), chosen by
+STORAGE_BACKEND (Model.storage): PostgresBackend below, or an embedded DuckDB file
+(Model.duckdb_backend). Everything else here is Postgres-only. The duckdb package is
+only imported for STORAGE_BACKEND=duckdb; it is in dependencies.txt for the app, and
+a worker installed from requirements.txt needs `pip install duckdb` to use it.
+
+Postgres reads go through pd.read_sql_query, or through COPY + pyarrow when
+READ_BACKEND allows it (see ARROW READ PATH).
+
+tier_archive() moves closed months of the archive into Parquet under ARCHIVE_TIER_DIR
+(Model.archive_tier); fetch_archive_df / fetch_archive_arrow then read Postgres,
+Parquet or both depending on the requested range.
 """
 
 
 from __future__ import annotations
+import io
 import os
 import time
-import requests
 import pandas as pd
-from sqlalchemy import create_engine, text
 from typing import Iterable, Mapping, Sequence, Optional
 from datetime import datetime, timezone
 
+from Model import logs, metrics
+from Model.archive_tier import ParquetTier, month_bounds, month_key
+from Model.storage import (
+    ARCHIVE_COLUMNS, NAMED_PARAM, SNAPSHOT_UI_COLUMNS, SNAPSHOT_UI_TIMES, STATE_SORT_COLUMNS,
+    SUMMARY_COLUMNS, StorageBackend, like_prefix, state_page_filters,
+)
+
 
 _schema = "smartbins"
 _archive = f"{_schema}.archive_bin_data"
 _static = f"{_schema}.static_bin_data"
+_ingest_version = f"{_schema}.ingest_version"
+FILL_RATE_STATE = f"{_schema}.fill_rate_state"
+ANOMALY_STATE = f"{_schema}.anomaly_state"
+_anomalies = f"{_schema}.sensor_anomalies"
+BIN_EVENT_STATE = f"{_schema}.bin_event_state"
+_bin_events = f"{_schema}.bin_events"
+
+#How far back the live snapshot looks for a sensor's latest anomaly
+ANOMALY_LOOKBACK_SEC = int(os.environ.get("ANOMALY_LOOKBACK_SEC", str(6 * 3600)))
+
+#Postgres NOTIFY channel raised after every batch that inserted rows
+INGEST_CHANNEL = "smartbins_ingest"
 
 # === DATABASE CONNECTION ===
+#Only the Postgres backend needs it, so it is checked on first use rather than at import
 DB_URL = os.environ.get("DATABASE_URL")
-if not DB_URL:
-    raise RuntimeError("Set DATABASE_URL env variable before running.")
 
 _engine = None
 
 def engine():
     global _engine
     if _engine is None:
+        if not DB_URL:
+            raise RuntimeError("Set DATABASE_URL env variable before running.")
+        from sqlalchemy import create_engine
         _engine = create_engine(DB_URL, pool_pre_ping=True)
     return _engine
 
+def text(sql: str):
+    #SQLAlchemy is imported on first query, not at import: it is a large share of cold start
+    #and the app shell / DuckDB backend never need it
+    from sqlalchemy import text as _text
+    return _text(sql)
+
+
+# === STORAGE BACKEND ===
+#"postgres" (default) or "duckdb": an embedded columnar file at DUCKDB_PATH, no server needed
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "postgres").lower()
+DUCKDB_PATH = os.environ.get("DUCKDB_PATH", "smartbins.duckdb")
+
+_backend = None
+
+def backend() -> StorageBackend:
+    global _backend
+    if _backend is None:
+        if STORAGE_BACKEND == "postgres":
+            _backend = PostgresBackend()
+        elif STORAGE_BACKEND == "duckdb":
+            from Model.duckdb_backend import DuckDBBackend
+            _backend = DuckDBBackend(DUCKDB_PATH)
+        else:
+            raise ValueError(f"Unknown STORAGE_BACKEND {STORAGE_BACKEND!r} (postgres or duckdb)")
+    return _backend
+
+def uses_postgres() -> bool:
+    return backend().name == "postgres"
+
+
+# === METRICS ===
+#Exposed by metrics.serve_from_env() in whichever process writes or reads
+_ROWS_ATTEMPTED = metrics.counter(
+    "smartbins_archive_rows_attempted_total", "Rows passed to write_archive_rows.", ("backend",))
+_ROWS_INSERTED = metrics.counter(
+    "smartbins_archive_rows_inserted_total", "Archive rows inserted.", ("backend",))
+_ROWS_CONFLICTED = metrics.counter(
+    "smartbins_archive_rows_conflicted_total", "Rows skipped as duplicate (sensor_id, timestamp).", ("backend",))
+_WRITE_SECONDS = metrics.histogram(
+    "smartbins_archive_write_seconds", "write_archive_rows latency per batch.", ("backend",))
+_WRITE_ERRORS = metrics.counter(
+    "smartbins_archive_write_errors_total", "write_archive_rows batches that raised.", ("backend",))
+_READ_SECONDS = metrics.histogram(
+    "smartbins_repository_read_seconds", "Repository read latency.", ("op",))
+_READ_ERRORS = metrics.counter(
+    "smartbins_repository_read_errors_total", "Repository reads that raised.", ("op",))
+_WEATHER_LOOKUPS = metrics.counter(
+    "smartbins_weather_lookups_total", "Weather lookups by cache result (hit, miss).", ("result",))
+_WEATHER_SECONDS = metrics.histogram(
+    "smartbins_weather_request_seconds", "Open-Meteo request latency on cache misses.")
+
+_write_log = logs.get("repository.write")
+_tier_log = logs.get("repository.tier")
+
+def _read_timer(op: str):
+    return metrics.timed(_READ_SECONDS, _READ_ERRORS, op=op)
+
+def _pool_stat(stat: str):
+    #Read at scrape time; 0 until the Postgres engine exists
+    def read() -> float:
+        pool = getattr(_engine, "pool", None)
+        fn = getattr(pool, stat, None)
+        return fn() if callable(fn) else 0
+    return read
+
+for _stat, _help in (
+    ("checkedout", "Pooled database connections in use."),
+    ("size", "Database connection pool size."),
+    ("overflow", "Connections opened beyond the pool size (negative while the pool is filling)."),
+):
+    metrics.gauge(f"smartbins_db_pool_{_stat}", _help).set_function(_pool_stat(_stat))
+
+
+# === ARCHIVE TIERING ===
+#Unset = no cold tier: everything stays in Postgres and reads never touch Parquet
+ARCHIVE_TIER_DIR = os.environ.get("ARCHIVE_TIER_DIR")
+#Months that ended more than this many days ago are moved by tier_archive()
+TIER_AFTER_DAYS = int(os.environ.get("TIER_AFTER_DAYS", "90"))
+
+_tier = None
+
+def archive_tier() -> Optional[ParquetTier]:
+    global _tier
+    if _tier is None and ARCHIVE_TIER_DIR:
+        _tier = ParquetTier(ARCHIVE_TIER_DIR)
+    return _tier
+
+
+# === ARROW READ PATH ===
+#"arrow" streams results out with COPY ... TO STDOUT and parses them with pyarrow's
+#multithreaded CSV reader, so no Python object is built per cell. "pandas" keeps
+#pd.read_sql_query. "auto" (default) uses arrow when pyarrow is installed.
+READ_BACKEND = os.environ.get("READ_BACKEND", "auto").lower()
+
+def arrow_available() -> bool:
+    if READ_BACKEND == "pandas":
+        return False
+    try:
+        import pyarrow.csv  # noqa: F401
+    except ImportError:
+        if READ_BACKEND == "arrow":
+            raise
+        return False
+    return True
+
+def _copy_sql(cur, sql: str, params: Optional[Mapping]) -> str:
+    """Wrap a query in COPY, inlining bound params with psycopg2's own quoting."""
+    body = sql.strip().rstrip(";")
+    if params:
+        body = cur.mogrify(NAMED_PARAM.sub(r"%(\1)s", body.replace("%", "%%")), dict(params)).decode()
+    return f"COPY ({body}) TO STDOUT WITH (FORMAT csv, HEADER true)"
+
+def read_arrow(conn, sql: str, params: Optional[Mapping] = None):
+    """
+    Run a SELECT on an open SQLAlchemy connection (same transaction) and return a
+    pyarrow Table. Bools come back from Postgres CSV as t/f; unquoted empty fields are NULL.
+    """
+    import pyarrow.csv as pacsv
+
+    buf = io.BytesIO()
+    with conn.connection.dbapi_connection.cursor() as cur:
+        cur.copy_expert(_copy_sql(cur, sql, params), buf)
+    buf.seek(0)
+    return pacsv.read_csv(buf, convert_options=pacsv.ConvertOptions(
+        true_values=["t"], false_values=["f"],
+        strings_can_be_null=True, quoted_strings_can_be_null=False,
+    ))
+
+def _read_frame(conn, sql: str, params: Optional[Mapping] = None) -> pd.DataFrame:
+    if arrow_available():
+        #split_blocks/self_destruct let numeric columns become numpy arrays without a consolidating copy
+        return read_arrow(conn, sql, params).to_pandas(split_blocks=True, self_destruct=True)
+    return pd.read_sql_query(text(sql), conn, params=params)
+
 
 # === WRITE HELPERS ===
-def write_archive_rows(rows: Iterable[Mapping]):
-    df = pd.DataFrame(list(rows))
+def write_archive_rows(rows: Iterable[Mapping] | pd.DataFrame):
+    df = rows if isinstance(rows, pd.DataFrame) else pd.DataFrame(list(rows))
     if df.empty:
-        return
-    
-    cols = [
-        "sensor_id", "timestamp", "fill_level_percent", "temperature_c",
-        "battery_v", "fill_threshold", "last_emptied", "overflow",
-        "overflow_count", "last_overflow"
-    ]
-    df = df.reindex(columns=cols)
+        return 0
+
+    df = df.reindex(columns=ARCHIVE_COLUMNS)
+    store = backend()
+    _ROWS_ATTEMPTED.labels(backend=store.name).inc(len(df))
+    try:
+        with _WRITE_SECONDS.labels(backend=store.name).time():
+            inserted = store.write_archive_rows(df)
+    except Exception:
+        _WRITE_ERRORS.labels(backend=store.name).inc()
+        raise
+    _ROWS_INSERTED.labels(backend=store.name).inc(inserted)
+    _ROWS_CONFLICTED.labels(backend=store.name).inc(len(df) - inserted)
+
+    _write_log.debug("archive write", extra=logs.fields(
+        backend=store.name, attempted=len(df), inserted=inserted, conflicts=len(df) - inserted))
+    return inserted
 
+def _pg_write_archive_rows(df: pd.DataFrame) -> int:
+    cols = ARCHIVE_COLUMNS
     sql = f"""
         INSERT INTO {_archive} ({", ".join(cols)})
         VALUES ({", ".join([f":{c}" for c in cols])})
@@ -62,18 +251,24 @@ def write_archive_rows(rows: Iterable[Mapping]):
         RETURNING 1;
     """
 
+    #NaT / NaN as NULL: frames from the gateway carry them for sensors without events
+    records = df.astype(object).where(df.notna(), None).to_dict(orient="records")
     inserted = 0
     with engine().begin() as conn:
-        res = conn.execute(text(sql), df.to_dict(orient="records"))
+        res = conn.execute(text(sql), records)
         try:
             inserted = len(res.fetchall())
         except Exception:
             inserted = res.rowcount or 0
 
-    print(f"DB insert summary: attempted={len(df)} inserted={inserted} (conflicts={len(df)-inserted})")
+        if inserted:
+            _bump_ingest_version(conn, inserted)
+    return inserted
 
 def upsert_static_bins(df_coords: pd.DataFrame):
-    df = df_coords[["bin_id", "sensor_id", "lat", "lng"]].copy()
+    backend().upsert_static_bins(df_coords[["bin_id", "sensor_id", "lat", "lng"]].copy())
+
+def _pg_upsert_static_bins(df: pd.DataFrame):
     eng = engine()
     with eng.begin() as conn:
         conn.exec_driver_sql(f"CREATE TEMP TABLE tmp_bins (LIKE {_static} INCLUDING ALL);")
@@ -88,35 +283,85 @@ def upsert_static_bins(df_coords: pd.DataFrame):
             DROP TABLE tmp_bins;
         """)
 
-# === READ HELPERS ===
-def fetch_archive_df(
-    *,
-    since: Optional[datetime | str] = None,
-    until: Optional[datetime | str] = None,
-    sensor_ids: Optional[Sequence[str]] = None,
-    limit: Optional[int] = None,
-    columns: str = "*"
-) -> pd.DataFrame:
+# === INGEST CHANGE NOTIFICATION ===
+def _bump_ingest_version(conn, inserted: int):
     """
-    Fetches the rows from the archive table as a DataFrame.
+    Bump the data-version token and NOTIFY listeners, inside the insert's transaction
+    (the notification is only delivered if the insert commits).
+    A savepoint keeps a missing token table from rolling back the insert itself.
+    """
+    try:
+        with conn.begin_nested():
+            version = conn.execute(text(f"""
+                UPDATE {_ingest_version}
+                SET version = version + 1, updated_at = NOW()
+                WHERE id = 1
+                RETURNING version;
+            """)).scalar()
+            conn.execute(
+                text("SELECT pg_notify(:channel, :payload);"),
+                {"channel": INGEST_CHANNEL, "payload": f"{version or 0}:{inserted}"}
+            )
+    except Exception as e:
+        _write_log.warning("ingest version bump failed: %r", e)
 
-    Behaviour:
-    - If no filters are provided, returns the entire table.
-    - If since/until are provided, applies a time range filter (UTC).
-    - If sensor_ids are provided, filters by those ids.
-    - Results are ordered by bin_id and timestamp.
+@_read_timer("fetch_ingest_version")
+def fetch_ingest_version() -> int:
+    """Current data-version token; changes whenever new archive rows are committed."""
+    return backend().fetch_ingest_version()
 
-    Args:
-        since: Optional datetime or ISO string to filter rows from (inclusive).
-        until: Optional datetime or ISO string to filter rows until (exclusive).
-        sensor_ids: Optional list of sensor ids to filter by.
-        limit: Optional maximum number of rows to return
-        columns: SQL select list (default "*").
+def _pg_fetch_ingest_version() -> int:
+    with engine().begin() as conn:
+        v = conn.execute(text(f"SELECT version FROM {_ingest_version} WHERE id = 1;")).scalar()
+    return int(v or 0)
 
-    Returns:
-        Pandas DataFrame with raw DB column names.
+class IngestListener:
     """
+    Dedicated LISTEN connection on INGEST_CHANNEL.
+
+    LISTEN needs a session-level connection, so this does not go through the
+    SQLAlchemy pool. Transaction-mode poolers (e.g. Supabase on :6543) drop
+    notifications - point INGEST_LISTEN_URL at a direct connection in that case.
+    """
+
+    def __init__(self, url: str | None = None):
+        import psycopg2
+        from sqlalchemy.engine import make_url
 
+        u = make_url(url or os.environ.get("INGEST_LISTEN_URL") or DB_URL)
+        args = u.translate_connect_args(username="user", database="dbname")
+        self._conn = psycopg2.connect(**args, **dict(u.query))
+        self._conn.autocommit = True
+        with self._conn.cursor() as cur:
+            cur.execute(f"LISTEN {INGEST_CHANNEL};")
+
+    def wait(self, timeout: float) -> bool:
+        """Block up to timeout seconds; True if at least one notification arrived."""
+        import select
+
+        if self._conn.notifies:
+            self._conn.notifies.clear()
+            return True
+        ready, _, _ = select.select([self._conn], [], [], max(0.0, timeout))
+        if not ready:
+            return False
+        self._conn.poll()
+        got = bool(self._conn.notifies)
+        self._conn.notifies.clear()
+        return got
+
+    def close(self):
+        try:
+            self._conn.close()
+        except Exception:
+            pass
+
+# === READ HELPERS ===
+def _archive_where(
+    since: Optional[datetime | str],
+    until: Optional[datetime | str],
+    sensor_ids: Optional[Sequence[str]],
+) -> tuple[str, dict]:
     where_clauses: list[str] = []
     params: dict[str, object] = {}
 
@@ -143,6 +388,16 @@ def fetch_archive_df(
         params["sensor_ids"] = list(sensor_ids)
 
     where_sql = ("WHERE " + " AND ".join(where_clauses)) if where_clauses else ""
+    return where_sql, params
+
+def _archive_query(
+    since: Optional[datetime | str],
+    until: Optional[datetime | str],
+    sensor_ids: Optional[Sequence[str]],
+    limit: Optional[int],
+    columns: str,
+) -> tuple[str, dict]:
+    where_sql, params = _archive_where(since, until, sensor_ids)
     lim_sql = f" LIMIT {int(limit)}" if limit else ""
     order_sql = "ORDER BY sensor_id, timestamp"
 
@@ -151,17 +406,250 @@ def fetch_archive_df(
         FROM {_archive}
         {where_sql}
         {order_sql}
-        {lim_sql};
+        {lim_sql}
     """
+    return sql, params
 
+@_read_timer("fetch_archive_df")
+def fetch_archive_df(
+    *,
+    since: Optional[datetime | str] = None,
+    until: Optional[datetime | str] = None,
+    sensor_ids: Optional[Sequence[str]] = None,
+    limit: Optional[int] = None,
+    columns: str = "*"
+) -> pd.DataFrame:
+    """
+    Fetches the rows from the archive table as a DataFrame.
+
+    Behaviour:
+    - If no filters are provided, returns the entire table.
+    - If since/until are provided, applies a time range filter (UTC).
+    - If sensor_ids are provided, filters by those ids.
+    - Results are ordered by bin_id and timestamp.
+
+    Args:
+        since: Optional datetime or ISO string to filter rows from (inclusive).
+        until: Optional datetime or ISO string to filter rows until (exclusive).
+        sensor_ids: Optional list of sensor ids to filter by.
+        limit: Optional maximum number of rows to return
+        columns: SQL select list (default "*").
+
+    Returns:
+        Pandas DataFrame with raw DB column names.
+    """
+    cold, hot = _archive_route(since, until)
+    frames = []
+    if hot:
+        frames.append(backend().fetch_archive_df(since, until, sensor_ids, limit, columns))
+    if cold is not None:
+        table = cold.read(since=since, until=until, sensor_ids=sensor_ids, columns=_column_list(columns), limit=limit)
+        if table is not None:
+            frames.append(_naive_utc_times(table.to_pandas()))
+    return _merge_tiers(frames, limit)
+
+def _pg_fetch_archive_df(since, until, sensor_ids, limit, columns) -> pd.DataFrame:
+    sql, params = _archive_query(since, until, sensor_ids, limit, columns)
     with engine().begin() as conn:
-        return pd.read_sql_query(text(sql), conn, params=params)
-    
+        return _read_frame(conn, sql, params)
+
+def _archive_route(since, until) -> tuple[Optional[ParquetTier], bool]:
+    """(cold tier to read or None, whether to read Postgres) for a [since, until) range."""
+    tier = archive_tier()
+    boundary = tier.boundary() if tier is not None else None
+    if boundary is None:
+        return None, True
+    cold = since is None or _utc_ts(since) < boundary
+    hot = until is None or _utc_ts(until) > boundary
+    if cold and not hot:
+        #Postgres can still hold rows before the boundary: a month mid-move, or late
+        #readings for a tiered month; _merge_tiers drops a reading found in both
+        oldest = _hot_oldest_ts()
+        hot = oldest is not None and (until is None or _utc_ts(oldest) < _utc_ts(until))
+    return (tier if cold else None), hot
+
+def _hot_oldest_ts():
+    #One probe of ix_archive_ts
+    with engine().begin() as conn:
+        return conn.execute(text(f'SELECT MIN("timestamp") FROM {_archive}')).scalar()
 
+def _utc_ts(ts) -> pd.Timestamp:
+    #Naive values are UTC, as in _archive_query
+    t = pd.Timestamp(ts)
+    return t.tz_localize("UTC") if t.tzinfo is None else t.tz_convert("UTC")
+
+def _column_list(columns: str) -> Optional[list[str]]:
+    if columns.strip() == "*":
+        return None
+    return [c.strip().strip('"') for c in columns.split(",")]
+
+def _naive_utc_times(df: pd.DataFrame) -> pd.DataFrame:
+    #Parquet keeps UTC instants; archive rows carry naive UTC like the hot store
+    for c in df.columns:
+        if isinstance(df[c].dtype, pd.DatetimeTZDtype):
+            df[c] = df[c].dt.tz_convert("UTC").dt.tz_localize(None)
+    return df
+
+def _merge_tiers(frames: list[pd.DataFrame], limit: Optional[int]) -> pd.DataFrame:
+    """Hot and cold rows in archive order; a reading present in both (mid-move) is kept once."""
+    frames = [f for f in frames if not f.empty] or frames[:1]
+    if len(frames) <= 1:
+        return frames[0] if frames else pd.DataFrame()
+    df = pd.concat([_naive_utc_times(f) for f in frames], ignore_index=True)
+    keys = [c for c in ("sensor_id", "timestamp") if c in df.columns]
+    if len(keys) == 2:
+        df = df.drop_duplicates(keys, keep="first").sort_values(keys, kind="stable")
+    return (df.head(int(limit)) if limit else df).reset_index(drop=True)
+
+@_read_timer("fetch_archive_arrow")
+def fetch_archive_arrow(
+    *,
+    since: Optional[datetime | str] = None,
+    until: Optional[datetime | str] = None,
+    sensor_ids: Optional[Sequence[str]] = None,
+    limit: Optional[int] = None,
+    columns: str = "*",
+    with_coords: bool = False,
+):
+    """
+    Same rows as fetch_archive_df as a pyarrow Table (requires pyarrow), for
+    consumers that can take Arrow directly such as Parquet/Feather exports.
+    with_coords adds bin_id, lat and lng from the static table.
+    """
+    import pyarrow as pa
+
+    cold, hot = _archive_route(since, until)
+    tables = []
+    if hot:
+        tables.append(backend().fetch_archive_arrow(since, until, sensor_ids, limit, columns, with_coords))
+    if cold is not None:
+        table = cold.read(since=since, until=until, sensor_ids=sensor_ids, columns=_column_list(columns), limit=limit)
+        if table is not None and with_coords:
+            static = backend().fetch_static_bins_df()[["sensor_id", "bin_id", "lat", "lng"]]
+            static_schema = pa.schema([("sensor_id", pa.string()), ("bin_id", pa.string()),
+                                       ("lat", pa.float64()), ("lng", pa.float64())])
+            static = pa.Table.from_pandas(static, schema=static_schema, preserve_index=False)
+            table = table.join(static, keys="sensor_id", join_type="left outer")
+        if table is not None:
+            tables.append(table)
+
+    if len(tables) == 1:
+        return tables[0] if hot else tables[0].sort_by([("sensor_id", "ascending"), ("timestamp", "ascending")])
+    if not tables:
+        return pa.table({})
+    return pa.Table.from_pandas(_merge_tiers([t.to_pandas() for t in tables], limit), preserve_index=False)
+
+def _pg_fetch_archive_arrow(since, until, sensor_ids, limit, columns, with_coords):
+    sql, params = _archive_query(since, until, sensor_ids, limit, columns)
+    if with_coords:
+        sql = f"""
+            SELECT q.*, s.bin_id, s.lat, s.lng
+            FROM ({sql}) q
+            LEFT JOIN {_static} s ON s.sensor_id = q.sensor_id
+            ORDER BY q.sensor_id, q."timestamp"
+        """
+    with engine().begin() as conn:
+        return read_arrow(conn, sql, params)
+
+@_read_timer("fetch_archive_summary_df")
+def fetch_archive_summary_df(
+    *,
+    since: Optional[datetime | str] = None,
+    until: Optional[datetime | str] = None,
+    sensor_ids: Optional[Sequence[str]] = None,
+    bucket: str | pd.Timedelta = "1h",
+    per_sensor: bool = True,
+) -> pd.DataFrame:
+    """
+    Archive readings aggregated into time buckets (e.g. "1h", "1D") in the store, so
+    trend analytics never pull raw rows: readings, fill_avg, fill_max, temp_avg and
+    battery_min per (sensor_id, bucket), or per bucket across all sensors when
+    per_sensor is False (sensor_id is then NULL). bucket is naive UTC, epoch-aligned.
+    Tiered months are aggregated from Parquet with pyarrow.
+    """
+    bucket_sec = int(pd.Timedelta(bucket).total_seconds())
+    if bucket_sec <= 0:
+        raise ValueError("bucket must be positive")
+    cold, hot = _archive_route(since, until)
+    frames = []
+    if hot:
+        frames.append(backend().fetch_archive_summary_df(since, until, sensor_ids, bucket_sec, per_sensor))
+    if cold is not None:
+        table = cold.read(since=since, until=until, sensor_ids=sensor_ids, columns=list(_SUMMARY_INPUTS))
+        if table is not None and table.num_rows:
+            frames.append(_summarise_arrow(table, bucket_sec, per_sensor))
+    frames = [f for f in frames if not f.empty]
+    if len(frames) <= 1:
+        return frames[0] if frames else pd.DataFrame(columns=SUMMARY_COLUMNS)
+
+    #A bucket on the tier boundary can have rows in both stores: combine weighted by readings
+    df = pd.concat(frames, ignore_index=True)
+    keys = ["sensor_id", "bucket"] if per_sensor else ["bucket"]
+    w = df["readings"]
+    df = df.assign(fill_avg=df["fill_avg"] * w, temp_avg=df["temp_avg"] * w)
+    out = df.groupby(keys, dropna=False, sort=True).agg(
+        readings=("readings", "sum"), fill_avg=("fill_avg", "sum"), fill_max=("fill_max", "max"),
+        temp_avg=("temp_avg", "sum"), battery_min=("battery_min", "min"),
+    ).reset_index()
+    out["fill_avg"] /= out["readings"]
+    out["temp_avg"] /= out["readings"]
+    if not per_sensor:
+        out.insert(0, "sensor_id", None)
+    return out[SUMMARY_COLUMNS]
+
+_SUMMARY_INPUTS = ("sensor_id", "timestamp", "fill_level_percent", "temperature_c", "battery_v")
+
+def _summarise_arrow(table, bucket_sec: int, per_sensor: bool) -> pd.DataFrame:
+    import pyarrow.compute as pc
+
+    ts = pc.floor_temporal(table["timestamp"], multiple=bucket_sec, unit="second")
+    table = table.append_column("bucket", ts)
+    keys = ["sensor_id", "bucket"] if per_sensor else ["bucket"]
+    out = table.group_by(keys).aggregate([
+        ("timestamp", "count"), ("fill_level_percent", "mean"), ("fill_level_percent", "max"),
+        ("temperature_c", "mean"), ("battery_v", "min"),
+    ]).to_pandas()
+    out = out.rename(columns={
+        "timestamp_count": "readings", "fill_level_percent_mean": "fill_avg", "fill_level_percent_max": "fill_max",
+        "temperature_c_mean": "temp_avg", "battery_v_min": "battery_min",
+    })
+    out["bucket"] = pd.to_datetime(out["bucket"], utc=True).dt.tz_localize(None)
+    if not per_sensor:
+        out["sensor_id"] = None
+    return out.sort_values(keys, kind="stable").reset_index(drop=True)[SUMMARY_COLUMNS]
+
+def _pg_archive_summary(since, until, sensor_ids, bucket_sec: int, per_sensor: bool) -> pd.DataFrame:
+    where_sql, params = _archive_where(since, until, sensor_ids)
+    params["bucket_sec"] = bucket_sec
+    sensor_sql = "sensor_id" if per_sensor else "NULL::text"
+    group_sql = "sensor_id, bucket" if per_sensor else "bucket"
+    sql = f"""
+        SELECT {sensor_sql}                                                   AS sensor_id,
+               to_timestamp(floor(extract(epoch FROM "timestamp") / :bucket_sec) * :bucket_sec)
+                   AT TIME ZONE 'UTC'                                         AS bucket,
+               COUNT(*)                                                       AS readings,
+               AVG(fill_level_percent)::float8                                AS fill_avg,
+               MAX(fill_level_percent)::float8                                AS fill_max,
+               AVG(temperature_c)::float8                                     AS temp_avg,
+               MIN(battery_v)::float8                                         AS battery_min
+        FROM {_archive}
+        {where_sql}
+        GROUP BY {group_sql}
+        ORDER BY {group_sql}
+    """
+    #extract(epoch) of a naive timestamp ignores the session zone, so buckets are UTC-aligned
+    with engine().begin() as conn:
+        return _read_frame(conn, sql, params)
+
+
+@_read_timer("fetch_any_latest_snapshot_df")
 def fetch_any_latest_snapshot_df() -> pd.DataFrame:
     """
     Latest row per sensor id with NO time window
     """
+    return backend().fetch_any_latest_snapshot_df()
+
+def _pg_any_latest_snapshot() -> pd.DataFrame:
     sql = f"""
         SELECT DISTINCT ON (sensor_id) *
         FROM {_archive}
@@ -170,11 +658,14 @@ def fetch_any_latest_snapshot_df() -> pd.DataFrame:
     with engine().begin() as conn:
         return pd.read_sql_query(text(sql), conn)
 
+@_read_timer("fetch_latest_snapshot_df")
 def fetch_latest_snapshot_df(within_seconds: int = 3600) -> pd.DataFrame:
     """
     Fetches the latest record for each bin_id.
     """
+    return backend().fetch_latest_snapshot_df(within_seconds)
 
+def _pg_latest_snapshot(within_seconds: int) -> pd.DataFrame:
     sql = f"""
         SELECT DISTINCT ON (a.sensor_id) a.*
         FROM {_archive} a
@@ -185,16 +676,439 @@ def fetch_latest_snapshot_df(within_seconds: int = 3600) -> pd.DataFrame:
         df = pd.read_sql_query(text(sql), conn)
     return df
 
+def _bbox_params(bbox: Sequence[float]) -> dict:
+    min_lat, min_lng, max_lat, max_lng = (float(v) for v in bbox)
+    return {"min_lat": min_lat, "min_lng": min_lng, "max_lat": max_lat, "max_lng": max_lng}
+
+#Matches the GiST expression index from ensure_static_spatial_index()
+_BBOX_SQL = "point(lng, lat) <@ box(point(:min_lng, :min_lat), point(:max_lng, :max_lat))"
+
+#Tables known to exist (only positive answers are cached)
+_existing_tables: set[str] = set()
+
+def _table_exists(conn, table: str) -> bool:
+    if table not in _existing_tables:
+        if conn.execute(text("SELECT to_regclass(:t) IS NOT NULL;"), {"t": table}).scalar():
+            _existing_tables.add(table)
+    return table in _existing_tables
+
+def _anomaly_join(conn) -> tuple[str, str]:
+    """Select list and LATERAL join adding each sensor's latest recent anomaly (NULLs before the table exists)."""
+    if not _table_exists(conn, _anomalies):
+        return 'NULL::text AS "Anomaly", NULL::timestamptz AS "Anomaly At"', ""
+    return (
+        'an.kind                                                 AS "Anomaly",\n'
+        '            an.ts                                                   AS "Anomaly At"',
+        f"""
+        LEFT JOIN LATERAL (
+            SELECT kind, ts FROM {_anomalies} x
+            WHERE x.sensor_id = l.sensor_id
+              AND x.ts >= NOW() - INTERVAL '{ANOMALY_LOOKBACK_SEC} seconds'
+            ORDER BY x.ts DESC
+            LIMIT 1
+        ) an ON TRUE""",
+    )
+
+def _snapshot_ui_query(
+    conn,
+    within_seconds: int,
+    bbox: Optional[Sequence[float]] = None,
+    since_id: Optional[int] = None,
+) -> tuple[str, dict]:
+    params: dict[str, object] = {}
+    filters = ""
+    if bbox is not None:
+        params.update(_bbox_params(bbox))
+        filters += f"\n            AND a.sensor_id IN (SELECT sensor_id FROM {_static} WHERE {_BBOX_SQL})"
+    if since_id is not None:
+        #Sensors with any row ingested after the watermark (archive primary key index)
+        params["since_id"] = int(since_id)
+        filters += f"\n            AND a.sensor_id IN (SELECT DISTINCT sensor_id FROM {_archive} WHERE id > :since_id)"
+    anomaly_cols, anomaly_join = _anomaly_join(conn)
+
+    sql = f"""
+        WITH latest AS (
+            SELECT DISTINCT ON (a.sensor_id) a.*
+            FROM {_archive} a
+            WHERE a."timestamp" >= (NOW() AT TIME ZONE 'utc') - INTERVAL '{int(within_seconds)} seconds'{filters}
+            ORDER BY a.sensor_id, a."timestamp" DESC
+        )
+        SELECT
+            s.bin_id                                                AS "BinID",
+            l.sensor_id                                             AS "DeviceID",
+            l."timestamp"::timestamptz                              AS "Timestamp",
+            LEAST(GREATEST(l.fill_level_percent::float8, 0), 100)   AS "Fill",
+            l.temperature_c::float8                                 AS "Temperature",
+            l.battery_v::float8                                     AS "Battery",
+            s.lat::float8                                           AS "Latitude",
+            s.lng::float8                                           AS "Longitude",
+            l.overflow_count::int                                   AS "Overflow #",
+            l.last_overflow::timestamptz                            AS "Last Overflow",
+            l.last_emptied::timestamptz                             AS "Last Emptied",
+            l.fill_threshold::int                                   AS fill_threshold,
+            l.overflow::boolean                                     AS overflow,
+            {anomaly_cols}
+        FROM latest l
+        LEFT JOIN {_static} s ON s.sensor_id = l.sensor_id{anomaly_join}
+    """
+    return sql, params
+
+def _read_snapshot_ui(conn, sql: str, params: dict) -> pd.DataFrame:
+    #Naive archive timestamps are stored as UTC; make the ::timestamptz casts read them that way
+    conn.exec_driver_sql("SET LOCAL TIME ZONE 'UTC';")
+    if arrow_available():
+        #timestamptz comes back as "...+00" and is parsed as UTC by the CSV reader
+        return _read_frame(conn, sql, params)
+    return pd.read_sql_query(
+        text(sql), conn, params=params,
+        parse_dates={c: {"utc": True} for c in SNAPSHOT_UI_TIMES}
+    )
+
+def _archive_watermark(conn) -> int:
+    return int(conn.execute(text(f"SELECT COALESCE(MAX(id), 0) FROM {_archive};")).scalar() or 0)
+
+@_read_timer("fetch_latest_snapshot_ui_df")
+def fetch_latest_snapshot_ui_df(within_seconds: int = 3600, *, bbox: Optional[Sequence[float]] = None) -> pd.DataFrame:
+    """
+    Latest record per sensor joined to its static coordinates, typed and named
+    for the UI in a single statement.
+
+    Timestamps are returned as UTC instants (tz-aware), numeric columns are cast
+    in SQL and Fill is clipped to 0-100, so the caller only has to set dtypes.
+    bbox=(min_lat, min_lng, max_lat, max_lng) limits the result to bins in that
+    viewport (via the static spatial index) before the archive is touched.
+    """
+    return backend().fetch_latest_snapshot_ui_df(within_seconds, bbox)
+
+def _pg_latest_snapshot_ui(within_seconds: int, bbox: Optional[Sequence[float]]) -> pd.DataFrame:
+    with engine().begin() as conn:
+        sql, params = _snapshot_ui_query(conn, within_seconds, bbox)
+        return _read_snapshot_ui(conn, sql + ' ORDER BY "DeviceID";', params)
+
+@_read_timer("fetch_latest_snapshot_ui_delta_df")
+def fetch_latest_snapshot_ui_delta_df(
+    since_id: Optional[int] = None,
+    within_seconds: int = 3600,
+    *,
+    bbox: Optional[Sequence[float]] = None,
+) -> tuple[pd.DataFrame, int]:
+    """
+    Same rows as fetch_latest_snapshot_ui_df, but only for sensors with archive
+    rows ingested after the since_id watermark (archive id). since_id=None returns
+    the full snapshot.
+
+    Returns (frame, watermark). Pass the watermark back on the next call. It is read
+    before the snapshot, so a row committed in between shows up again next time
+    rather than being missed. Ids are assumed to commit in order (one writer at a time).
+    """
+    return backend().fetch_latest_snapshot_ui_delta_df(since_id, within_seconds, bbox)
+
+def _pg_latest_snapshot_ui_delta(
+    since_id: Optional[int], within_seconds: int, bbox: Optional[Sequence[float]]
+) -> tuple[pd.DataFrame, int]:
+    with engine().begin() as conn:
+        watermark = _archive_watermark(conn)
+        if since_id is not None and watermark <= int(since_id):
+            #Nothing ingested since the last call - skip the snapshot query entirely
+            return pd.DataFrame(columns=SNAPSHOT_UI_COLUMNS), int(since_id)
+        sql, params = _snapshot_ui_query(conn, within_seconds, bbox, since_id)
+        return _read_snapshot_ui(conn, sql + ' ORDER BY "DeviceID";', params), watermark
+
+@_read_timer("fetch_latest_state_page_df")
+def fetch_latest_state_page_df(
+    *,
+    sort_by: str = "DeviceID",
+    descending: bool = False,
+    only_urgent: bool = False,
+    fill_thresh: float = 85,
+    temp_thresh: float = 40,
+    battery_thresh: float = 3.2,
+    battery_below: Optional[float] = None,
+    fill_at_least: Optional[float] = None,
+    offset: int = 0,
+    limit: int = 25,
+    within_seconds: int = 3600,
+) -> tuple[pd.DataFrame, int]:
+    """
+    One page of the latest-state table, sorted, filtered and paged in SQL.
+
+    Filters:
+    - only_urgent: Fill >= fill_thresh OR Temperature >= temp_thresh OR Battery <= battery_thresh
+      OR a recent sensor anomaly
+    - battery_below: Battery < value
+    - fill_at_least: Fill >= value
+
+    Returns (page, total_matching_rows). Same columns as fetch_latest_snapshot_ui_df.
+    """
+    if sort_by not in STATE_SORT_COLUMNS:
+        raise ValueError(f"Cannot sort by {sort_by!r}")
+    where_sql, params = state_page_filters(
+        only_urgent=only_urgent, fill_thresh=fill_thresh, temp_thresh=temp_thresh, battery_thresh=battery_thresh,
+        battery_below=battery_below, fill_at_least=fill_at_least,
+    )
+    return backend().fetch_latest_state_page_df(
+        sort_by=sort_by, descending=descending, where_sql=where_sql, params=params,
+        offset=max(0, int(offset)), limit=max(1, int(limit)), within_seconds=within_seconds,
+    )
+
+def _pg_latest_state_page(
+    *, sort_by: str, descending: bool, where_sql: str, params: dict, offset: int, limit: int, within_seconds: int,
+) -> tuple[pd.DataFrame, int]:
+    params = dict(params)
+    direction = "DESC" if descending else "ASC"
+    with engine().begin() as conn:
+        sql, query_params = _snapshot_ui_query(conn, within_seconds)
+        params.update(query_params, offset=offset, limit=limit)
+        page_sql = f"""
+            SELECT q.*, COUNT(*) OVER () AS "_total"
+            FROM ({sql}) q
+            {where_sql}
+            ORDER BY "{sort_by}" {direction} NULLS LAST, "DeviceID"
+            OFFSET :offset LIMIT :limit;
+        """
+        page = _read_snapshot_ui(conn, page_sql, params)
+        if page.empty and params["offset"] > 0:
+            #Past the last page - still report how many rows match
+            count_sql = f"SELECT COUNT(*) FROM ({sql}) q {where_sql};"
+            total = int(conn.execute(text(count_sql), params).scalar() or 0)
+        else:
+            total = int(page["_total"].iloc[0]) if not page.empty else 0
+    return page.drop(columns="_total"), total
+
+@_read_timer("fetch_static_bins_df")
 def fetch_static_bins_df() -> pd.DataFrame:
     """
     Fetches static bin coordinates.
     """
+    return backend().fetch_static_bins_df()
 
+def _pg_static_bins() -> pd.DataFrame:
     sql = f"SELECT * FROM {_static}"
     with engine().begin() as conn:
         df = pd.read_sql_query(text(sql), conn)
     return df
+
+@_read_timer("fetch_static_bins_in_bbox_df")
+def fetch_static_bins_in_bbox_df(min_lat: float, min_lng: float, max_lat: float, max_lng: float) -> pd.DataFrame:
+    """
+    Static bins inside a lat/lng bounding box (on Postgres via the GiST point index).
+    """
+    return backend().fetch_static_bins_in_bbox_df((min_lat, min_lng, max_lat, max_lng))
+
+def _pg_static_bins_in_bbox(bbox: Sequence[float]) -> pd.DataFrame:
+    sql = f"SELECT * FROM {_static} WHERE {_BBOX_SQL}"
+    with engine().begin() as conn:
+        return pd.read_sql_query(text(sql), conn, params=_bbox_params(bbox))
+
+@_read_timer("fetch_nearest_static_bins_df")
+def fetch_nearest_static_bins_df(lat: float, lng: float, k: int = 5) -> pd.DataFrame:
+    """
+    k static bins nearest to a point, nearest first (on Postgres by GiST KNN ordering).
+    distance_deg is planar distance in degrees; use spatial_index.haversine_m for metres.
+    """
+    return backend().fetch_nearest_static_bins_df(float(lat), float(lng), int(k))
+
+def _pg_nearest_static_bins(lat: float, lng: float, k: int) -> pd.DataFrame:
+    sql = f"""
+        SELECT *, point(lng, lat) <-> point(:lng, :lat) AS distance_deg
+        FROM {_static}
+        ORDER BY point(lng, lat) <-> point(:lng, :lat)
+        LIMIT :k;
+    """
+    with engine().begin() as conn:
+        return pd.read_sql_query(text(sql), conn, params={"lat": lat, "lng": lng, "k": k})
+
+@_read_timer("fetch_static_cell_counts_df")
+def fetch_static_cell_counts_df(cell_deg: float = 0.01) -> pd.DataFrame:
+    """
+    Bins per square grid cell (south-west corner of each cell), computed in SQL.
+    """
+    return backend().fetch_static_cell_counts_df(float(cell_deg))
+
+def _pg_static_cell_counts(cell_deg: float) -> pd.DataFrame:
+    sql = f"""
+        SELECT floor(lat / :cell) * :cell AS cell_lat,
+               floor(lng / :cell) * :cell AS cell_lng,
+               COUNT(*) AS bins
+        FROM {_static}
+        WHERE lat IS NOT NULL AND lng IS NOT NULL
+        GROUP BY 1, 2
+        ORDER BY 1, 2;
+    """
+    with engine().begin() as conn:
+        return pd.read_sql_query(text(sql), conn, params={"cell": cell_deg})
     
+# === PER-SENSOR STATE TABLES ===
+#One row per sensor_id, written by online estimators after each ingest batch.
+#Only these tables may be passed to the helpers below (names are spliced into SQL).
+_STATE_TABLES = (FILL_RATE_STATE, ANOMALY_STATE, BIN_EVENT_STATE)
+
+def _check_state_table(table: str):
+    if table not in _STATE_TABLES:
+        raise ValueError(f"Not a state table: {table!r}")
+
+@_read_timer("fetch_state_df")
+def fetch_state_df(table: str, sensor_ids: Optional[Sequence[str]] = None) -> pd.DataFrame:
+    _check_state_table(table)
+    params: dict[str, object] = {}
+    where_sql = ""
+    if sensor_ids is not None:
+        where_sql = "WHERE sensor_id = ANY(:sensor_ids)"
+        params["sensor_ids"] = list(sensor_ids)
+    with engine().begin() as conn:
+        return _read_frame(conn, f"SELECT * FROM {table} {where_sql}", params)
+
+def upsert_state_df(table: str, df: pd.DataFrame) -> int:
+    """Insert or replace state rows by sensor_id. Columns must match the table's."""
+    _check_state_table(table)
+    if df is None or df.empty:
+        return 0
+    cols = list(df.columns)
+    updates = ", ".join(f"{c} = EXCLUDED.{c}" for c in cols if c != "sensor_id")
+    sql = f"""
+        INSERT INTO {table} ({", ".join(cols)}, updated_at)
+        VALUES ({", ".join(f":{c}" for c in cols)}, NOW())
+        ON CONFLICT (sensor_id) DO UPDATE SET {updates}, updated_at = NOW();
+    """
+    records = df.astype(object).where(df.notna(), None).to_dict(orient="records")
+    with engine().begin() as conn:
+        conn.execute(text(sql), records)
+    return len(records)
+
+# === SENSOR ANOMALIES ===
+_ANOMALY_COLUMNS = ["sensor_id", "ts", "kind", "value", "detail"]
+
+def write_anomalies(df: pd.DataFrame) -> int:
+    """Append anomaly rows (sensor_id, ts, kind, value, detail) from Model.anomaly."""
+    if df is None or df.empty:
+        return 0
+    df = df.reindex(columns=_ANOMALY_COLUMNS)
+    records = df.astype(object).where(df.notna(), None).to_dict(orient="records")
+    sql = f"""
+        INSERT INTO {_anomalies} ({", ".join(_ANOMALY_COLUMNS)})
+        VALUES ({", ".join(f":{c}" for c in _ANOMALY_COLUMNS)});
+    """
+    with engine().begin() as conn:
+        conn.execute(text(sql), records)
+    return len(records)
+
+@_read_timer("fetch_anomalies_df")
+def fetch_anomalies_df(
+    *,
+    since: Optional[datetime | str] = None,
+    sensor_ids: Optional[Sequence[str]] = None,
+    kinds: Optional[Sequence[str]] = None,
+    limit: Optional[int] = 500,
+) -> pd.DataFrame:
+    """Recorded anomalies, newest first."""
+    where: list[str] = []
+    params: dict[str, object] = {}
+    if since is not None:
+        where.append("ts >= :since")
+        params["since"] = pd.to_datetime(since, utc=True).to_pydatetime()
+    if sensor_ids:
+        where.append("sensor_id = ANY(:sensor_ids)")
+        params["sensor_ids"] = list(sensor_ids)
+    if kinds:
+        where.append("kind = ANY(:kinds)")
+        params["kinds"] = list(kinds)
+    where_sql = ("WHERE " + " AND ".join(where)) if where else ""
+    lim_sql = f"LIMIT {int(limit)}" if limit else ""
+    sql = f"SELECT {', '.join(_ANOMALY_COLUMNS)} FROM {_anomalies} {where_sql} ORDER BY ts DESC {lim_sql}"
+    with engine().begin() as conn:
+        return _read_frame(conn, sql, params)
+
+# === BIN EVENTS ===
+_BIN_EVENT_COLUMNS = ["sensor_id", "ts", "kind", "fill"]
+
+def _event_filters(since, until, sensor_ids, kinds) -> tuple[str, dict]:
+    where: list[str] = []
+    params: dict[str, object] = {}
+    if since is not None:
+        where.append("ts >= :since")
+        params["since"] = pd.to_datetime(since, utc=True).to_pydatetime()
+    if until is not None:
+        where.append("ts < :until")
+        params["until"] = pd.to_datetime(until, utc=True).to_pydatetime()
+    if sensor_ids:
+        where.append("sensor_id = ANY(:sensor_ids)")
+        params["sensor_ids"] = list(sensor_ids)
+    if kinds:
+        where.append("kind = ANY(:kinds)")
+        params["kinds"] = list(kinds)
+    return ("WHERE " + " AND ".join(where)) if where else "", params
+
+def write_bin_events(df: pd.DataFrame) -> int:
+    """Append events (sensor_id, ts, kind, fill) from Model.bin_events; re-sent events are ignored."""
+    if df is None or df.empty:
+        return 0
+    df = df.reindex(columns=_BIN_EVENT_COLUMNS)
+    records = df.astype(object).where(df.notna(), None).to_dict(orient="records")
+    sql = f"""
+        INSERT INTO {_bin_events} ({", ".join(_BIN_EVENT_COLUMNS)})
+        VALUES ({", ".join(f":{c}" for c in _BIN_EVENT_COLUMNS)})
+        ON CONFLICT (sensor_id, ts, kind) DO NOTHING;
+    """
+    with engine().begin() as conn:
+        conn.execute(text(sql), records)
+    return len(records)
+
+@_read_timer("fetch_bin_events_df")
+def fetch_bin_events_df(
+    *,
+    since: Optional[datetime | str] = None,
+    until: Optional[datetime | str] = None,
+    sensor_ids: Optional[Sequence[str]] = None,
+    kinds: Optional[Sequence[str]] = None,
+    limit: Optional[int] = None,
+) -> pd.DataFrame:
+    """Recorded bin events ordered by sensor and time."""
+    where_sql, params = _event_filters(since, until, sensor_ids, kinds)
+    lim_sql = f"LIMIT {int(limit)}" if limit else ""
+    sql = f"SELECT {', '.join(_BIN_EVENT_COLUMNS)} FROM {_bin_events} {where_sql} ORDER BY sensor_id, ts {lim_sql}"
+    with engine().begin() as conn:
+        return _read_frame(conn, sql, params)
+
+@_read_timer("fetch_bin_event_summary_df")
+def fetch_bin_event_summary_df(
+    *,
+    since: Optional[datetime | str] = None,
+    until: Optional[datetime | str] = None,
+    sensor_ids: Optional[Sequence[str]] = None,
+) -> pd.DataFrame:
+    """
+    Per sensor and kind: event count, last event, mean hours between consecutive
+    events and, for overflow_start, mean hours until the overflow cleared.
+    Gaps and durations only pair events inside the window.
+    """
+    where_sql, params = _event_filters(since, until, sensor_ids, None)
+    sql = f"""
+        WITH e AS (
+            SELECT
+                sensor_id, kind, ts,
+                ts - LAG(ts) OVER (PARTITION BY sensor_id, kind ORDER BY ts) AS gap,
+                LEAD(ts) OVER ovf AS next_ts,
+                LEAD(kind) OVER ovf AS next_kind
+            FROM {_bin_events}
+            {where_sql}
+            WINDOW ovf AS (PARTITION BY sensor_id, kind LIKE 'overflow%' ORDER BY ts, kind DESC)
+        )
+        SELECT
+            sensor_id,
+            kind,
+            COUNT(*) AS events,
+            MAX(ts) AS last_ts,
+            EXTRACT(EPOCH FROM AVG(gap)) / 3600.0 AS mean_gap_h,
+            EXTRACT(EPOCH FROM AVG(next_ts - ts) FILTER (
+                WHERE kind = 'overflow_start' AND next_kind = 'overflow_clear'
+            )) / 3600.0 AS mean_duration_h
+        FROM e
+        GROUP BY sensor_id, kind
+        ORDER BY sensor_id, kind
+    """
+    with engine().begin() as conn:
+        return _read_frame(conn, sql, params)
+
 # === ADMIN HELPERS ===
 
 def sync_static_bins(df_coords: pd.DataFrame, *, delete_missing: bool = False, update_existing: bool = False):
@@ -206,9 +1120,10 @@ def sync_static_bins(df_coords: pd.DataFrame, *, delete_missing: bool = False, u
     """
     if df_coords.empty:
         return
-    
     df = df_coords[["bin_id", "sensor_id", "lat", "lng"]].copy()
+    backend().sync_static_bins(df, delete_missing=delete_missing, update_existing=update_existing)
 
+def _pg_sync_static_bins(df: pd.DataFrame, *, delete_missing: bool, update_existing: bool):
     eng = engine()
     with eng.begin() as conn:
         conn.exec_driver_sql(f"CREATE TEMP TABLE tmp_bins (LIKE {_static} INCLUDING ALL);")
@@ -247,6 +1162,258 @@ def ensure_archive_unique_index():
         conn.exec_driver_sql(sql)
 
 
+def ensure_latest_state_indexes():
+    """
+    Indexes behind the latest-state queries: the unique (sensor_id, timestamp) index
+    serves DISTINCT ON per sensor, and a timestamp index serves the live-window filter.
+    """
+    ensure_archive_unique_index()
+    with engine().begin() as conn:
+        conn.exec_driver_sql(f"""
+            CREATE INDEX IF NOT EXISTS ix_archive_ts
+            ON {_archive} ("timestamp");
+        """)
+
+def ensure_static_spatial_index():
+    sql = f"""
+    CREATE INDEX IF NOT EXISTS ix_static_point
+    ON {_static} USING gist (point(lng, lat));
+    """
+    with engine().begin() as conn:
+        conn.exec_driver_sql(sql)
+
+def ensure_ingest_version_table():
+    with engine().begin() as conn:
+        conn.exec_driver_sql(f"""
+            CREATE TABLE IF NOT EXISTS {_ingest_version} (
+                id smallint PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+                version bigint NOT NULL DEFAULT 0,
+                updated_at timestamptz NOT NULL DEFAULT NOW()
+            );
+            INSERT INTO {_ingest_version} (id, version) VALUES (1, 0)
+            ON CONFLICT (id) DO NOTHING;
+        """)
+
+
+def ensure_fill_rate_state_table():
+    with engine().begin() as conn:
+        conn.exec_driver_sql(f"""
+            CREATE TABLE IF NOT EXISTS {FILL_RATE_STATE} (
+                sensor_id text PRIMARY KEY,
+                last_ts timestamptz,
+                last_fill real,
+                fill_threshold real,
+                base_rate double precision,
+                samples integer NOT NULL DEFAULT 0,
+                updated_at timestamptz NOT NULL DEFAULT NOW()
+            );
+        """)
+
+
+def ensure_anomaly_tables():
+    """Detector state (one row per sensor) and the anomaly log, indexed for the snapshot's latest-per-sensor lookup."""
+    #The ALTER moves tables made when stuck_fill counted readings (fill_run) to time held + run rate
+    with engine().begin() as conn:
+        conn.exec_driver_sql(f"""
+            CREATE TABLE IF NOT EXISTS {ANOMALY_STATE} (
+                sensor_id text PRIMARY KEY,
+                last_ts timestamptz,
+                last_fill real,
+                fill_since timestamptz,
+                run_rate double precision,
+                stuck_flag boolean NOT NULL DEFAULT FALSE,
+                last_emptied timestamptz,
+                last_batt real,
+                batt_n integer NOT NULL DEFAULT 0,
+                batt_mean double precision,
+                batt_m2 double precision,
+                batt_flag boolean NOT NULL DEFAULT FALSE,
+                temp_resid double precision,
+                temp_flag boolean NOT NULL DEFAULT FALSE,
+                updated_at timestamptz NOT NULL DEFAULT NOW()
+            );
+            ALTER TABLE {ANOMALY_STATE}
+                ADD COLUMN IF NOT EXISTS fill_since timestamptz,
+                ADD COLUMN IF NOT EXISTS run_rate double precision,
+                ADD COLUMN IF NOT EXISTS stuck_flag boolean NOT NULL DEFAULT FALSE,
+                DROP COLUMN IF EXISTS fill_run;
+            CREATE TABLE IF NOT EXISTS {_anomalies} (
+                id bigserial PRIMARY KEY,
+                sensor_id text NOT NULL,
+                ts timestamptz NOT NULL,
+                kind text NOT NULL,
+                value double precision,
+                detail text,
+                created_at timestamptz NOT NULL DEFAULT NOW()
+            );
+            CREATE INDEX IF NOT EXISTS ix_anomalies_sid_ts
+            ON {_anomalies} (sensor_id, ts DESC);
+        """)
+
+
+def ensure_bin_event_tables():
+    """Event extractor state (one row per sensor) and the event table, unique per (sensor, time, kind)."""
+    with engine().begin() as conn:
+        conn.exec_driver_sql(f"""
+            CREATE TABLE IF NOT EXISTS {BIN_EVENT_STATE} (
+                sensor_id text PRIMARY KEY,
+                last_ts timestamptz,
+                last_fill real,
+                overflow boolean NOT NULL DEFAULT FALSE,
+                overflow_count integer NOT NULL DEFAULT 0,
+                last_emptied timestamptz,
+                updated_at timestamptz NOT NULL DEFAULT NOW()
+            );
+            CREATE TABLE IF NOT EXISTS {_bin_events} (
+                sensor_id text NOT NULL,
+                ts timestamptz NOT NULL,
+                kind text NOT NULL,
+                fill real,
+                PRIMARY KEY (sensor_id, ts, kind)
+            );
+            CREATE INDEX IF NOT EXISTS ix_bin_events_ts
+            ON {_bin_events} (ts);
+        """)
+
+
+def backfill_bin_events():
+    """
+    One-off: derive events for readings archived before extraction ran at ingest,
+    using the same rules as Model.bin_events, and seed the extractor state from
+    each sensor's latest row. Safe to re-run.
+    """
+    with engine().begin() as conn:
+        #Naive archive timestamps are UTC; without this they land in the timestamptz columns
+        #shifted by the server's zone, and never match what ingest extracts for the same rows
+        conn.exec_driver_sql("SET LOCAL TIME ZONE 'UTC';")
+        conn.exec_driver_sql(f"""
+            WITH r AS (
+                SELECT
+                    sensor_id, "timestamp" AS ts, fill_level_percent AS fill,
+                    COALESCE(overflow, FALSE) AS ov, overflow_count AS cnt,
+                    last_emptied, last_overflow,
+                    LAG("timestamp") OVER w AS ts0,
+                    LAG(fill_level_percent) OVER w AS fill0,
+                    LAG(COALESCE(overflow, FALSE)) OVER w AS ov0,
+                    LAG(overflow_count) OVER w AS cnt0,
+                    LAG(last_emptied) OVER w AS emptied0
+                FROM {_archive}
+                WINDOW w AS (PARTITION BY sensor_id ORDER BY "timestamp")
+            ),
+            t AS (
+                SELECT *,
+                    last_emptied IS NOT NULL AND (emptied0 IS NULL OR last_emptied > emptied0) AS emptied,
+                    cnt > cnt0 AS counted
+                FROM r
+                WHERE ts0 IS NOT NULL
+            )
+            INSERT INTO {_bin_events} (sensor_id, ts, kind, fill)
+            SELECT sensor_id, last_emptied, 'emptied', fill0 FROM t WHERE emptied
+            UNION ALL
+            SELECT sensor_id, COALESCE(last_overflow, ts), 'overflow_start', fill
+            FROM t WHERE (ov AND NOT ov0) OR counted
+            UNION ALL
+            SELECT sensor_id, CASE WHEN emptied THEN last_emptied ELSE ts END, 'overflow_clear', fill0
+            FROM t WHERE (ov0 AND NOT ov) OR (counted AND NOT ov0 AND NOT ov)
+            ON CONFLICT (sensor_id, ts, kind) DO NOTHING;
+        """)
+        conn.exec_driver_sql(f"""
+            INSERT INTO {BIN_EVENT_STATE} (sensor_id, last_ts, last_fill, overflow, overflow_count, last_emptied)
+            SELECT DISTINCT ON (sensor_id)
+                sensor_id, "timestamp", fill_level_percent, COALESCE(overflow, FALSE),
+                COALESCE(overflow_count, 0), last_emptied
+            FROM {_archive}
+            ORDER BY sensor_id, "timestamp" DESC
+            ON CONFLICT (sensor_id) DO UPDATE SET
+                last_ts = EXCLUDED.last_ts, last_fill = EXCLUDED.last_fill,
+                overflow = EXCLUDED.overflow, overflow_count = EXCLUDED.overflow_count,
+                last_emptied = COALESCE(EXCLUDED.last_emptied, {BIN_EVENT_STATE}.last_emptied),
+                updated_at = NOW()
+            WHERE {BIN_EVENT_STATE}.last_ts IS NULL OR EXCLUDED.last_ts > {BIN_EVENT_STATE}.last_ts;
+        """)
+
+
+def delete_sensor_rows(sensor_prefix: str) -> int:
+    """
+    Delete archive rows and every derived row (estimator state, anomalies, events) for
+    sensor ids starting with sensor_prefix, e.g. replay or test sensors. Returns archive rows removed.
+    """
+    if not sensor_prefix:
+        raise ValueError("sensor_prefix must not be empty")
+    return backend().delete_sensor_rows(sensor_prefix)
+
+def _pg_delete_sensor_rows(sensor_prefix: str) -> int:
+    pattern = like_prefix(sensor_prefix)
+    removed = 0
+    with engine().begin() as conn:
+        for table in (_archive, *_STATE_TABLES, _anomalies, _bin_events):
+            if table == _archive or _table_exists(conn, table):
+                res = conn.execute(text(f"DELETE FROM {table} WHERE sensor_id LIKE :pattern"), {"pattern": pattern})
+                if table == _archive:
+                    removed = res.rowcount or 0
+    return removed
+
+def _delete_archive_batch(conn, since, until, batch: int) -> pd.DataFrame:
+    """Delete up to `batch` archive rows in [since, until) and return them."""
+    sql = f"""
+        DELETE FROM {_archive}
+        WHERE ctid = ANY(ARRAY(
+            SELECT ctid FROM {_archive}
+            WHERE "timestamp" >= :since AND "timestamp" < :until
+            LIMIT :batch
+        ))
+        RETURNING *
+    """
+    res = conn.execute(text(sql), {"since": since, "until": until, "batch": int(batch)})
+    return pd.DataFrame(res.fetchall(), columns=list(res.keys()))
+
+def tier_archive(*, older_than_days: int = TIER_AFTER_DAYS, batch: int = 50_000) -> dict[str, int]:
+    """
+    Move every month of the archive that ended more than older_than_days ago into
+    the Parquet tier, oldest first. Each batch is deleted from Postgres and written
+    to a part file in one transaction (the file is durable before the delete
+    commits), then the month is compacted into one sorted file. Late readings for
+    months already tiered stay readable from Postgres and are folded in on the next
+    run. Returns rows moved per month.
+    """
+    tier = archive_tier()
+    if tier is None:
+        raise RuntimeError("Set ARCHIVE_TIER_DIR before tiering the archive.")
+
+    cutoff = (pd.Timestamp.now(tz="UTC") - pd.Timedelta(days=older_than_days)).floor("D")
+    cutoff = month_bounds(month_key(cutoff))[0]
+    with engine().begin() as conn:
+        first = conn.execute(text(f'SELECT MIN("timestamp") FROM {_archive} WHERE "timestamp" < :cutoff'),
+                             {"cutoff": cutoff.to_pydatetime()}).scalar()
+    moved: dict[str, int] = {}
+    if first is None:
+        return moved
+
+    key = month_key(first)
+    while month_bounds(key)[0] < cutoff:
+        start, end = month_bounds(key)
+        with engine().begin() as conn:
+            has_rows = conn.execute(text(f'''
+                SELECT EXISTS (SELECT 1 FROM {_archive} WHERE "timestamp" >= :since AND "timestamp" < :until)
+            '''), {"since": start.to_pydatetime(), "until": end.to_pydatetime()}).scalar()
+        if not has_rows:
+            key = month_key(end)
+            continue
+
+        tier.begin_month(key)
+        while True:
+            with engine().begin() as conn:
+                rows = _delete_archive_batch(conn, start.to_pydatetime(), end.to_pydatetime(), batch)
+                if rows.empty:
+                    break
+                tier.write_part(key, rows)
+            moved[key] = moved.get(key, 0) + len(rows)
+        tier.compact_month(key)
+        _tier_log.info("month tiered", extra=logs.fields(month=key, rows=moved.get(key, 0)))
+        key = month_key(end)
+    return moved
+
+
 #Make defunct at later time
 def truncate_archive(*, restart_identity: bool = True):
     clause = "RESTART IDENTITY" if restart_identity else ""
@@ -271,6 +1438,32 @@ def reset_tables(*, preserve_archive: bool = True, preserve_static: bool = True)
             conn.exec_driver_sql("TRUNCATE smartbins.static_bin_data;")
 
 
+# === POSTGRES BACKEND ===
+class PostgresBackend(StorageBackend):
+    """The _pg_* functions above, against DATABASE_URL."""
+    name = "postgres"
+    notifies = True
+    derived_tables = True
+
+    write_archive_rows = staticmethod(_pg_write_archive_rows)
+    upsert_static_bins = staticmethod(_pg_upsert_static_bins)
+    sync_static_bins = staticmethod(_pg_sync_static_bins)
+    delete_sensor_rows = staticmethod(_pg_delete_sensor_rows)
+    fetch_ingest_version = staticmethod(_pg_fetch_ingest_version)
+    fetch_static_bins_df = staticmethod(_pg_static_bins)
+    fetch_static_bins_in_bbox_df = staticmethod(_pg_static_bins_in_bbox)
+    fetch_nearest_static_bins_df = staticmethod(_pg_nearest_static_bins)
+    fetch_static_cell_counts_df = staticmethod(_pg_static_cell_counts)
+    fetch_archive_df = staticmethod(_pg_fetch_archive_df)
+    fetch_archive_arrow = staticmethod(_pg_fetch_archive_arrow)
+    fetch_archive_summary_df = staticmethod(_pg_archive_summary)
+    fetch_any_latest_snapshot_df = staticmethod(_pg_any_latest_snapshot)
+    fetch_latest_snapshot_df = staticmethod(_pg_latest_snapshot)
+    fetch_latest_snapshot_ui_df = staticmethod(_pg_latest_snapshot_ui)
+    fetch_latest_snapshot_ui_delta_df = staticmethod(_pg_latest_snapshot_ui_delta)
+    fetch_latest_state_page_df = staticmethod(_pg_latest_state_page)
+
+
 # === WEATHER API ===
 _OPEN_METEO_URL = "https://api.open-meteo.com/v1/forecast"
 _WEATHER_CACHE_TTL_SEC = 600
@@ -293,8 +1486,11 @@ def _cache_put(key: tuple, value: object):
 
 
 def fetch_weather_now_by_coords(lat: float, lng: float) -> dict:
+    import requests
+
     key = (round(lat, 4), round(lng, 4), "now", None, None)
     hit = _cache_get(key)
+    _WEATHER_LOOKUPS.labels(result="hit" if hit else "miss").inc()
     if hit:
         return hit
     
@@ -304,7 +1500,8 @@ def fetch_weather_now_by_coords(lat: float, lng: float) -> dict:
         "current": "temperature_2m",
         "timezone": "UTC"
     }
-    r = requests.get(_OPEN_METEO_URL, params=params, timeout = 10)
+    with _WEATHER_SECONDS.time():
+        r = requests.get(_OPEN_METEO_URL, params=params, timeout = 10)
     r.raise_for_status()
     data = r.json()
     cur = data.get("current", {}) or {}
@@ -0,0 +1,64 @@
+"""
+Scaffolding shared by the per-sensor online estimators (fill_forecast, anomaly,
+bin_events). Each keeps one state row per sensor, keyed by sensor_id with the
+sensor's last applied reading time in last_ts, and folds batches of archive
+readings into it:
+
+empty_state(dtypes) - typed, empty state frame
+column(readings, name) - a readings column, or all-NaN when the batch lacks it
+batch_state(state, sensor_ids, template) - the batch's state rows indexed by sensor_id
+drop_stale(readings, state, ts) - readings newer than their sensor's last_ts, oldest first
+rounds(state, readings) - per-sensor rounds, one reading per sensor each
+
+Readings at or before a sensor's last_ts are dropped before any estimator sees
+them, so running a batch twice changes nothing.
+"""
+
+from __future__ import annotations
+from typing import Iterator, Optional
+
+import numpy as np
+import pandas as pd
+
+
+def empty_state(dtypes: dict[str, str]) -> pd.DataFrame:
+    return pd.DataFrame({c: pd.Series(dtype=t) for c, t in dtypes.items()})
+
+
+def column(readings: pd.DataFrame, name: str) -> pd.Series:
+    return readings[name] if name in readings.columns else pd.Series(np.nan, index=readings.index)
+
+
+def batch_state(state: Optional[pd.DataFrame], sensor_ids: pd.Series, template: pd.DataFrame) -> pd.DataFrame:
+    """
+    State rows for sensor_ids indexed by sensor_id, with an all-NaN row for each
+    sensor seen for the first time. Timestamp columns come back as UTC.
+    """
+    st = state if state is not None and not state.empty else template
+    st = st.loc[st["sensor_id"].astype(str).isin(sensor_ids), list(template.columns)].copy()
+    st["sensor_id"] = st["sensor_id"].astype(str)
+    for c, dtype in template.dtypes.items():
+        if isinstance(dtype, pd.DatetimeTZDtype):
+            st[c] = pd.to_datetime(st[c], utc=True)
+    st = st.set_index("sensor_id")
+    return st.reindex(st.index.union(pd.Index(sensor_ids.unique())))
+
+
+def drop_stale(readings: pd.DataFrame, state: pd.DataFrame, ts: str = "timestamp") -> pd.DataFrame:
+    """readings (with sensor_id and ts columns) after their sensor's last_ts in state, one per instant, oldest first."""
+    #Duplicate or out-of-order readings are ignored
+    seen = pd.to_datetime(readings["sensor_id"].map(state["last_ts"]), utc=True)
+    fresh = readings[seen.isna() | (readings[ts] > seen)]
+    return fresh.drop_duplicates(["sensor_id", ts]).sort_values(ts, kind="stable")
+
+
+def rounds(state: pd.DataFrame, readings: pd.DataFrame) -> Iterator[tuple[pd.DataFrame, pd.DataFrame]]:
+    """
+    Yield (prev, rnd) where rnd holds each sensor's next reading indexed by sensor_id
+    and prev its rows of state. prev is read when the round is yielded, so writes to
+    state in one round are what the next round sees.
+    """
+    #Round k holds each sensor's k-th reading of the batch, so every round is one vectorised step
+    for _, rnd in readings.groupby(readings.groupby("sensor_id").cumcount(), sort=True):
+        rnd = rnd.set_index("sensor_id")
+        yield state.loc[rnd.index], rnd
@@ -0,0 +1,190 @@
+"""
+Background refresher for the live bin snapshot.
+
+One refresher runs per server process and publishes the live snapshot as a
+Snapshot (frame + version number). Readers call latest() and get whatever was
+last published without touching the database, so DB load stays constant no
+matter how many sessions are open.
+
+Polling is change-driven when a change source is given:
+- listener_factory: a blocking waiter (e.g. repository.IngestListener) that wakes
+  on the ingest NOTIFY, so new data is picked up with sub-second latency.
+- change_token: a cheap callable (e.g. repository.fetch_ingest_version) checked
+  when no listener is available, or as a fallback for missed notifications.
+The snapshot query itself only runs when one of them reports new data, plus an
+occasional max_idle_sec refresh so bins age out of the live window.
+
+Published frames are shared between sessions: treat them as read-only and copy
+before mutating.
+"""
+
+from __future__ import annotations
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+import pandas as pd
+
+from Model import logs
+
+
+_log = logs.get("snapshot")
+
+@dataclass(frozen=True)
+class Snapshot:
+    version: int
+    frame: pd.DataFrame
+    published_at: float
+
+
+class SnapshotRefresher:
+    def __init__(
+        self,
+        loader: Callable[[], pd.DataFrame],
+        *,
+        interval_sec: float = 2.0,
+        change_token: Optional[Callable[[], object]] = None,
+        listener_factory: Optional[Callable[[], object]] = None,
+        min_gap_sec: float = 0.5,
+        fallback_sec: float = 30.0,
+        max_idle_sec: Optional[float] = 300.0,
+    ):
+        self._loader = loader
+        self.interval_sec = max(0.1, float(interval_sec))
+        self.min_gap_sec = max(0.0, float(min_gap_sec))
+        self.fallback_sec = max(self.interval_sec, float(fallback_sec))
+        self.max_idle_sec = max_idle_sec
+
+        self._change_token = change_token
+        self._listener_factory = listener_factory
+        self._listener = None
+        self._last_token: object = None
+
+        self._lock = threading.Lock()
+        #Held for a whole poll: loaders may be stateful (LiveSnapshotFeed) and a slower
+        #concurrent poll must not publish an older frame over a newer one
+        self._poll_lock = threading.Lock()
+        self._first = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self._snapshot: Optional[Snapshot] = None
+        self._last_poll = 0.0
+        self.last_error: Optional[Exception] = None
+
+    # === LIFECYCLE ===
+    def start(self) -> "SnapshotRefresher":
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="snapshot-refresher", daemon=True)
+                self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._listener is not None:
+            self._listener.close()
+            self._listener = None
+
+    # === READERS ===
+    @property
+    def version(self) -> int:
+        snap = self._snapshot
+        return snap.version if snap is not None else 0
+
+    def latest(self, *, wait_sec: float = 0.0) -> Optional[Snapshot]:
+        """
+        Last published snapshot. Never blocks once something has been published;
+        on a cold process optionally waits up to wait_sec for the first poll.
+        """
+        if self._snapshot is None and wait_sec > 0:
+            self._first.wait(wait_sec)
+        return self._snapshot
+
+    # === POLLING ===
+    def refresh_now(self) -> Optional[Snapshot]:
+        """
+        Run one poll on the calling thread and publish if the data changed. Polls are
+        serialized, so a "Refresh now" click waits for an in-flight background poll.
+        """
+        with self._poll_lock:
+            self._last_poll = time.monotonic()
+            try:
+                df = self._loader()
+            except Exception as e:
+                self.last_error = e
+                #Don't keep cold readers waiting on a poll that failed
+                self._first.set()
+                return self._snapshot
+            self.last_error = None
+            return self._publish(df)
+
+    def _publish(self, df: pd.DataFrame) -> Snapshot:
+        with self._lock:
+            cur = self._snapshot
+            #Only bump the version when the content actually changed
+            if cur is not None and (cur.frame is df or cur.frame.equals(df)):
+                return cur
+            self._snapshot = Snapshot(
+                version=(cur.version + 1) if cur is not None else 1,
+                frame=df,
+                published_at=time.time(),
+            )
+        self._first.set()
+        return self._snapshot
+
+    def _token_changed(self) -> bool:
+        if self._change_token is None:
+            return True
+        try:
+            token = self._change_token()
+        except Exception:
+            #Can't tell (e.g. token table missing) - fall back to plain polling
+            return True
+        if token == self._last_token:
+            return False
+        self._last_token = token
+        return True
+
+    def _open_listener(self):
+        if self._listener_factory is None:
+            return None
+        try:
+            return self._listener_factory()
+        except Exception as e:
+            _log.warning("ingest listener unavailable; polling the change token instead: %r", e)
+            return None
+
+    def _wait_for_change(self) -> bool:
+        if self._listener is not None:
+            try:
+                if self._listener.wait(self.fallback_sec):
+                    #Drain the token too so the fallback check doesn't re-trigger
+                    self._token_changed()
+                    return True
+            except Exception as e:
+                _log.warning("ingest listener dropped; polling the change token instead: %r", e)
+                self._listener.close()
+                self._listener = None
+        else:
+            self._stop.wait(self.interval_sec)
+
+        if self._token_changed():
+            return True
+        idle = time.monotonic() - self._last_poll
+        return self.max_idle_sec is not None and idle >= self.max_idle_sec
+
+    def _run(self):
+        self._listener = self._open_listener()
+        self._token_changed()
+        self.refresh_now()
+        while not self._stop.is_set():
+            if not self._wait_for_change() or self._stop.is_set():
+                continue
+            #Coalesce bursts of notifications into at most one poll per min_gap_sec
+            gap = self.min_gap_sec - (time.monotonic() - self._last_poll)
+            if gap > 0:
+                self._stop.wait(gap)
+            self.refresh_now()
@@ -0,0 +1,129 @@
+"""
+In-process spatial index over the static bin registry.
+
+BinGridIndex buckets bins into square lat/lng cells and keeps them sorted by
+cell key, so a bounding box becomes a few binary searches per cell row instead
+of a full scan. It answers:
+
+within_bbox(min_lat, min_lng, max_lat, max_lng) - bins inside a viewport
+nearest(lat, lng, k) - k nearest bins with great-circle distance in metres
+per_cell(values=None, value_col="Fill") - bins (and optional mean value) per grid cell
+
+The matching database index is repository.ensure_static_spatial_index()
+(GiST on point(lng, lat)), used by the repository bbox / nearest queries.
+"""
+
+from __future__ import annotations
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+
+_EARTH_RADIUS_M = 6_371_000.0
+_M_PER_DEG_LAT = 111_320.0
+#Cell numbers are offset to stay positive; fine for cell_deg >= 1e-4 anywhere on Earth
+_OFFSET = 1 << 21
+#Above this many cell rows a bbox query just masks every bin
+_MAX_ROW_SCANS = 256
+
+
+def haversine_m(lat1, lng1, lat2, lng2) -> np.ndarray:
+    lat1, lng1, lat2, lng2 = map(np.radians, (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * _EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+
+class BinGridIndex:
+    def __init__(self, static_df: pd.DataFrame, *, cell_deg: float = 0.001):
+        self.cell_deg = float(cell_deg)
+        df = static_df.dropna(subset=["lat", "lng"])
+
+        lat = df["lat"].to_numpy(dtype="float64")
+        lng = df["lng"].to_numpy(dtype="float64")
+        keys = self._keys(self._cell(lat), self._cell(lng))
+        order = np.argsort(keys, kind="stable")
+
+        self.keys = keys[order]
+        self.lat = lat[order]
+        self.lng = lng[order]
+        self.bins = df.iloc[order][["bin_id", "sensor_id", "lat", "lng"]].reset_index(drop=True)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    # === CELL HELPERS ===
+    def _cell(self, deg) -> np.ndarray:
+        return np.floor(np.asarray(deg, dtype="float64") / self.cell_deg).astype(np.int64)
+
+    @staticmethod
+    def _keys(cy, cx) -> np.ndarray:
+        return ((np.asarray(cy) + _OFFSET) << 32) | (np.asarray(cx) + _OFFSET)
+
+    def _candidates(self, min_lat, min_lng, max_lat, max_lng) -> np.ndarray:
+        """Positions of bins in the cells overlapping the box (a superset of the answer)."""
+        cy0, cy1 = int(self._cell(min_lat)), int(self._cell(max_lat))
+        cx0, cx1 = int(self._cell(min_lng)), int(self._cell(max_lng))
+        if cy1 - cy0 + 1 > _MAX_ROW_SCANS:
+            return np.arange(len(self.keys))
+
+        rows = np.arange(cy0, cy1 + 1)
+        lo = np.searchsorted(self.keys, self._keys(rows, cx0), side="left")
+        hi = np.searchsorted(self.keys, self._keys(rows, cx1), side="right")
+        if not (hi > lo).any():
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate([np.arange(a, b) for a, b in zip(lo, hi) if b > a])
+
+    # === QUERIES ===
+    def within_bbox(self, min_lat: float, min_lng: float, max_lat: float, max_lng: float) -> pd.DataFrame:
+        idx = self._candidates(min_lat, min_lng, max_lat, max_lng)
+        lat, lng = self.lat[idx], self.lng[idx]
+        hit = (lat >= min_lat) & (lat <= max_lat) & (lng >= min_lng) & (lng <= max_lng)
+        return self.bins.iloc[idx[hit]].reset_index(drop=True)
+
+    def nearest(self, lat: float, lng: float, k: int = 5) -> pd.DataFrame:
+        """k nearest bins, growing the searched ring of cells until the kth hit is provably closest."""
+        if len(self.keys) == 0 or k <= 0:
+            return self.bins.iloc[0:0].assign(distance_m=pd.Series(dtype="float64"))
+
+        k = min(int(k), len(self.keys))
+        cell_m = self.cell_deg * _M_PER_DEG_LAT * max(np.cos(np.radians(lat)), 1e-6)
+        rings = 1
+        while True:
+            pad = rings * self.cell_deg
+            idx = self._candidates(lat - pad, lng - pad, lat + pad, lng + pad)
+            full = len(idx) == len(self.keys)
+            if len(idx) >= k:
+                d = haversine_m(lat, lng, self.lat[idx], self.lng[idx])
+                part = np.argpartition(d, k - 1)[:k]
+                #Anything outside the searched square is at least `rings` cells away
+                if full or d[part].max() <= rings * cell_m:
+                    best = part[np.argsort(d[part], kind="stable")]
+                    out = self.bins.iloc[idx[best]].reset_index(drop=True)
+                    out["distance_m"] = d[best]
+                    return out
+            rings *= 2
+
+    def per_cell(self, values: Optional[pd.DataFrame] = None, *, value_col: str = "Fill",
+                 cell_deg: Optional[float] = None) -> pd.DataFrame:
+        """
+        Bins per grid cell with the cell's south-west corner. If values (indexed or
+        keyed by sensor_id / DeviceID) is given, also the mean of value_col per cell.
+        """
+        step = float(cell_deg or self.cell_deg)
+        cells = pd.DataFrame({
+            "cell_lat": np.floor(self.lat / step) * step,
+            "cell_lng": np.floor(self.lng / step) * step,
+            "sensor_id": self.bins["sensor_id"].to_numpy(),
+        })
+        agg = {"bins": ("sensor_id", "size")}
+
+        if values is not None and value_col in values.columns:
+            v = values.reset_index()
+            key = "sensor_id" if "sensor_id" in v.columns else "DeviceID"
+            lookup = pd.Series(pd.to_numeric(v[value_col], errors="coerce").to_numpy(), index=v[key].astype(str))
+            lookup = lookup[~lookup.index.duplicated(keep="last")]
+            cells[value_col] = cells["sensor_id"].astype(str).map(lookup)
+            agg[f"mean_{value_col.lower()}"] = (value_col, "mean")
+
+        return cells.groupby(["cell_lat", "cell_lng"], sort=True).agg(**agg).reset_index()
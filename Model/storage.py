@@ -0,0 +1,192 @@
+"""
+Storage backend interface behind Model.repository.
+
+The repository's archive, snapshot and static-bin functions delegate to the backend
+selected by STORAGE_BACKEND (see repository.backend()):
+
+postgres (default) - repository.PostgresBackend, the shared database at DATABASE_URL
+duckdb             - Model.duckdb_backend.DuckDBBackend, an embedded columnar file at
+                     DUCKDB_PATH for offline development and analytics-heavy workloads
+
+Estimator state, anomalies, bin events, LISTEN/NOTIFY and archive tiering are
+Postgres features and stay in the repository (see StorageBackend.derived_tables).
+
+Also holds the pieces of SQL both backends share: column names of the archive
+and of the UI snapshot, and the status-table filters.
+"""
+
+from __future__ import annotations
+import re
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Optional, Sequence
+
+import pandas as pd
+
+
+ARCHIVE_COLUMNS = [
+    "sensor_id", "timestamp", "fill_level_percent", "temperature_c",
+    "battery_v", "fill_threshold", "last_emptied", "overflow",
+    "overflow_count", "last_overflow",
+]
+ARCHIVE_TIME_COLUMNS = ("timestamp", "last_emptied", "last_overflow")
+
+SNAPSHOT_UI_TIMES = ("Timestamp", "Last Overflow", "Last Emptied", "Anomaly At")
+SNAPSHOT_UI_COLUMNS = [
+    "BinID", "DeviceID", "Timestamp", "Fill", "Temperature", "Battery",
+    "Latitude", "Longitude", "Overflow #", "Last Overflow", "Last Emptied",
+    "fill_threshold", "overflow", "Anomaly", "Anomaly At",
+]
+
+#UI columns the status table may be sorted by (whitelist - these are spliced into SQL)
+STATE_SORT_COLUMNS = (
+    "BinID", "DeviceID", "Timestamp", "Fill", "Temperature", "Battery",
+    "Overflow #", "Last Emptied", "Last Overflow",
+)
+
+SUMMARY_COLUMNS = ["sensor_id", "bucket", "readings", "fill_avg", "fill_max", "temp_avg", "battery_min"]
+
+#:name placeholders, but not the second colon of a ::cast
+NAMED_PARAM = re.compile(r"(?<![:\w]):([A-Za-z_]\w*)")
+
+
+def state_page_filters(
+    *,
+    only_urgent: bool,
+    fill_thresh: float,
+    temp_thresh: float,
+    battery_thresh: float,
+    battery_below: Optional[float],
+    fill_at_least: Optional[float],
+) -> tuple[str, dict]:
+    """WHERE clause (:name params) over the UI snapshot columns for the status table."""
+    params: dict[str, object] = {}
+    where: list[str] = []
+    if only_urgent:
+        where.append('("Fill" >= :fill_thresh OR "Temperature" >= :temp_thresh OR "Battery" <= :battery_thresh'
+                     ' OR "Anomaly" IS NOT NULL)')
+        params.update(fill_thresh=float(fill_thresh), temp_thresh=float(temp_thresh), battery_thresh=float(battery_thresh))
+    if battery_below is not None:
+        where.append('"Battery" < :battery_below')
+        params["battery_below"] = float(battery_below)
+    if fill_at_least is not None:
+        where.append('"Fill" >= :fill_at_least')
+        params["fill_at_least"] = float(fill_at_least)
+    return ("WHERE " + " AND ".join(where)) if where else "", params
+
+
+def like_prefix(prefix: str) -> str:
+    """LIKE pattern for values starting with prefix, escaped with backslash."""
+    return prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+
+class StorageBackend(ABC):
+    """
+    Archive, snapshot and static-bin storage. Times passed in are tz-aware or naive UTC;
+    archive rows come back with naive UTC timestamps, UI frames with tz-aware UTC ones.
+    """
+    name: str = ""
+    #IngestListener can wait on this store's NOTIFY channel
+    notifies: bool = False
+    #Estimator state, anomaly and bin event tables live in this store
+    derived_tables: bool = False
+
+    # === WRITES ===
+    @abstractmethod
+    def write_archive_rows(self, df: pd.DataFrame) -> int:
+        """Insert ARCHIVE_COLUMNS rows, skipping existing (sensor_id, timestamp). Returns rows inserted."""
+
+    @abstractmethod
+    def upsert_static_bins(self, df: pd.DataFrame):
+        """Insert or update (bin_id, sensor_id, lat, lng) by bin_id."""
+
+    @abstractmethod
+    def sync_static_bins(self, df: pd.DataFrame, *, delete_missing: bool, update_existing: bool):
+        ...
+
+    @abstractmethod
+    def delete_sensor_rows(self, sensor_prefix: str) -> int:
+        """Delete every row of sensors whose id starts with sensor_prefix. Returns archive rows removed."""
+
+    # === READS ===
+    @abstractmethod
+    def fetch_ingest_version(self) -> int:
+        ...
+
+    @abstractmethod
+    def fetch_static_bins_df(self) -> pd.DataFrame:
+        ...
+
+    @abstractmethod
+    def fetch_static_bins_in_bbox_df(self, bbox: Sequence[float]) -> pd.DataFrame:
+        """Static bins inside bbox=(min_lat, min_lng, max_lat, max_lng), edges included."""
+
+    @abstractmethod
+    def fetch_nearest_static_bins_df(self, lat: float, lng: float, k: int) -> pd.DataFrame:
+        """k static bins nearest to (lat, lng), nearest first, with planar distance_deg."""
+
+    @abstractmethod
+    def fetch_static_cell_counts_df(self, cell_deg: float) -> pd.DataFrame:
+        """cell_lat, cell_lng (south-west corner) and bins per square grid cell."""
+
+    @abstractmethod
+    def fetch_archive_df(
+        self,
+        since: Optional[datetime],
+        until: Optional[datetime],
+        sensor_ids: Optional[Sequence[str]],
+        limit: Optional[int],
+        columns: str,
+    ) -> pd.DataFrame:
+        """Archive rows in [since, until) ordered by sensor_id, timestamp."""
+
+    @abstractmethod
+    def fetch_archive_arrow(
+        self,
+        since: Optional[datetime],
+        until: Optional[datetime],
+        sensor_ids: Optional[Sequence[str]],
+        limit: Optional[int],
+        columns: str,
+        with_coords: bool,
+    ):
+        """fetch_archive_df as a pyarrow Table; with_coords adds bin_id, lat, lng."""
+
+    @abstractmethod
+    def fetch_archive_summary_df(
+        self,
+        since: Optional[datetime],
+        until: Optional[datetime],
+        sensor_ids: Optional[Sequence[str]],
+        bucket_sec: int,
+        per_sensor: bool,
+    ) -> pd.DataFrame:
+        """
+        SUMMARY_COLUMNS per (sensor_id, bucket), or per bucket with sensor_id NULL when
+        per_sensor is False. Buckets are bucket_sec wide, aligned to the Unix epoch.
+        """
+
+    @abstractmethod
+    def fetch_any_latest_snapshot_df(self) -> pd.DataFrame:
+        ...
+
+    @abstractmethod
+    def fetch_latest_snapshot_df(self, within_seconds: int) -> pd.DataFrame:
+        ...
+
+    @abstractmethod
+    def fetch_latest_snapshot_ui_df(self, within_seconds: int, bbox: Optional[Sequence[float]]) -> pd.DataFrame:
+        ...
+
+    @abstractmethod
+    def fetch_latest_snapshot_ui_delta_df(
+        self, since_id: Optional[int], within_seconds: int, bbox: Optional[Sequence[float]]
+    ) -> tuple[pd.DataFrame, int]:
+        ...
+
+    @abstractmethod
+    def fetch_latest_state_page_df(
+        self, *, sort_by: str, descending: bool, where_sql: str, params: dict,
+        offset: int, limit: int, within_seconds: int,
+    ) -> tuple[pd.DataFrame, int]:
+        """One page of the UI snapshot; where_sql/params come from state_page_filters."""
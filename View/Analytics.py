@@ -1,168 +1,302 @@
 import streamlit as st
 import pandas as pd
 from datetime import timedelta
-from Model.data_loader import load_live_with_coords
 import plotly.express as px
 from View import Utilities as util
 
 
+WINDOWS = {
+    "15 Minutes (testing)": timedelta(minutes=15),
+    "30 Minutes (testing)": timedelta(minutes=30),
+    "Hourly": timedelta(hours=1),
+    "6 Hours": timedelta(hours=6),
+    "12 Hours": timedelta(hours=12),
+    "24 Hours": timedelta(hours=24),
+    "48 Hours": timedelta(hours=48),
+    "7 Days": timedelta(days=7)
+    }
 
-# ---- Main Page ----
-def show_analytics():
-    util.remove_elements()
-    key_prefix = "ana_"
 
-    st.title("Smart Bin Analytics")
+@st.cache_resource(max_entries=4, show_spinner=False)
+def _summary_figures(version: int, _df: pd.DataFrame):
+    """Summary metrics and figures, built once per snapshot version."""
+    fill = pd.to_numeric(_df["Fill"], errors="coerce").astype("float64")
+    avg_fill = fill.dropna()
+    avg_temp = pd.to_numeric(_df["Temperature"], errors="coerce").dropna()
+    avg_batt = pd.to_numeric(_df["Battery"], errors="coerce").dropna()
+    metrics = {
+        "fill": avg_fill.mean() if len(avg_fill) else 0,
+        "temp": avg_temp.mean() if len(avg_temp) else 0,
+        "batt": avg_batt.mean() if len(avg_batt) else 0,
+        "count": len(_df),
+    }
+
+    fig_hist = px.histogram(
+        _df.assign(Fill=fill), x ="Fill", nbins=10,
+        color_discrete_sequence=["#0083B8"],
+        title = "Distribution of Bin Fill Levels (%)"
+    )
+    fig_hist.update_layout(xaxis_title="Fill Level (%)", yaxis_title="Count of Bins", bargap=0.15)
+
+    #Pie Chart
+    fill_bins = pd.cut(
+        fill.clip(lower=0, upper=100),
+        bins = [0,25,50,75,100],
+        labels=["0-25%", "26-50%", "51-75%", "76-100%"],
+        include_lowest=True
+    )
+    fill_counts = fill_bins.value_counts().sort_index()
+    fig_pie = px.pie(
+        values=fill_counts.values,
+        names=fill_counts.index.astype(str),
+        color_discrete_sequence=px.colors.qualitative.Set2,
+        hole=0.15,
+        title="Proportion of Bins by Fill Range"
+    )
+    return metrics, fig_hist, fig_pie
 
-    enabled, interval = util.auto_refresh_controls(key_prefix=key_prefix)
-    #Load latest master data
-    df = load_live_with_coords()
 
-    df = util.ensure_columns(df, ["Fill", "Temperature", "Battery", "Timestamp", "DeviceID", "BinID"])
+# === LIVE SUMMARY (refreshes on the auto-refresh cadence) ===
 
-    if "Timestamp" in df.columns:
-        try:
-            df["Timestamp"] = pd.to_datetime(df["Timestamp"]).dt.strftime("%d %b %Y, %-I:%M %p")
-        except Exception:
-            df["Timestamp"] = pd.to_datetime(df["Timestamp"], errors="coerce").dt.strftime("%d %b %Y, %#I:%M %p")
+def _summary_section():
+    df = util.get_latest_df(show_errors=False)
     if df.empty:
         st.warning("No live data available. Please start the simulator.")
         return
-    
+    metrics, fig_hist, fig_pie = _summary_figures(util.snapshot_version(), df)
+
     st.subheader("Overall Summary")
 
     col1, col2 = util.double_column()
 
     with col1:
-        avg_fill = pd.to_numeric(df["Fill"], errors="coerce").dropna()
-        avg_temp = pd.to_numeric(df["Temperature"], errors="coerce").dropna()
-        st.metric("Average Fill", f"{(avg_fill.mean() if len(avg_fill) else 0):.1f}%")
-        st.metric("Average Temperature", f"{(avg_temp.mean() if len(avg_temp) else 0):.1f}°C")
+        st.metric("Average Fill", f"{metrics['fill']:.1f}%")
+        st.metric("Average Temperature", f"{metrics['temp']:.1f}°C")
 
         st.subheader("Fill Level Distribution")
-        fig_hist = px.histogram(
-            df, x ="Fill", nbins=10,
-            color_discrete_sequence=["#0083B8"],
-            title = "Distribution of Bin Fill Levels (%)"
-        )
-        fig_hist.update_layout(xaxis_title="Fill Level (%)", yaxis_title="Count of Bins", bargap=0.15)
         st.plotly_chart(fig_hist, width="stretch")
 
+    with col2:
+        st.metric("Average Battery", f"{metrics['batt']:.2f}V")
+        st.metric("Bins Reporting", metrics["count"])
+
+        st.subheader("Fill Level Distribution")
+        st.plotly_chart(fig_pie, width="stretch")
+
+
+# === FILL FORECAST (refreshes with the live summary) ===
+
+FORECAST_COLS = ["Fill (%)", "Rate (%/h)", "To Threshold (h)", "Threshold ETA", "To Full (h)", "Full ETA"]
+
+def _forecast_section():
+    df = util.get_latest_df(show_errors=False)
+    try:
+        fc = util.fill_forecast_for(util.snapshot_version())
+    except Exception as e:
+        st.error(f"Error loading fill forecast: {e}")
+        return
+
+    st.subheader("Fill Forecast")
+    if fc.empty:
+        st.info("No fill-rate estimates yet - they build up as new readings are ingested.")
+        return
+
+    #Label rows by bin where the live snapshot knows the mapping
+    bins = {}
+    if not df.empty and "DeviceID" in df.columns:
+        bins = dict(zip(df["DeviceID"].astype(str), df.index.astype(str)))
+    table = fc.assign(Bin=fc["DeviceID"].map(bins).fillna(fc["DeviceID"])).set_index("Bin")
+    for col in ("Threshold ETA", "Full ETA"):
+        table[col] = util.format_local_time(table[col], "%a %H:%M")
+    table = table.rename(columns={"Fill": "Fill (%)", "Rate": "Rate (%/h)"})
+
+    st.caption("Estimated from each bin's recent fill rate and the time-of-day traffic profile.")
+    util.render_table(table[FORECAST_COLS], height=360)
+
+
+# === EMPTIES & OVERFLOWS (from the bin_events table) ===
+
+EVENT_WINDOWS = {"7 Days": 7, "30 Days": 30, "90 Days": 90}
 
+@st.fragment
+def _events_section(key_prefix: str):
+    st.subheader("Empties & Overflows")
+    label = st.selectbox("Period", list(EVENT_WINDOWS), index=1, key=f"{key_prefix}event_window")
+    try:
+        events = util.bin_event_summary(EVENT_WINDOWS[label])
+    except Exception as e:
+        st.error(f"Error loading bin events: {e}")
+        return
+    if events.empty:
+        st.info("No empties or overflows recorded in this period.")
+        return
 
+    bins = _bin_lookup(util.get_latest_df(show_errors=False))
+    device_to_bin = {dev: b for b, (dev, _) in bins.items() if dev}
+    table = events.assign(Bin=events["DeviceID"].map(device_to_bin).fillna(events["DeviceID"])).set_index("Bin")
+    table["Last Emptied"] = util.format_local_time(table["Last Emptied"]).to_numpy()
 
+    col1, col2 = util.double_column()
+    with col1:
+        st.metric("Empties", int(table["Empties"].sum()))
     with col2:
-        avg_batt = pd.to_numeric(df["Battery"], errors="coerce").dropna()
-        st.metric("Average Battery", f"{(avg_batt.mean() if len(avg_batt) else 0):.2f}V")
-        st.metric("Bins Reporting", len(df))
+        st.metric("Overflows", int(table["Overflows"].sum()))
+    util.render_table(table.drop(columns=["DeviceID"]), height=300)
 
-        #Pie Chart
-        st.subheader("Fill Level Distribution")
-        fill_series = pd.to_numeric(df["Fill"], errors="coerce").clip(lower=0, upper=100)
-        fill_bins = pd.cut(
-            fill_series,
-            bins = [0,25,50,75,100],
-            labels=["0-25%", "26-50%", "51-75%", "76-100%"],
-            include_lowest=True
-        )
-        fill_counts = fill_bins.value_counts().sort_index()
-        fig = px.pie(
-            values=fill_counts.values,
-            names=fill_counts.index.astype(str),
-            color_discrete_sequence=px.colors.qualitative.Set2,
-            hole=0.15,
-            title="Proportion of Bins by Fill Range"
-        )
-        st.plotly_chart(fig, width="stretch")
-    
-    st.divider()
 
-    st.header("Individual Bin Analysis")
+# === FLEET TRENDS (aggregated in the store, not from raw rows) ===
+
+TREND_WINDOWS = {"7 Days (hourly)": (7, "1h"), "30 Days (6-hourly)": (30, "6h"), "90 Days (daily)": (90, "1D")}
+
+@st.fragment
+def _trend_section(key_prefix: str):
+    st.subheader("Fleet Trends")
+    label = st.selectbox("Period", list(TREND_WINDOWS), index=0, key=f"{key_prefix}trend_window")
+    days, bucket = TREND_WINDOWS[label]
+    try:
+        trend = util.fleet_trend(days, bucket)
+    except Exception as e:
+        st.error(f"Error loading fleet trends: {e}")
+        return
+    if trend.empty:
+        st.info("No readings archived in this period.")
+        return
+
+    trend = trend.assign(Time=util.to_local_time(trend["Time"]))
+    fig = px.line(
+        trend, x="Time", y=["Avg Fill", "Max Fill"],
+        title=f"Fleet Fill Level - {label}"
+    )
+    fig.update_layout(yaxis_title="Fill Level (%)", yaxis_range=[0, 100], xaxis_title=None, legend_title=None)
+    st.plotly_chart(fig, width="stretch")
+    st.caption(f"{int(trend['Readings'].sum()):,} readings aggregated.")
+
+
+# === PER-BIN HISTORY (refreshes with the live summary) ===
 
+@st.cache_resource(max_entries=16, show_spinner=False)
+def _history_figures(device_id: str, as_of, window: str, bin_label: str):
+    """Fill and temperature charts for one bin, rebuilt only when it has a newer reading (as_of)."""
+    log_df = util.cached_bin_log(device_id, as_of)
+    if log_df.empty:
+        return None
+
+    log_df = util.ensure_columns(log_df, ["Timestamp", "Fill", "Temperature"])
+    # Time windowing
+    if "Timestamp" in log_df.columns and not log_df["Timestamp"].dropna().empty:
+        #Window on the epoch-ms values; only the plotted rows are converted to local time
+        now_ms = int(log_df["Timestamp"].max())
+        delta = WINDOWS[window]
+        log_window = log_df[log_df["Timestamp"] >= now_ms - delta // timedelta(milliseconds=1)]
+        now = util.to_local_time([now_ms]).iloc[0]
+        start_time = now - delta
+    else:
+        log_window, start_time, now = log_df, None, None
+    log_window = util.display_frame(log_window)
+    for c in ("Fill", "Temperature"):
+        log_window[c] = pd.to_numeric(log_window[c], errors="coerce").astype("float64")
+
+    fig_fill = px.line(
+        log_window, x="Timestamp", y="Fill",
+        title=f"Fill Level Trend - {bin_label}", markers=True
+    )
+    kw = dict(yaxis_title="Fill Level (%)", yaxis_range=[0, 100])
+    if start_time is not None:
+        kw["xaxis_range"] = [start_time, now]
+    fig_fill.update_layout(**kw)
+
+    fig_temp = px.line(
+        log_window, x="Timestamp", y="Temperature",
+        title="Temperature Flux", markers=True
+    )
+    kw = dict(yaxis_title="Temperature (°C)", yaxis_range=[-5, 60], xaxis_title=None)
+    if start_time is not None:
+        kw["xaxis_range"] = [start_time, now]
+    fig_temp.update_layout(**kw)
+    return fig_fill, fig_temp, log_window.empty
+
+def _bin_history_section(key_prefix: str):
+    #The bin list and each bin's latest reading time come from the live snapshot on every
+    #run, so a new reading changes as_of and the cached log and charts are rebuilt
+    bins = _bin_lookup(util.get_latest_df(show_errors=False))
     col1, col2 = util.double_column()
-    bin_index_like = df.index.astype(str).tolist()
-    bin_col_like = df["BinID"].astype(str).tolist() if "BinID" in df.columns else []
-    bin_ids = bin_index_like if len(set(bin_index_like)) >= len(set(bin_col_like)) else bin_col_like
-    bin_ids = list(dict.fromkeys([b for b in bin_ids if b]))  # unique, non-empty
 
     with col1:
-        selected_bin = st.selectbox("Select a Bin", bin_ids, key=f"{key_prefix}bin_select")
+        selected_bin = st.selectbox("Select a Bin", list(bins), key=f"{key_prefix}bin_select")
     
     with col2:
         window = st.selectbox(
             "Time Window",
-            ["15 Minutes (testing)", "30 Minutes (testing)", "Hourly", "6 Hours", "12 Hours", "24 Hours", "48 Hours", "7 Days"],
+            list(WINDOWS),
             index = 4,
             key=f"{key_prefix}window_select"
             )
 
-        WINDOWS = {
-            "15 Minutes (testing)": timedelta(minutes=15),
-            "30 Minutes (testing)": timedelta(minutes=30),
-            "Hourly": timedelta(hours=1),
-            "6 Hours": timedelta(hours=6),
-            "12 Hours": timedelta(hours=12),
-            "24 Hours": timedelta(hours=24),
-            "48 Hours": timedelta(hours=48),
-            "7 Days": timedelta(days=7)
-            }
-
-    if selected_bin:
-        # Resolve DeviceID safely
-        device_id = None
-        if selected_bin in df.index.astype(str):
-            device_id = str(df.loc[selected_bin, "DeviceID"]) if "DeviceID" in df.columns else None
-        elif "BinID" in df.columns:
-            row = df[df["BinID"].astype(str) == selected_bin]
-            if not row.empty and "DeviceID" in row.columns:
-                device_id = str(row.iloc[0]["DeviceID"])
-
-        if not device_id:
-            st.info("No device id found for the selected bin.")
-        else:
-            log_df = util.load_bin_log(device_id)
-            if log_df.empty:
-                st.info(f"No log data found for device {device_id}.")
-            else:
-                log_df = util.ensure_columns(log_df, ["Timestamp", "Fill", "Temperature"])
-                # Time windowing
-                if "Timestamp" in log_df.columns and not log_df["Timestamp"].empty:
-                    now = log_df["Timestamp"].max()
-                    delta = WINDOWS[window]
-                    start_time = now - delta
-                    log_window = log_df[log_df["Timestamp"].between(start_time, now)]
-                else:
-                    log_window, start_time, now = log_df.copy(), None, None
-
-                c1, c2 = util.double_column()
-
-                with c1:
-                    st.subheader("Fill Level Over Time")
-                    fig_fill = px.line(
-                        log_window, x="Timestamp", y="Fill",
-                        title=f"Fill Level Trend - {selected_bin}", markers=True
-                    )
-                    kw = dict(yaxis_title="Fill Level (%)", yaxis_range=[0, 100])
-                    if start_time is not None:
-                        kw["xaxis_range"] = [start_time, now]
-                    fig_fill.update_layout(**kw)
-                    st.plotly_chart(fig_fill, width="stretch")
-
-                with c2:
-                    st.subheader("Temperature Over Time")
-                    fig_temp = px.line(
-                        log_window, x="Timestamp", y="Temperature",
-                        title="Temperature Flux", markers=True
-                    )
-                    kw = dict(yaxis_title="Temperature (°C)", yaxis_range=[-5, 60], xaxis_title=None)
-                    if start_time is not None:
-                        kw["xaxis_range"] = [start_time, now]
-                    fig_temp.update_layout(**kw)
-                    st.plotly_chart(fig_temp, width="stretch")
-
-                if log_window.empty:
-                    st.info(f"No data in the selected window ({window})")
-
-
-                
-    util.maybe_autorefresh(enabled, interval)
\ No newline at end of file
+    if not selected_bin:
+        return
+
+    device_id, as_of = bins.get(selected_bin, (None, None))
+    if not device_id:
+        st.info("No device id found for the selected bin.")
+        return
+
+    figures = _history_figures(device_id, as_of, window, selected_bin)
+    if figures is None:
+        st.info(f"No log data found for device {device_id}.")
+        return
+    fig_fill, fig_temp, window_empty = figures
+
+    c1, c2 = util.double_column()
+
+    with c1:
+        st.subheader("Fill Level Over Time")
+        st.plotly_chart(fig_fill, width="stretch")
+
+    with c2:
+        st.subheader("Temperature Over Time")
+        st.plotly_chart(fig_temp, width="stretch")
+
+    if window_empty:
+        st.info(f"No data in the selected window ({window})")
+
+
+def _bin_lookup(df: pd.DataFrame) -> dict:
+    if df.empty or "DeviceID" not in df.columns:
+        return {}
+    ts = df["Timestamp"] if "Timestamp" in df.columns else pd.Series(None, index=df.index)
+    out = {}
+    for b, dev, t in zip(df.index.astype(str), df["DeviceID"], ts):
+        if b and b not in out:
+            out[b] = (str(dev) if pd.notna(dev) else None, t)
+    return out
+
+
+# ---- Main Page ----
+def show_analytics():
+    util.remove_elements()
+    key_prefix = "ana_"
+
+    st.title("Smart Bin Analytics")
+
+    enabled, interval = util.auto_refresh_controls(key_prefix=key_prefix)
+
+    live_every = util.live_run_every(enabled, interval)
+    st.fragment(_summary_section, run_every=live_every)()
+    st.fragment(_forecast_section, run_every=live_every)()
+
+    df = util.get_latest_df(show_errors=True)
+    if df.empty:
+        return
+
+    st.divider()
+
+    _events_section(key_prefix)
+
+    st.divider()
+
+    _trend_section(key_prefix)
+
+    st.divider()
+
+    st.header("Individual Bin Analysis")
+    st.fragment(_bin_history_section, run_every=live_every)(key_prefix)
@@ -7,181 +7,253 @@ import sys
 from zoneinfo import ZoneInfo
 
 
+KEY_PREFIX = "dash_"
+
+fmt_linux = "%d %b %Y, %-I:%M %p"
+fmt_win = "%d %b %Y, %#I:%M %p"
+TIME_FMT = fmt_win if sys.platform.startswith("win") else fmt_linux
+
+
+@st.cache_data(show_spinner=False, ttl=300)
+def _bin_ids():
+    df = repo.fetch_archive_df(columns="sensor_id")
+    if df is None or df.empty or "sensor_id" not in df.columns:
+        return[]
+    return sorted(pd.Series(df["sensor_id"]).dropna().astype(str).unique().tolist())
+
+SUMMARY_COLS = [
+    "Timestamp", "Fill", "Temperature", "Battery",
+    "Last Emptied", "Overflow #", "Last Overflow"
+]
+PAGE_SIZES = [10, 25, 50, 100]
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def _status_page(version: int, page: int, page_size: int, filters: tuple) -> tuple[pd.DataFrame, int]:
+    """One formatted page of the status table; re-queried only when the data version or the inputs change."""
+    df, total = util.load_status_page(page=page, page_size=page_size, **dict(filters))
+    display_df = util.ensure_columns(df, SUMMARY_COLS)
+    for col in ("Timestamp", "Last Emptied", "Last Overflow"):
+        if col in display_df.columns:
+            display_df[col] = util.format_local_time(display_df[col], TIME_FMT)
+    return display_df[SUMMARY_COLS], total
+
+def _status_table(version: int):
+    """Bin status table sorted, filtered and paged in SQL; only the visible page is formatted and sent."""
+    c1, c2, c3, c4 = st.columns([2, 1, 1, 1])
+    with c1:
+        sort_by = st.selectbox("Sort by", list(repo.STATE_SORT_COLUMNS), index=3, key=f"{KEY_PREFIX}tbl_sort")
+    with c2:
+        descending = st.toggle("Descending", value=True, key=f"{KEY_PREFIX}tbl_desc")
+    with c3:
+        only_urgent = st.toggle("Only urgent", value=False, key=f"{KEY_PREFIX}tbl_urgent")
+    with c4:
+        battery_below = st.number_input("Battery below (V, 0 = off)", min_value=0.0, max_value=5.0,
+                                        value=0.0, step=0.1, key=f"{KEY_PREFIX}tbl_batt")
+
+    filters = (
+        ("sort_by", sort_by),
+        ("descending", descending),
+        ("only_urgent", only_urgent),
+        ("battery_below", battery_below or None),
+    )
+    page_size = st.session_state.get(f"{KEY_PREFIX}tbl_page_size", 25)
+    page = st.session_state.get(f"{KEY_PREFIX}tbl_page", 1)
+
+    try:
+        page_df, total = _status_page(version, page, page_size, filters)
+    except Exception as e:
+        st.error(f"Error loading bin status: {e}")
+        return
+
+    pages = max(1, -(-total // page_size))
+    if page > pages:
+        #Filters shrank the result - clamp before the page widget is created
+        page = st.session_state[f"{KEY_PREFIX}tbl_page"] = pages
+        page_df, total = _status_page(version, page, page_size, filters)
+    util.render_table(page_df, height = 360)
+
+    p1, p2, p3 = st.columns([1, 1, 2])
+    with p1:
+        st.selectbox("Rows per page", PAGE_SIZES, index=PAGE_SIZES.index(25), key=f"{KEY_PREFIX}tbl_page_size")
+    with p2:
+        st.number_input("Page", min_value=1, max_value=pages, step=1, key=f"{KEY_PREFIX}tbl_page")
+    with p3:
+        st.caption(f"{total} bins match - page {page} of {pages}")
+
+
+# === LIVE SECTIONS (refresh on the auto-refresh cadence) ===
+
+def _map_section():
+    df = util.get_latest_df(show_errors=True)
+    if df.empty:
+        return
+    util.render_map_section(deck=util.map_deck_for(util.snapshot_version(), df))
+
+def _overview_section():
+    df = util.get_latest_df(show_errors=False)
+    if df.empty:
+        return
+    version = util.snapshot_version()
+    urgent_df = util.urgent_for(version, df)
+
+    st.header("Bin Data Overview")
+    col1, col2 = util.two_to_one()
+
+    with col1:
+        st.subheader("Bin Status Summary Table")
+        _status_table(version)
+        util.download_button_from_df(
+            df.reset_index(),
+            filename = "Bin_Status_Summary.csv",
+            label = "Export Bin Status to CSV",
+            key=f"{KEY_PREFIX}export_summary_btn"
+        )
+
+    with col2:
+        st.subheader("Urgent Alerts")
+        urgent_cols = ["Timestamp", "Alert"]
+
+        if urgent_df.empty:
+            st.success("No urgent alerts at this time.")
+            util.download_button_from_df(
+                urgent_df,
+                filename = "Urgent_Alerts.csv",
+                label="Export Urgent Alerts to CSV",
+                key="export_urgent_btn",
+            )
+        else:
+            urgent_display = util.ensure_columns(urgent_df.set_index("BinID", drop=True), urgent_cols)
+            if "Timestamp" in urgent_display.columns:
+                urgent_display["Timestamp"] = util.format_local_time(urgent_display["Timestamp"], TIME_FMT)
+
+            util.render_table(urgent_display[urgent_cols], height = 360)
+            util.download_button_from_df(
+                urgent_display,
+                filename='Urgent_Alerts.csv',
+                label="Export Urgent Alerts to CSV",
+                key = "export_urgents_btn"
+        )
+
+
+# === EXPORT SECTION (reruns only when its own inputs change) ===
+
+@st.fragment
+def _export_section():
+    st.header("Export Bin Data")
+
+    bin_options = _bin_ids()
+    ALL = "All bins"
+    SENTINEL = "--No bins available--"
+    choices = ([ALL] + bin_options) if bin_options else [SENTINEL]
+    selected_bin = st.selectbox("Select Bin", choices, key="dl_bin")
+
+    tz = ZoneInfo("Australia/Melbourne")
+    today = datetime.now(tz).date()
+    default_start = today - timedelta(days=7)
+
+    col1,col2,col3 = util.triple_column()
+    with col1:
+        since_date = st.date_input("Start date", value=default_start, key="dl_since_date")
+        since_time = st.time_input("Start time", value=dtime(0,0), key="dl_since_time")
+    with col2:
+        until_date = st.date_input("End date", value=today, key="dl_until_date")
+        until_time = st.time_input("End time", value=dtime(23, 59), key="dl_until_time")
+    with col3:
+        limit = st.number_input("Row limit (0 = no limit)", min_value=0, value=0, step=1000, key="dl_limit")
+
+    fmt = st.selectbox(
+        "Format", 
+        ["CSV", "JSON", "Parquet", "HTML", "XML", "Feather"],
+        key = "dl_fmt"
+    )
+
+    if selected_bin == SENTINEL:
+        st.info("No bins are available yet.")
+        return
+
+    since = datetime.combine(since_date, since_time, tzinfo=tz)
+    until = datetime.combine(until_date, until_time, tzinfo=tz)
+    if since > until:
+        st.error("Start must be before end")
+        return
+
+    #Exports are cached on disk by normalised query, so every session shares finished files
+    device_id = None if selected_bin == ALL else selected_bin
+    query = util.export_query(device_id, since, until, limit, fmt)
+    cache = util.export_cache()
+    key = cache.key(query)
+
+    if cache.get(key) is None:
+        job = cache.job(key)
+        if job is None or (job.done and job.error is None):
+            job = util.start_export(query)
+        elif job.done and st.button("Retry export", key="dl_retry"):
+            job = util.start_export(query)
+        #Small exports usually finish within this wait; larger ones keep building in the background
+        job.wait(1.0)
+
+    job = cache.job(key)
+    pending = cache.get(key) is None and job is not None and not job.done
+    base = "all_bins" if device_id is None else device_id
+    st.fragment(_export_download, run_every=1.0 if pending else None)(key, base, fmt, pending)
+
+
+def _export_download(key: str, base: str, fmt: str, polling: bool):
+    """Progress bar while the export builds, then the download button."""
+    cache = util.export_cache()
+    artifact = cache.get(key)
+    job = cache.job(key)
+    if artifact is None and job is not None and not job.done:
+        st.progress(job.progress, text=f"Preparing {fmt} export: {job.stage}")
+        return
+    if polling:
+        #Finished - one full rerun drops this fragment's polling timer
+        st.rerun()
+
+    if artifact is not None:
+        st.download_button(
+            label=f"Export {fmt}",
+            data=artifact.read_bytes(),
+            file_name=f"{base}_data.{artifact.ext}",
+            mime=artifact.mime,
+            key="dl_btn"
+        )
+    elif job is not None and isinstance(job.error, LookupError):
+        st.info(str(job.error))
+    elif job is not None and job.error is not None:
+        st.error(f"Export failed: {job.error}")
+
+
 def show_dashboard():
     st.session_state["_dl_rendered_this_rerun"] = False
     util.remove_elements()
-    key_prefix = "dash_"
+    key_prefix = KEY_PREFIX
 
     #Title
     st.title("Maribyrnong Smart City Bins Dashboard - Project 104")
     st.divider()
 
     if util.refresh_button("Refresh now", key=f"{key_prefix}refresh_btn"):
+        util.refresh_snapshot()
         st.rerun()
 
     auto_enabled, auto_interval = util.auto_refresh_controls(key_prefix=key_prefix)
-    
-    #Load latest data
-    df = util.get_latest_df(show_errors=True)
-
-    if df.empty:
-        util.maybe_autorefresh(auto_enabled, auto_interval)
-        return
-   
-    #Prepare map and alerts
-    map_data = util.prep_map_data(df)
-    urgent_df = util.filter_urgent(df)
+    live_every = util.live_run_every(auto_enabled, auto_interval)
 
+    #Map and alerts are separate fragments so each only redraws itself on its cadence
     with st.container(key=f"{key_prefix}map_container"):
-        util.render_map_section(map_data)
+        st.fragment(_map_section, run_every=live_every)()
 
     st.divider()
 
     #Data Overview
     with st.container(key=f"{key_prefix}overview_container"):
-        st.header("Bin Data Overview")
-        col1, col2 = util.two_to_one()
-
-        with col1:
-            st.subheader("Bin Status Summary Table")
-            summary_cols = [
-                "Timestamp", "Fill", "Temperature", "Battery",
-                "Last Emptied", "Overflow #", "Last Overflow"
-            ]
-
-            display_df = df.copy()
-            display_df = util.ensure_columns(display_df, summary_cols)
-
-            fmt_linux = "%d %b %Y, %-I:%M %p"
-            fmt_win = "%d %b %Y, %#I:%M %p"
-
-            fmt = fmt_win if sys.platform.startswith("win") else fmt_linux
-            for col in ("Timestamp", "Last Emptied", "Last Overflow"):
-                if col in display_df.columns:
-                    display_df[col] = pd.to_datetime(display_df[col], errors = "coerce").dt.strftime(fmt)
-
-            util.render_table(display_df[summary_cols], height = 360)
-            util.download_button_from_df(
-                df.reset_index(),
-                filename = "Bin_Status_Summary.csv",
-                label = "Export Bin Status to CSV",
-                key=f"{key_prefix}export_summary_btn"
-            )
-
-        with col2:
-            st.subheader("Urgent Alerts")
-            urgent_cols = ["Timestamp", "Alert"]
-
-            if urgent_df.empty:
-                st.success("No urgent alerts at this time.")
-                util.download_button_from_df(
-                    urgent_df,
-                    filename = "Urgent_Alerts.csv",
-                    label="Export Urgent Alerts to CSV",
-                    key="export_urgent_btn",
-                )
-            else:
-                urgent_df = urgent_df.set_index("BinID", drop=True)
-                urgent_display = util.ensure_columns(urgent_df.copy(), urgent_cols)
-                if "Timestamp" in urgent_display.columns:
-                    try:
-                        urgent_display["Timestamp"] = pd.to_datetime(urgent_display["Timestamp"]).dt.strftime("%d %b %Y, %-I:%M %p")
-                    except Exception:
-                        urgent_display["Timestamp"] = pd.to_datetime(urgent_display["Timestamp"], errors="coerce").dt.strftime("%d %b %Y, %#I:%M %p")
-
-                util.render_table(urgent_display[urgent_cols], height = 360)
-                util.download_button_from_df(
-                    urgent_display,
-                    filename='Urgent_Alerts.csv',
-                    label="Export Urgent Alerts to CSV",
-                    key = "export_urgents_btn"
-            )
+        st.fragment(_overview_section, run_every=live_every)()
     
     st.divider()
 
 #DOWNLOAD FILE DATA
     if not st.session_state.get("_dl_rendered_this_rerun", False):
         st.session_state["_dl_rendered_this_rerun"] = True  # mark as rendered
-        dl_container = st.container()
-        with dl_container:
-            st.header("Export Bin Data")
-
-            @st.cache_data(show_spinner=False, ttl=300)
-            def _bin_ids():
-                df = repo.fetch_archive_df(columns="sensor_id")
-                if df is None or df.empty or "sensor_id" not in df.columns:
-                    return[]
-                return sorted(pd.Series(df["sensor_id"]).dropna().astype(str).unique().tolist())
-            
-            bin_options = _bin_ids()
-            ALL = "All bins"
-            SENTINEL = "--No bins available--"
-            choices = ([ALL] + bin_options) if bin_options else [SENTINEL]
-            selected_bin = st.selectbox("Select Bin", choices, key="dl_bin")
-
-            tz = ZoneInfo("Australia/Melbourne")
-            today = datetime.now(tz).date()
-            default_start = today - timedelta(days=7)
-
-            col1,col2,col3 = util.triple_column()
-            with col1:
-                since_date = st.date_input("Start date", value=default_start, key="dl_since_date")
-                since_time = st.time_input("Start time", value=dtime(0,0), key="dl_since_time")
-            with col2:
-                until_date = st.date_input("End date", value=today, key="dl_until_date")
-                until_time = st.time_input("End time", value=dtime(23, 59), key="dl_until_time")
-            with col3:
-                limit = st.number_input("Row limit (0 = no limit)", min_value=0, value=0, step=1000, key="dl_limit")
-
-            fmt = st.selectbox(
-                "Format", 
-                ["CSV", "JSON", "Parquet", "HTML", "XML", "Feather"],
-                key = "dl_fmt"
-            )
-
-            if selected_bin == SENTINEL:
-                st.info("No bins are available yet.")
-            else:
-                ss = st.session_state
-                ss.setdefault("dl_params", None)
-                ss.setdefault("dl_payload", None)
-
-                since = datetime.combine(since_date, since_time, tzinfo=tz)
-                until = datetime.combine(until_date, until_time, tzinfo=tz)
-                if since > until:
-                    st.error("Start must be before end")
-                else:
-                    params = (selected_bin, since.isoformat(), until.isoformat(), int(limit), fmt)
-
-                    def _prepare():
-                        device_id = None if selected_bin == ALL else selected_bin
-                        df = util.get_archive_with_coords_df(
-                            device_id,
-                            since=since,
-                            until=until,
-                            limit=None if limit == 0 else int(limit)
-                        )
-                        if not isinstance(df, pd.DataFrame) or df.empty:
-                            st.info("No data found for the selected bin and time window")
-                            ss.dl_payload = None
-                            return
-                        data, mime, ext = util.prepare_download(df, fmt)
-                        base = "all_bins" if device_id is None else device_id
-                        ss.dl_payload = (data, mime, ext, base, fmt)
-                        ss.dl_params = params
-                    
-                    if ss.dl_params != params:
-                        _prepare()
-
-                    if ss.dl_payload:
-                        data, mime, ext, base, fmt_now = ss.dl_payload
-                        st.download_button(
-                            label=f"Export {fmt_now}",
-                            data=data,
-                            file_name=f"{base}_data.{ext}",
-                            mime=mime,
-                            key="dl_btn"
-                        )
-            
-                
-    util.maybe_autorefresh(auto_enabled, auto_interval)
+        with st.container():
+            _export_section()
@@ -1,13 +1,26 @@
+from __future__ import annotations
 import streamlit as st
-import pydeck as pdk
 import pandas as pd
+import numpy as np
 from io import BytesIO
-from Model.data_loader import load_live_with_coords, load_archive_with_coords as _load_archive_with_coords
+from Model.data_loader import LiveSnapshotFeed, load_status_page, load_archive_with_coords as _load_archive_with_coords
+from Model.data_loader import display_frame, export_frame, export_table, format_local_time, to_local_time
 from Model import repository as repo
-import time
+from Model.snapshot_refresher import SnapshotRefresher
+from Model.export_cache import ExportCache, is_closed_window, normalise_query as export_query
+from Model.alert_rules import compile_rules, default_rules
+from Model import fill_forecast
+import os
+import tempfile
+from functools import lru_cache, partial
 from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING
 from zoneinfo import ZoneInfo
 
+#pydeck is imported when the first map is built; only the Dashboard draws one
+if TYPE_CHECKING:
+    import pydeck as pdk
+
 MEL = ZoneInfo("Australia/Melbourne")
 
 # === TIMEZONE HELPER ===
@@ -22,21 +35,67 @@ def _to_utc(dt):
 
 # === LIVE DATA / CACHING ===
 
-@st.cache_data(ttl=2)
-def _cached_load():
-    return load_live_with_coords()
+SNAPSHOT_REFRESH_SECS = float(os.environ.get("SNAPSHOT_REFRESH_SECS", "2"))
+INGEST_LISTEN = os.environ.get("INGEST_LISTEN", "1") == "1"
+
+def _env_bbox(name: str) -> tuple[float, float, float, float] | None:
+    raw = os.environ.get(name, "").strip()
+    if not raw:
+        return None
+    bbox = tuple(float(v) for v in raw.split(","))
+    if len(bbox) != 4:
+        raise ValueError(f"{name} must be min_lat,min_lng,max_lat,max_lng")
+    return bbox
+
+#Map viewport (min_lat,min_lng,max_lat,max_lng) for the live snapshot; unset loads every bin.
+#Only bins inside it are read, so a city-scale deployment can serve one district per app.
+MAP_BBOX = _env_bbox("MAP_BBOX")
+
+@st.cache_resource
+def _snapshot_refresher() -> SnapshotRefresher:
+    # One refresher per server process, shared by every session.
+    # Re-queries only when the ingest NOTIFY / version token says new rows landed.
+    # LiveSnapshotFeed transfers only bins that changed since its last watermark.
+    return SnapshotRefresher(
+        LiveSnapshotFeed(bbox=MAP_BBOX),
+        interval_sec=SNAPSHOT_REFRESH_SECS,
+        change_token=repo.fetch_ingest_version,
+        listener_factory=repo.IngestListener if INGEST_LISTEN and repo.backend().notifies else None,
+    ).start()
 
 def get_latest_df(show_errors: bool = True) -> pd.DataFrame:
-    try:
-        return _cached_load()
-    except FileNotFoundError:
+    """Latest published live snapshot (shared, read-only - copy before mutating)."""
+    refresher = _snapshot_refresher()
+    snap = refresher.latest(wait_sec=5)
+    if snap is None:
         if show_errors:
-            st.error("No data found in the database yet.")
-        return pd.DataFrame()
-    except Exception as e:
-        if show_errors:
-            st.error(f"Error loading data: {e}")
+            if refresher.last_error is not None:
+                st.error(f"Error loading data: {refresher.last_error}")
+            else:
+                st.error("No data found in the database yet.")
         return pd.DataFrame()
+    st.session_state["_snapshot_version"] = snap.version
+    return snap.frame
+
+def refresh_snapshot():
+    """Poll the live snapshot immediately instead of waiting for the next cycle."""
+    _snapshot_refresher().refresh_now()
+
+def snapshot_version() -> int:
+    """Version of the snapshot this session last read via get_latest_df."""
+    return int(st.session_state.get("_snapshot_version", 0))
+
+# Derived views are memoised per snapshot version and shared by every session,
+# so fragments that rerun on a timer only redo work when the data changed.
+# The leading underscore keeps Streamlit from hashing the frame.
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def map_deck_for(version: int, _df: pd.DataFrame):
+    return load_map(prep_map_data(_df))
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def urgent_for(version: int, _df: pd.DataFrame) -> pd.DataFrame:
+    return filter_urgent(_df)
     
 # === DATAFRAME / COLUMN HELPERS ===
 
@@ -53,11 +112,55 @@ def render_table(df: pd.DataFrame, *, width="stretch", height=300):
         return
     st.dataframe(df, width=width, height=height)
 
+@st.cache_data(max_entries=4, show_spinner=False)
+def fill_forecast_for(version: int) -> pd.DataFrame:
+    """Fleet-wide fill forecast from the persisted estimator state, recomputed once per snapshot version."""
+    if not repo.backend().derived_tables:
+        return fill_forecast.forecast(fill_forecast.empty_state())
+    return fill_forecast.forecast(repo.fetch_state_df(repo.FILL_RATE_STATE))
+
+@st.cache_data(max_entries=8, ttl=300, show_spinner=False)
+def bin_event_summary(days: int) -> pd.DataFrame:
+    """
+    Per-sensor empties and overflows over the last `days`, read from the bin_events
+    table (one row per sensor): Empties, Hours Between Empties, Last Emptied (UTC),
+    Overflows, Overflow Hours.
+    """
+    cols = ["DeviceID", "Empties", "Hours Between Empties", "Last Emptied", "Overflows", "Overflow Hours"]
+    if not repo.backend().derived_tables:
+        return pd.DataFrame(columns=cols)
+    since = datetime.now(timezone.utc) - timedelta(days=days)
+    summary = repo.fetch_bin_event_summary_df(since=since)
+    if summary.empty:
+        return pd.DataFrame(columns=cols)
+
+    by_kind = summary.pivot(index="sensor_id", columns="kind")
+    def pick(field, kind):
+        return by_kind[(field, kind)] if (field, kind) in by_kind.columns else pd.Series(np.nan, index=by_kind.index)
+
+    out = pd.DataFrame({
+        "DeviceID": by_kind.index.astype(str),
+        "Empties": pick("events", "emptied").fillna(0).astype("int64").to_numpy(),
+        "Hours Between Empties": pd.to_numeric(pick("mean_gap_h", "emptied"), errors="coerce").round(1).to_numpy(),
+        "Last Emptied": pd.to_datetime(pick("last_ts", "emptied"), utc=True).array,
+        "Overflows": pick("events", "overflow_start").fillna(0).astype("int64").to_numpy(),
+        "Overflow Hours": pd.to_numeric(pick("mean_duration_h", "overflow_start"), errors="coerce").round(1).to_numpy(),
+    })
+    return out.sort_values(["Overflows", "Empties"], ascending=False, kind="stable").reset_index(drop=True)
+
+@st.cache_data(max_entries=64, ttl=600, show_spinner=False)
+def cached_bin_log(device_id: str, as_of=None) -> pd.DataFrame:
+    """load_bin_log keyed by the bin's latest reading time, so it only re-queries after new data."""
+    return load_bin_log(device_id)
+
+#Sensors report on change / heartbeat; charts forward-fill the gaps at the sampling interval
+REPORT_STEP = pd.Timedelta(seconds=int(os.environ.get("WRITE_INTERVAL_SECONDS", "900")))
+
 def load_bin_log(device_id: str) -> pd.DataFrame:
     """Load historical readings for a single bin from the DB archive"""
     from Model.data_loader import load_archive_with_coords
     try:
-        df = load_archive_with_coords(device_id)
+        df = load_archive_with_coords(device_id, fill_step=REPORT_STEP)
         if df.empty:
             return df
         
@@ -80,32 +183,128 @@ def prep_map_data(df: pd.DataFrame) -> pd.DataFrame:
 
 # === MAP RENDERING ===
 
+MAP_DEFAULT_VIEW = {"latitude": -37.7932, "longitude": 144.8990, "zoom": 17}
+MAP_CLUSTER_ZOOM = float(os.environ.get("MAP_CLUSTER_ZOOM", "15"))
+MAP_MAX_POINTS = int(os.environ.get("MAP_MAX_POINTS", "5000"))
+
+_TOOLTIP_STYLE = {"backgroundColor": "rgba(255, 255, 255, 0.8)", "color": "black"}
+
+def fill_colors(fill) -> np.ndarray:
+    """RGBA uint8 array (n, 4): green when empty through to red when full."""
+    ratio = pd.to_numeric(pd.Series(fill), errors="coerce").fillna(0).clip(0, 100).to_numpy(dtype="float32") / 100.0
+    rgba = np.empty((len(ratio), 4), dtype=np.uint8)
+    rgba[:, 0] = (ratio * 255).astype(np.uint8)
+    rgba[:, 1] = ((1 - ratio) * 255).astype(np.uint8)
+    rgba[:, 2] = 0
+    rgba[:, 3] = 200
+    return rgba
+
+def _fit_view(lat: np.ndarray, lng: np.ndarray) -> dict:
+    """Centre and zoom that frame every bin (falls back to the depot view)."""
+    ok = ~(np.isnan(lat) | np.isnan(lng))
+    if not ok.any():
+        return dict(MAP_DEFAULT_VIEW)
+    lat, lng = lat[ok], lng[ok]
+    span = max(float(lng.max() - lng.min()), float(lat.max() - lat.min()) * 1.3, 1e-6)
+    # ~one 512px-wide viewport covers 720/2**zoom degrees
+    zoom = float(np.clip(np.log2(720.0 / span) - 0.5, 3, MAP_DEFAULT_VIEW["zoom"]))
+    return {"latitude": float((lat.max() + lat.min()) / 2), "longitude": float((lng.max() + lng.min()) / 2), "zoom": zoom}
+
+def _rounded(df: pd.DataFrame, col: str, decimals: int) -> np.ndarray:
+    if col not in df.columns:
+        return np.full(len(df), np.nan)
+    return pd.to_numeric(df[col], errors="coerce").to_numpy(dtype="float64", na_value=np.nan).round(decimals)
+
+def _point_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Only the columns the layer and tooltip use, rounded so the JSON payload stays small."""
+    rgba = fill_colors(df["Fill"])
+    out = pd.DataFrame({
+        "BinID": df["BinID"].astype(str).to_numpy() if "BinID" in df.columns else df.index.astype(str),
+        "Lat": _rounded(df, "Lat", 6),
+        "Lng": _rounded(df, "Lng", 6),
+        "Fill": _rounded(df, "Fill", 0),
+        "Temperature": _rounded(df, "Temperature", 1),
+        "Battery": _rounded(df, "Battery", 2),
+        "r": rgba[:, 0],
+        "g": rgba[:, 1],
+    })
+    return out.dropna(subset=["Lat", "Lng"])
+
+def aggregate_grid(df: pd.DataFrame, cell_deg: float) -> pd.DataFrame:
+    """Bins grouped into square lat/lng cells: centroid, count, mean and max fill, colour."""
+    lat = df["Lat"].to_numpy(dtype="float64")
+    lng = df["Lng"].to_numpy(dtype="float64")
+    fill = pd.to_numeric(df["Fill"], errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+    ok = ~(np.isnan(lat) | np.isnan(lng))
+    cells = pd.DataFrame({
+        "cy": np.floor(lat[ok] / cell_deg).astype(np.int64),
+        "cx": np.floor(lng[ok] / cell_deg).astype(np.int64),
+        "Lat": lat[ok],
+        "Lng": lng[ok],
+        "Fill": fill[ok],
+    })
+    agg = cells.groupby(["cy", "cx"], sort=False).agg(
+        Lat=("Lat", "mean"), Lng=("Lng", "mean"),
+        Bins=("Fill", "size"), Fill=("Fill", "mean"), MaxFill=("Fill", "max"),
+    ).reset_index(drop=True)
+    rgba = fill_colors(agg["MaxFill"])
+    agg["r"], agg["g"] = rgba[:, 0], rgba[:, 1]
+    agg["Lat"], agg["Lng"] = agg["Lat"].round(6), agg["Lng"].round(6)
+    agg["Fill"], agg["MaxFill"] = agg["Fill"].round(0), agg["MaxFill"].round(0)
+    return agg
+
 def load_map(data: pd.DataFrame) -> pdk.Deck:
+    """
+    Bin map. Colours are computed as one uint8 array and sent as two small int
+    columns (the [r, g, 0, 200] accessor is evaluated client-side). When the
+    fitted zoom is below MAP_CLUSTER_ZOOM, or there are more than MAP_MAX_POINTS
+    bins, bins are aggregated into grid cells so the payload scales with the
+    number of cells on screen, not the fleet size.
+    """
+    import pydeck as pdk
+
     if data is None or data.empty:
         return pdk.Deck()
     
-    df = data.copy()
-    if "Fill" not in df.columns:
+    if "Fill" not in data.columns:
         st.warning("No Fill column found for map display.")
         return pdk.Deck()
+    if "Lat" not in data.columns or "Lng" not in data.columns:
+        st.warning("No coordinates found for map display.")
+        return pdk.Deck()
 
-    import numpy as np
-    fill = pd.to_numeric(df["Fill"], errors="coerce").fillna(0).clip(0, 100)
-    ratio = fill / 100.0
-
-    df["color"] = [[int(r * 255), int((1 - r) * 255), 0, 200] for r in ratio]
+    view = _fit_view(_rounded(data, "Lat", 6), _rounded(data, "Lng", 6))
+    view_state = pdk.ViewState(**view)
 
-    view_state = pdk.ViewState(
-            latitude=-37.7932,
-            longitude=144.8990,
-            zoom=17
+    if view["zoom"] < MAP_CLUSTER_ZOOM or len(data) > MAP_MAX_POINTS:
+        # ~32px cells at the fitted zoom
+        cell_deg = 360.0 / (2 ** view["zoom"]) / 8
+        cells = aggregate_grid(data, cell_deg)
+        layer = pdk.Layer(
+            "ScatterplotLayer",
+            data = cells,
+            get_position = "[Lng, Lat]",
+            get_fill_color = "[r, g, 0, 200]",
+            get_radius = "Math.sqrt(Bins)",
+            radius_scale = cell_deg * 111_000 / 4,
+            radius_min_pixels = 4,
+            pickable = True
         )
-    
+        tooltip = {
+            "html": (
+                "<b>Bins:</b> {Bins}<br/>"
+                "<b>Mean fill:</b> {Fill}%<br/>"
+                "<b>Fullest bin:</b> {MaxFill}%"
+            ),
+            "style": _TOOLTIP_STYLE,
+        }
+        return pdk.Deck(layers=[layer], initial_view_state=view_state, tooltip=tooltip)
+
     bin_locations_layer = pdk.Layer(
             "ScatterplotLayer",
-            data = df,
-            get_position = ['Lng', 'Lat'],
-            get_fill_color = "color",
+            data = _point_frame(data),
+            get_position = "[Lng, Lat]",
+            get_fill_color = "[r, g, 0, 200]",
             get_radius = 4,
             pickable = True
         )
@@ -117,7 +316,7 @@ def load_map(data: pd.DataFrame) -> pdk.Deck:
             "<b>Temperature:</b> {Temperature}°C<br/>"
             "<b>Battery:</b> {Battery}V"
         ),
-        "style": {"backgroundColor": "rgba(255, 255, 255, 0.8)", "color": "black"},
+        "style": _TOOLTIP_STYLE,
     }
 
     return pdk.Deck(
@@ -126,105 +325,116 @@ def load_map(data: pd.DataFrame) -> pdk.Deck:
             tooltip=tooltip
         )
 
-def render_map_section(map_data: pd.DataFrame):
+def render_map_section(map_data: pd.DataFrame | None = None, *, deck: pdk.Deck | None = None):
     st.subheader("Real Time Bin Monitoring Map")
-    st.pydeck_chart(load_map(map_data))
+    st.pydeck_chart(deck if deck is not None else load_map(map_data))
 
 
 # === URGENT FILTER LOGIC ===
 
-def filter_urgent(df, *, fill_thresh=85, temp_thresh=40, battery_thresh=3.2):
+@lru_cache(maxsize=8)
+def _urgent_rules(fill_thresh, temp_thresh, battery_thresh):
+    return compile_rules(default_rules(
+        fill_thresh=fill_thresh, temp_thresh=temp_thresh, battery_thresh=battery_thresh
+    ))
+
+def filter_urgent(df, *, fill_thresh=85, temp_thresh=40, battery_thresh=3.2, rules=None):
+    """
+    Bins that raise an alert, classified by the declarative rules in Model.alert_rules.
+    Pass rules=compile_rules([...]) to use a custom rule set instead of the thresholds.
+    """
     if df is None or df.empty:
         return pd.DataFrame(columns=["BinID", "Timestamp", "Alert"])
 
-    snap = df.reset_index().copy()
-
-    # Resolve canonical columns coming from data_loader (_rename_ui)
-    # We expect: Fill, Temperature, Battery
-    if "Fill" in snap.columns:
-        snap["Fill"] = pd.to_numeric(snap["Fill"], errors="coerce")
-
-    if "Temperature" in snap.columns:
-        snap["Temperature"] = pd.to_numeric(snap["Temperature"], errors="coerce")
-
-    elif "Temp" in snap.columns:
+    snap = df.reset_index()
+    if "Temperature" not in snap.columns and "Temp" in snap.columns:
         snap = snap.rename(columns={"Temp": "Temperature"})
-        snap["Temperature"] = pd.to_numeric(snap["Temperature"], errors="coerce")
 
-    if "Battery" in snap.columns:
-        snap["Battery"] = pd.to_numeric(snap["Battery"], errors="coerce")
-
-    # Build mask with the SAME columns the classifier will use
-    mask = pd.Series(False, index=snap.index)
-
-    if "Fill" in snap.columns:
-        mask = (snap["Fill"] >= fill_thresh)
-    if "Temperature" in snap.columns:
-        mask = mask | (snap["Temperature"] >= temp_thresh)
-    if "Battery" in snap.columns:
-        mask = mask | (snap["Battery"] <= battery_thresh)
-
-    urgent = snap.loc[mask.fillna(False)].copy()
+    if rules is None:
+        rules = _urgent_rules(fill_thresh, temp_thresh, battery_thresh)
+    urgent = rules.evaluate(snap)
     if urgent.empty:
         return pd.DataFrame(columns=["BinID", "Timestamp", "Alert"])
 
-    def classify(row):
-        f = row.get("Fill")
-        t = row.get("Temperature")
-        b = row.get("Battery")
-
-        # Only if ALL missing do we call it "No sensor response"
-        if pd.isna(f) and pd.isna(t) and pd.isna(b):
-            return "No sensor response"
-
-        if pd.notna(f) and f >= 100:
-            return "Overflowing"
-        if pd.notna(f) and f >= fill_thresh:
-            return f"Approaching full"
-        if pd.notna(t) and t >= temp_thresh:
-            return f"Heat Warning"
-        if pd.notna(b) and b <= battery_thresh:
-            return f"Low Battery"
-        return "Needs attention"
-    
-    if "BinID" not in urgent.columns and urgent.index.name == "BinID":
-        urgent = urgent.reset_index()
-    elif "BinID" not in urgent.columns:
+    if "BinID" not in urgent.columns:
         urgent["BinID"] = urgent.index.astype(str)
-
-    urgent["Alert"] = urgent.apply(classify, axis=1)
+    if "Anomaly" in urgent.columns:
+        fault = (urgent["Alert"] == "Sensor fault").to_numpy()
+        kinds = urgent["Anomaly"].astype(str).str.replace("_", " ")
+        urgent.loc[fault, "Alert"] = "Sensor fault: " + kinds[fault]
 
     keep = [c for c in ["BinID", "Timestamp", "Alert"] if c in urgent.columns]
     return urgent[keep] if keep else urgent
 
 # === ARCHIVE / HISTORY HELPERS ===
 
+def _fetch_archive_with_coords(device_id: str | None, *, since, until, limit: int | None = None) -> pd.DataFrame:
+    since_utc = _to_utc(since)
+    until_utc = _to_utc(until)
+
+    if device_id:
+        return _load_archive_with_coords(
+            device_id,
+            since=since_utc,
+            until=until_utc,
+            limit=limit,
+            with_coords=True,
+        )
+    
+    raw = repo.fetch_archive_df(since=since_utc, until=until_utc, limit=limit)
+    if raw.empty:
+        return raw
+    
+    static = repo.fetch_static_bins_df()
+    merged = raw.merge(static, how="left", on="sensor_id")
+    return merged
+
 def get_archive_with_coords_df(device_id: str | None, *, since, until, limit: int | None = None) -> pd.DataFrame:
     try:
-        since_utc = _to_utc(since)
-        until_utc = _to_utc(until)
-
-        if device_id:
-            return _load_archive_with_coords(
-                device_id,
-                since=_to_utc(since),
-                until=_to_utc(until),
-                limit=limit,
-                with_coords=True,
-            )
-        
-        raw = repo.fetch_archive_df(since=since_utc, until=until_utc, limit=limit)
-        if raw.empty:
-            return raw
-        
-        static = repo.fetch_static_bins_df()
-        merged = raw.merge(static, how="left", on="sensor_id")
-        return merged
-
+        return _fetch_archive_with_coords(device_id, since=since, until=until, limit=limit)
     except Exception as e:
         st.error(f"Error loading merged archive data: {e}")
         return pd.DataFrame()
     
+#Formats prepare_download can write straight from an Arrow table
+ARROW_FORMATS = ("PARQUET", "FEATHER")
+
+def _fetch_archive_arrow(device_id: str | None, *, since, until, limit: int | None = None):
+    return repo.fetch_archive_arrow(
+        since=_to_utc(since),
+        until=_to_utc(until),
+        sensor_ids=[device_id] if device_id else None,
+        limit=limit,
+        with_coords=True,
+    )
+
+def get_archive_arrow(device_id: str | None, *, since, until, limit: int | None = None):
+    """Archive rows with coordinates as a pyarrow Table, or None when the Arrow read path is unavailable."""
+    if not repo.arrow_available():
+        return None
+    try:
+        return _fetch_archive_arrow(device_id, since=since, until=until, limit=limit)
+    except Exception as e:
+        st.error(f"Error loading archive data: {e}")
+        return None
+
+@st.cache_data(max_entries=8, ttl=300, show_spinner=False)
+def fleet_trend(days: int, bucket: str) -> pd.DataFrame:
+    """
+    Fleet-wide readings per time bucket over the last `days`, aggregated in the store
+    rather than in pandas: Time (naive UTC), Readings, Avg Fill, Max Fill, Avg Temperature, Min Battery.
+    """
+    since = datetime.now(timezone.utc) - timedelta(days=days)
+    df = repo.fetch_archive_summary_df(since=since, bucket=bucket, per_sensor=False)
+    return pd.DataFrame({
+        "Time": pd.to_datetime(df["bucket"]),
+        "Readings": df["readings"].astype("int64"),
+        "Avg Fill": pd.to_numeric(df["fill_avg"], errors="coerce").round(1),
+        "Max Fill": pd.to_numeric(df["fill_max"], errors="coerce"),
+        "Avg Temperature": pd.to_numeric(df["temp_avg"], errors="coerce").round(1),
+        "Min Battery": pd.to_numeric(df["battery_min"], errors="coerce"),
+    })
+
 def get_bin_archive_df(sensor_id: str, *, days:int = 1) -> pd.DataFrame:
     since = datetime.now() - timedelta(days=days)
     until = datetime.now()
@@ -246,7 +456,7 @@ def get_bin_archive_df(sensor_id: str, *, days:int = 1) -> pd.DataFrame:
 def download_button_from_df(df: pd.DataFrame, filename: str, label: str, *, key: str | None = None):
     """Render a standard download button for a DataFrame as Excel."""
     disabled = (df is None) or df.empty
-    data = b"" if disabled else df.to_csv(index=False).encode("utf-8")
+    data = b"" if disabled else display_frame(df).to_csv(index=False).encode("utf-8")
     st.download_button(
         label=label,
         data=data,
@@ -256,10 +466,17 @@ def download_button_from_df(df: pd.DataFrame, filename: str, label: str, *, key:
         key=key
     )
 
-def prepare_download(df: pd.DataFrame, fmt: str) -> tuple[bytes, str, str]:
+def prepare_download(df, fmt: str) -> tuple[bytes, str, str]:
+    """Serialise a DataFrame, or a pyarrow Table (written directly for Parquet/Feather), for download."""
     import io
     fmt = fmt.upper()
 
+    if not isinstance(df, pd.DataFrame):
+        if fmt in ARROW_FORMATS:
+            return _prepare_arrow_download(df, fmt)
+        df = df.to_pandas()
+    df = display_frame(df)
+
     data, mime, ext = b"", "text/plain", "txt"
 
     if fmt == "CSV":
@@ -296,6 +513,54 @@ def prepare_download(df: pd.DataFrame, fmt: str) -> tuple[bytes, str, str]:
 
     return data, mime, ext
 
+def _prepare_arrow_download(table, fmt: str) -> tuple[bytes, str, str]:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+
+    sink = pa.BufferOutputStream()
+    if fmt == "PARQUET":
+        pq.write_table(table, sink, compression="zstd")
+        ext = "parquet"
+    else:
+        feather.write_feather(table, sink, compression="zstd")
+        ext = "feather"
+    return sink.getvalue().to_pybytes(), "application/octet-stream", ext
+
+
+# === EXPORT CACHE ===
+
+EXPORT_CACHE_DIR = os.environ.get("EXPORT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "smartbins_exports"))
+EXPORT_CACHE_MAX_MB = int(os.environ.get("EXPORT_CACHE_MAX_MB", "512"))
+
+@st.cache_resource(show_spinner=False)
+def export_cache() -> ExportCache:
+    """Process-wide export cache, shared by every session."""
+    return ExportCache(EXPORT_CACHE_DIR, max_bytes=EXPORT_CACHE_MAX_MB * 1024 * 1024)
+
+def build_export(query: dict, progress) -> tuple[bytes, str, str]:
+    """Build one export file. Runs on an export worker thread, so no st.* calls in here."""
+    device_id = None if query["device"] == "*" else query["device"]
+    window = {k: None if query[k] is None else pd.Timestamp(query[k]).to_pydatetime() for k in ("since", "until")}
+    window["limit"] = query["limit"]
+
+    progress(0.05, "querying archive")
+    #Both paths give the same columns, names and Melbourne times
+    if query["fmt"] in ARROW_FORMATS and repo.arrow_available():
+        data = export_table(_fetch_archive_arrow(device_id, **window))
+    else:
+        data = export_frame(_fetch_archive_with_coords(device_id, **window))
+    if len(data) == 0:
+        raise LookupError("No data found for the selected bin and time window")
+
+    progress(0.6, f"writing {len(data):,} rows as {query['fmt']}")
+    return prepare_download(data, query["fmt"])
+
+def start_export(query: dict):
+    """Queue a background build of query (shared with any session already building it)."""
+    cache = export_cache()
+    return cache.submit(cache.key(query), partial(build_export, query), immutable=is_closed_window(query))
+
 
 # === LAYOUT / UI HELPERS ===
 
@@ -329,6 +594,10 @@ def remove_elements():
         
 # REFRESH CONTROLS
 
+def live_run_every(enabled: bool, interval_sec: int):
+    """run_every value for live fragments (None disables timed reruns)."""
+    return interval_sec if enabled else None
+
 def refresh_button(label: str = "Refresh Now", key: str | None = None) -> bool:
     with st.sidebar:
         return st.button(label, key=key)
@@ -336,19 +605,6 @@ def refresh_button(label: str = "Refresh Now", key: str | None = None) -> bool:
 def auto_refresh_controls(key_prefix=""):
     with st.sidebar:
         enabled = st.toggle("Auto-refresh", value=True, key=f"{key_prefix}auto_refresh_enabled")
-        interval = st.slider("Refresh interval (sec)", 2, 60, 2, key=f"{key_prefix}auto_refresh_interval")
-        st.caption("Dashboard will re-run periodically while enabled.")
+        interval = st.slider("Check for new data every (sec)", 1, 60, 1, key=f"{key_prefix}auto_refresh_interval")
+        st.caption("Live sections refresh on this cadence; they only redo work when new sensor data has arrived.")
     return enabled, interval
-
-def maybe_autorefresh(enabled: bool, interval_sec: int):
-    if not enabled:
-        return
-    try:
-        from streamlit.runtime.scriptrunner import get_script_run_ctx
-        ctx = get_script_run_ctx()
-        if ctx is None:
-            return
-        time.sleep(interval_sec)
-        st.rerun()
-    except Exception as e:
-        st.warning(f"Auto-refresh skipped: {e}")
\ No newline at end of file
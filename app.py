@@ -1,6 +1,7 @@
+import importlib
 import streamlit as st
 from streamlit_option_menu import option_menu
-from View import Dashboard, Analytics
+from Model import metrics
 
 st.set_page_config(
     page_title="Maribyrnong Smart City Bins",
@@ -18,8 +19,16 @@ with st.sidebar:
         default_index=0
     )
 
+#Repository read latencies and pool usage on METRICS_PORT, when set (started once per server process)
+metrics.serve_from_env()
+
 #Display content based on selected page
 
+#Pages are imported on first use, so a cold start only loads the selected page
+#(and its pandas / plotly / pydeck / database dependencies), after the shell renders
+def _page(name: str):
+    return importlib.import_module(f"View.{name}")
+
 #Ensure page placeholders always exist
 if "dash_root" not in st.session_state or st.session_state.get("dash_root") is None:
     st.session_state["dash_root"] = st.empty()
@@ -36,11 +45,11 @@ if selected == "Dashboard":
         st.session_state["dash_root"] = st.empty()
     st.session_state["ana_root"].empty()     # Safe now: guaranteed to exist
     with st.session_state["dash_root"].container():
-        Dashboard.show_dashboard()
+        _page("Dashboard").show_dashboard()
 
 elif selected == "Analytics":
     if not st.session_state.get("ana_root"):
         st.session_state["ana_root"] = st.empty()
     st.session_state["dash_root"].empty()
     with st.session_state["ana_root"].container():
-        Analytics.show_analytics()
\ No newline at end of file
+        _page("Analytics").show_analytics()
\ No newline at end of file
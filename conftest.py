@@ -0,0 +1 @@
+#Lets pytest import Model / Controller from the repository root (tests/ is not a package)
@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from Model.alert_rules import AlertRule, compile_rules, default_rules
+
+
+def _values(col):
+    #No match is None; depending on the pandas version it comes back as NaN
+    return [None if pd.isna(v) else v for v in col]
+
+
+def _snapshot():
+    return pd.DataFrame({
+        "DeviceID": ["a", "b", "c", "d", "e", "f"],
+        "Fill": [100.0, 90.0, 50.0, 20.0, np.nan, 30.0],
+        "Temperature": [45.0, 20.0, 45.0, 20.0, 20.0, 20.0],
+        "Battery": [3.0, 3.6, 3.6, 3.1, 3.6, 3.6],
+        "Anomaly": [None, None, None, None, None, "stuck_fill"],
+    })
+
+
+def test_highest_priority_rule_wins():
+    out = compile_rules(default_rules()).classify(_snapshot())
+    assert _values(out["Alert"]) == [
+        "Overflowing", "Approaching full", "Heat Warning", "Low Battery", None, "Sensor fault",
+    ]
+    assert _values(out["Severity"]) == ["critical", "high", "high", "medium", None, "high"]
+    assert out["Priority"].tolist() == [10, 20, 30, 40, -1, 25]
+
+
+def test_evaluate_keeps_only_alerting_rows():
+    out = compile_rules(default_rules(fill_thresh=95)).evaluate(_snapshot())
+    assert out["DeviceID"].tolist() == ["a", "c", "d", "f"]
+    assert list(out.columns[-3:]) == ["Alert", "Severity", "Priority"]
+
+
+def test_match_any_and_missing_columns():
+    rules = compile_rules([
+        AlertRule("Hot or full", "high", 1, (("Temperature", ">", 40), ("Fill", ">=", 90)), match="any"),
+        AlertRule("No signal", "low", 2, (("Rssi", "isna"),)),
+    ])
+    out = rules.classify(_snapshot())
+    assert out["Alert"].tolist() == ["Hot or full", "Hot or full", "Hot or full", "No signal", "No signal", "No signal"]
+
+
+def test_bad_rules_are_rejected():
+    with pytest.raises(ValueError):
+        compile_rules([AlertRule("x", "low", 1, (("Fill", "~", 1),))])
+    with pytest.raises(ValueError):
+        compile_rules([AlertRule("x", "low", 1, (("Fill", ">", 1),), match="some")])
+
+
+def test_no_rules_matches_nothing():
+    out = compile_rules([]).classify(_snapshot())
+    assert out["Alert"].isna().all()
+
+
+def test_transitions_per_device():
+    history = pd.DataFrame({
+        "DeviceID": ["a"] * 4 + ["b"] * 2,
+        "Timestamp": [4, 1, 2, 3, 1, 2],
+        "Fill": [10.0, 50.0, 90.0, 100.0, 100.0, 100.0],
+        "Temperature": 20.0,
+        "Battery": 3.6,
+    })
+    out = compile_rules(default_rules()).transitions(history)
+    rows = zip(out["DeviceID"], out["Timestamp"], _values(out["Alert"]), _values(out["Previous"]))
+    assert [list(r) for r in rows] == [
+        ["a", 2, "Approaching full", None],
+        ["a", 3, "Overflowing", "Approaching full"],
+        ["a", 4, None, "Overflowing"],
+        #A new device starts from no alert, not from the previous device's state
+        ["b", 1, "Overflowing", None],
+    ]
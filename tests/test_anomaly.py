@@ -0,0 +1,88 @@
+import pandas as pd
+
+from Model import anomaly
+
+
+T0 = pd.Timestamp("2026-03-02 00:00", tz="UTC")
+
+
+def _readings(fills, sensor="S1", every="1h", start=T0, last_emptied=None):
+    ts = pd.date_range(start, periods=len(fills), freq=every)
+    return pd.DataFrame({
+        "sensor_id": sensor,
+        "timestamp": ts,
+        "fill_level_percent": fills,
+        "battery_v": 3.6,
+        "temperature_c": 20.0,
+        "last_emptied": last_emptied,
+    })
+
+
+def _kinds(found, kind):
+    return found[found["kind"] == kind]
+
+
+def test_slow_bin_holding_its_level_is_not_stuck():
+    #0.2 %/profile-hour predicts well under STUCK_EXPECTED_POINTS over 12 hours
+    _, found = anomaly.detect(None, _readings([40.0] * 13), pd.Series({"S1": 0.2}))
+    assert _kinds(found, "stuck_fill").empty
+
+
+def test_stuck_needs_the_minimum_duration():
+    #Fast bin, but only 5 hours held
+    _, found = anomaly.detect(None, _readings([40.0] * 6), pd.Series({"S1": 10.0}))
+    assert _kinds(found, "stuck_fill").empty
+
+
+def test_stuck_reported_once_when_expected_rise_exceeded():
+    readings = _readings([40.0] * 10 + [55.0, 55.0])
+    state, found = anomaly.detect(None, readings, pd.Series({"S1": 3.0}))
+    stuck = _kinds(found, "stuck_fill")
+    assert len(stuck) == 1
+    assert stuck["ts"].iloc[0] == T0 + pd.Timedelta(hours=anomaly.STUCK_MIN_HOURS)
+    #The value moved, so the run restarted and the flag cleared
+    row = state.set_index("sensor_id").loc["S1"]
+    assert not row["stuck_flag"]
+    assert row["fill_since"] == T0 + pd.Timedelta(hours=10)
+
+
+def test_stuck_without_a_rate_is_not_reported():
+    _, found = anomaly.detect(None, _readings([40.0] * 13))
+    assert _kinds(found, "stuck_fill").empty
+
+
+def test_stuck_run_spans_batches():
+    readings = _readings([40.0] * 9)
+    rates = pd.Series({"S1": 3.0})
+    state, first = anomaly.detect(None, readings.iloc[:4], rates)
+    _, second = anomaly.detect(state, readings.iloc[4:], rates)
+    assert _kinds(first, "stuck_fill").empty
+    assert len(_kinds(second, "stuck_fill")) == 1
+
+
+def test_unrecorded_drop():
+    _, found = anomaly.detect(None, _readings([60.0, 30.0]))
+    drop = _kinds(found, "unrecorded_drop")
+    assert len(drop) == 1
+    assert drop["value"].iloc[0] == 30.0
+
+
+def test_drop_with_an_empty_event_is_not_reported():
+    readings = _readings([60.0, 5.0])
+    readings.loc[1, "last_emptied"] = readings.loc[1, "timestamp"]
+    _, found = anomaly.detect(None, readings)
+    assert _kinds(found, "unrecorded_drop").empty
+
+
+def test_rerunning_a_batch_changes_nothing():
+    readings = _readings([40.0] * 8 + [20.0])
+    #The residual diverges and recovers, so a replay that re-applied it would report again
+    readings["weather_temp_c"] = [20.0] * 4 + [0.0] * 3 + [20.0] * 2
+    rates = pd.Series({"S1": 3.0})
+    state, found = anomaly.detect(None, readings, rates)
+    assert set(found["kind"]) == {"stuck_fill", "unrecorded_drop", "temp_divergence"}
+    assert not state["temp_flag"].iloc[0]
+
+    again, found_again = anomaly.detect(state, readings, rates)
+    assert found_again.empty
+    pd.testing.assert_frame_equal(again, state, check_dtype=False)
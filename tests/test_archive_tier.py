@@ -0,0 +1,50 @@
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from Model.archive_tier import ParquetTier
+
+
+def _rows(start, n, sensor="S1"):
+    return pd.DataFrame({
+        "id": range(n),
+        "sensor_id": sensor,
+        "timestamp": pd.date_range(start, periods=n, freq="1h"),
+        "fill_level_percent": 40.0,
+        "temperature_c": 20.0,
+        "battery_v": 3.6,
+        "fill_threshold": 85,
+        "last_emptied": pd.NaT,
+        "overflow": False,
+        "overflow_count": pd.array([1] * (n - 1) + [None], dtype="Int64"),
+        "last_overflow": pd.NaT,
+    })
+
+
+def test_parts_compact_and_read_back_with_archive_types(tmp_path):
+    tier = ParquetTier(tmp_path)
+    tier.begin_month("2026-01")
+    tier.write_part("2026-01", _rows("2026-01-10", 3))
+    #A retried batch lands in a second part; the overlap is kept once
+    tier.write_part("2026-01", _rows("2026-01-10 02:00", 3))
+    assert len(tier.read()) == 5
+
+    assert tier.compact_month("2026-01") == 5
+    table = tier.read(since="2026-01-10 01:00", until="2026-01-10 04:00")
+    assert table.num_rows == 3
+    assert table.schema.field("fill_threshold").type == pa.int32()
+    assert table.schema.field("overflow_count").type == pa.int32()
+    assert tier.boundary() == pd.Timestamp("2026-02-01", tz="UTC")
+
+
+def test_months_written_with_float_columns_still_read(tmp_path):
+    tier = ParquetTier(tmp_path)
+    tier.begin_month("2026-01")
+    tier.begin_month("2026-02")
+    tier.write_part("2026-02", _rows("2026-02-01", 2))
+    old = _rows("2026-01-05", 2).astype({"fill_threshold": "float64", "overflow_count": "float64"})
+    pq.write_table(pa.Table.from_pandas(old, preserve_index=False), tmp_path / "month=2026-01" / "part-0.parquet")
+
+    table = tier.read(columns=["sensor_id", "timestamp", "fill_threshold"])
+    assert table.num_rows == 4
+    assert table.column("fill_threshold").to_pylist() == [85] * 4
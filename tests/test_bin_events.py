@@ -0,0 +1,70 @@
+import pandas as pd
+
+from Model import bin_events
+
+
+T0 = pd.Timestamp("2026-03-02 00:00", tz="UTC")
+EMPTIED = T0 + pd.Timedelta("2h30min")
+OVERFLOWED = T0 + pd.Timedelta("4h10min")
+
+
+def _readings():
+    """One bin: fills, is emptied between readings 2 and 3, then overflows and clears."""
+    ts = pd.date_range(T0, periods=8, freq="1h")
+    return pd.DataFrame({
+        "sensor_id": "S1",
+        "timestamp": ts,
+        "fill_level_percent": [50.0, 70.0, 90.0, 5.0, 60.0, 100.0, 100.0, 10.0],
+        "overflow": [False, False, False, False, False, True, True, False],
+        "overflow_count": [0, 0, 0, 0, 0, 1, 1, 1],
+        "last_emptied": [pd.NaT] * 3 + [EMPTIED] * 4 + [ts[7]],
+        "last_overflow": [pd.NaT] * 5 + [OVERFLOWED] * 3,
+    })
+
+
+def _merge(state, new):
+    if state is None:
+        return new
+    return pd.concat([state[~state["sensor_id"].isin(new["sensor_id"])], new], ignore_index=True)
+
+
+def test_extracts_each_transition_once():
+    _, events = bin_events.extract(None, _readings())
+    assert events["kind"].tolist() == ["emptied", "overflow_start", "emptied", "overflow_clear"]
+    assert events["ts"].tolist()[:2] == [EMPTIED, OVERFLOWED]
+    #Emptied events carry the level before the pickup
+    assert events["fill"].tolist()[0] == 90.0
+
+
+def test_transitions_on_batch_boundaries_match_one_batch():
+    readings = _readings()
+    _, whole = bin_events.extract(None, readings)
+    for cut in range(1, len(readings)):
+        state, first = bin_events.extract(None, readings.iloc[:cut])
+        _, second = bin_events.extract(state, readings.iloc[cut:])
+        split = pd.concat([first, second], ignore_index=True)
+        pd.testing.assert_frame_equal(split, whole, check_dtype=False)
+
+
+def test_one_reading_per_batch():
+    state, found = None, []
+    for i in range(len(_readings())):
+        new, events = bin_events.extract(state, _readings().iloc[[i]])
+        state = _merge(state, new)
+        found.append(events)
+    _, whole = bin_events.extract(None, _readings())
+    split = pd.concat(found, ignore_index=True)
+    pd.testing.assert_frame_equal(split, whole, check_dtype=False)
+
+
+def test_first_reading_only_seeds_state():
+    state, events = bin_events.extract(None, _readings().iloc[[3]])
+    assert events.empty
+    assert state.set_index("sensor_id").loc["S1", "last_emptied"] == EMPTIED
+
+
+def test_replayed_readings_are_ignored():
+    state, _ = bin_events.extract(None, _readings())
+    again, events = bin_events.extract(state, _readings())
+    assert events.empty
+    pd.testing.assert_frame_equal(again, state, check_dtype=False)
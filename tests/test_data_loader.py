@@ -0,0 +1,40 @@
+import pandas as pd
+import pyarrow as pa
+
+from Model.data_loader import EXPORT_COLUMNS, display_frame, export_frame, export_table
+
+
+def _archive():
+    return pd.DataFrame({
+        "id": [7, 8],
+        "sensor_id": ["S1", "S2"],
+        "timestamp": pd.to_datetime(["2026-03-02 00:00", "2026-03-02 01:30"]),
+        "fill_level_percent": [40.4, 101.0],
+        "temperature_c": [21.3, 19.0],
+        "battery_v": [3.6, 3.412],
+        "fill_threshold": [85, 80],
+        "last_emptied": pd.to_datetime([None, "2026-03-01 23:00"]),
+        "overflow": [False, True],
+        "overflow_count": [0, 2],
+        "last_overflow": pd.to_datetime([None, "2026-03-02 01:00"]),
+        "bin_id": ["B1", "B2"],
+        "lat": [-37.81, -37.82],
+        "lng": [144.96, 144.97],
+    })
+
+
+def test_arrow_and_pandas_exports_match():
+    raw = _archive()
+    text = display_frame(export_frame(raw))
+    arrow = export_table(pa.Table.from_pandas(raw, preserve_index=False)).to_pandas()
+
+    assert list(text.columns) == list(arrow.columns) == EXPORT_COLUMNS
+    assert text["Timestamp"].iloc[0] == arrow["Timestamp"].iloc[0] == pd.Timestamp("2026-03-02 11:00", tz="Australia/Melbourne")
+    assert str(arrow["Timestamp"].dt.tz) == "Australia/Melbourne"
+    for c in ("DeviceID", "BinID", "Fill", "Temperature", "Battery", "Overflow #", "Last Emptied"):
+        assert [None if pd.isna(v) else v for v in text[c]] == [None if pd.isna(v) else v for v in arrow[c]], c
+
+
+def test_bin_indexed_frames_keep_their_index_column():
+    ui = export_frame(_archive()).set_index("BinID")
+    assert export_frame(ui).columns[0] == "BinID"
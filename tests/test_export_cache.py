@@ -0,0 +1,85 @@
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+
+from Model.export_cache import ExportCache, is_closed_window, normalise_query
+
+
+def test_equal_queries_share_a_key():
+    naive = normalise_query("S1", "2026-03-01 00:00", pd.Timestamp("2026-03-02 00:00:00.4"), 100, "csv")
+    aware = normalise_query("S1", pd.Timestamp("2026-03-01 11:00", tz="Australia/Melbourne"),
+                            "2026-03-02T00:00:00Z", 100, "CSV")
+    assert ExportCache.key(naive) == ExportCache.key(aware)
+    assert ExportCache.key(naive) != ExportCache.key(normalise_query("S1", naive["since"], naive["until"], 100, "parquet"))
+    assert normalise_query(None, None, None, 0, "csv")["device"] == "*"
+
+
+def test_closed_window():
+    now = datetime(2026, 3, 2, 12, tzinfo=timezone.utc)
+    assert not is_closed_window(normalise_query("S1", None, None, None, "csv"), now=now)
+    assert not is_closed_window(normalise_query("S1", None, now - timedelta(seconds=60), None, "csv"), now=now)
+    assert is_closed_window(normalise_query("S1", None, now - timedelta(hours=1), None, "csv"), now=now)
+
+
+def test_put_get_and_live_expiry(tmp_path):
+    cache = ExportCache(tmp_path, live_ttl_sec=-1)
+    cache.put("a" * 64, b"closed", mime="text/csv", ext="csv", immutable=True)
+    cache.put("b" * 64, b"live", mime="text/csv", ext="csv", immutable=False)
+
+    hit = cache.get("a" * 64)
+    assert hit.read_bytes() == b"closed" and hit.size == 6 and hit.immutable
+    #Live windows expire; their files go with them
+    assert cache.get("b" * 64) is None
+    assert not cache._data_path("b" * 64).exists()
+    assert cache.get("c" * 64) is None
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = ExportCache(tmp_path)
+    keys = [c * 64 for c in "abc"]
+    for i, key in enumerate(keys):
+        cache.put(key, b"x" * 10, mime="text/csv", ext="csv", immutable=True)
+        os.utime(cache._meta_path(key), (1000 + i, 1000 + i))
+    #Reading "a" makes "b" the least recently used
+    assert cache.get(keys[0]) is not None
+    cache.max_bytes = 25
+    assert cache.evict() == 1
+    assert [cache.get(k) is not None for k in keys] == [True, False, True]
+
+
+def test_concurrent_submits_share_one_build(tmp_path):
+    cache = ExportCache(tmp_path)
+    release = threading.Event()
+    calls = []
+
+    def build(progress):
+        calls.append(1)
+        progress(0.5, "querying")
+        release.wait(5)
+        return b"rows", "text/csv", "csv"
+
+    first = cache.submit("d" * 64, build, immutable=True)
+    second = cache.submit("d" * 64, build, immutable=True)
+    assert first is second
+    release.set()
+    assert first.wait(5)
+    assert first.error is None and first.stage == "done" and first.progress == 1.0
+    assert first.artifact.read_bytes() == b"rows"
+    assert len(calls) == 1
+    assert cache.get("d" * 64) is not None
+
+
+def test_failed_build_reports_the_error(tmp_path):
+    cache = ExportCache(tmp_path)
+
+    def build(progress):
+        raise RuntimeError("database down")
+
+    job = cache.submit("e" * 64, build, immutable=True)
+    assert job.wait(5)
+    assert job.stage == "failed" and isinstance(job.error, RuntimeError)
+    assert cache.get("e" * 64) is None
+    #A later request builds again instead of reusing the failed job
+    assert cache.submit("e" * 64, lambda p: (b"ok", "text/csv", "csv"), immutable=True) is not job
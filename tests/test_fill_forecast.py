@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from Model import fill_forecast as ff
+
+
+T0 = pd.Timestamp("2026-03-02 00:00", tz="UTC")
+
+
+def _profile_readings(sensor="S1", base=2.0, start_fill=10.0, steps=8, every="30min", start=T0):
+    """Readings that fill exactly along the traffic profile at `base` %/profile-hour."""
+    ts = pd.date_range(start, periods=steps, freq=every)
+    c = ff.profile_hours(ff._local_hours(ts))
+    fill = start_fill + base * (c - c[0])
+    return pd.DataFrame({"sensor_id": sensor, "timestamp": ts, "fill_level_percent": fill, "fill_threshold": 85})
+
+
+def test_learns_base_rate_from_profile_shaped_fill():
+    state = ff.update_state(None, _profile_readings(base=2.0))
+    row = state.set_index("sensor_id").loc["S1"]
+    assert row["base_rate"] == pytest.approx(2.0)
+    assert row["samples"] == 7
+    assert row["last_ts"] == T0 + pd.Timedelta("3h30min")
+
+
+def test_batches_fold_like_one_batch():
+    readings = pd.concat([_profile_readings("S1", 2.0), _profile_readings("S2", 0.5, start_fill=40)])
+    whole = ff.update_state(None, readings).set_index("sensor_id")
+
+    state = None
+    for _, part in readings.sort_values("timestamp").groupby(np.arange(len(readings)) // 3):
+        new = ff.update_state(state, part)
+        state = new if state is None else pd.concat([state[~state["sensor_id"].isin(new["sensor_id"])], new])
+    split = state.set_index("sensor_id").loc[whole.index]
+
+    pd.testing.assert_frame_equal(split[ff.STATE_COLUMNS[1:]], whole[ff.STATE_COLUMNS[1:]], check_dtype=False)
+
+
+def test_empty_and_stale_readings_do_not_move_the_rate():
+    state = ff.update_state(None, _profile_readings(base=2.0))
+    last = state["last_ts"].iloc[0]
+    emptied = pd.DataFrame({"sensor_id": ["S1"], "timestamp": [last + pd.Timedelta("30min")], "fill_level_percent": [3.0]})
+    after = ff.update_state(state, emptied).iloc[0]
+    assert after["base_rate"] == pytest.approx(2.0)
+    assert after["last_fill"] == 3.0
+    assert after["samples"] == 7
+
+    stale = pd.DataFrame({"sensor_id": ["S1"], "timestamp": [last - pd.Timedelta("1h")], "fill_level_percent": [99.0]})
+    unchanged = ff.update_state(state, stale).iloc[0]
+    assert unchanged["last_ts"] == last
+    assert unchanged["last_fill"] == state["last_fill"].iloc[0]
+
+
+def test_forecast_reaches_threshold_along_the_profile():
+    state = ff.update_state(None, _profile_readings(base=2.0))
+    now = state["last_ts"].iloc[0]
+    fc = ff.forecast(state, now=now).iloc[0]
+
+    fill = state["last_fill"].iloc[0]
+    c_now = ff.profile_hours(ff._local_hours([now]))[0]
+    #Expected fill at the forecast time equals the threshold
+    c_eta = ff.profile_hours(ff._local_hours([now + pd.Timedelta(hours=fc["To Threshold (h)"])]))[0]
+    assert fill + 2.0 * (c_eta - c_now) == pytest.approx(85, abs=0.5)
+    assert fc["To Full (h)"] > fc["To Threshold (h)"] > 0
+    assert fc["Threshold ETA"] == pytest.approx(now.value // 1_000_000 + fc["To Threshold (h)"] * 3_600_000, abs=200_000)
+
+
+def test_forecast_past_threshold_and_not_filling():
+    state = pd.DataFrame({
+        "sensor_id": ["full", "flat"],
+        "last_ts": [T0, T0],
+        "last_fill": [90.0, 20.0],
+        "fill_threshold": [85.0, 85.0],
+        "base_rate": [1.0, 0.0],
+        "samples": [3, 3],
+    })
+    fc = ff.forecast(state, now=T0).set_index("DeviceID")
+    assert fc.loc["full", "To Threshold (h)"] == 0
+    assert np.isnan(fc.loc["flat", "To Threshold (h)"])
+    assert fc.loc["flat", "Threshold ETA"] is pd.NA
@@ -0,0 +1,48 @@
+import base64
+
+import pandas as pd
+
+from Controller import gateway
+from Controller.gateway import Gateway
+from Model.r718x_codec import encode_frame
+
+
+def _uplink(sensor, minute, *, emptied=False, overflow=False):
+    reading = {"fill_level_percent": 40, "temperature_c": 20.0, "battery_v": 3.6,
+               "fill_threshold": 85, "overflow": overflow, "overflow_count": int(overflow)}
+    payload = base64.b64encode(encode_frame(reading, emptied=emptied)).decode()
+    return sensor, f"2026-03-02T00:{minute:02d}:00Z", payload
+
+
+def _batch(*uplinks):
+    ids, times, payloads = (list(c) for c in zip(*uplinks))
+    return ids, times, payloads
+
+
+def test_event_clock_follows_written_batches_only(monkeypatch):
+    monkeypatch.setattr(gateway, "GATEWAY_WRITE_RETRIES", 1)
+    written = []
+
+    def write(rows):
+        if rows["sensor_id"].eq("fail").any():
+            raise RuntimeError("database down")
+        written.append(rows)
+        return len(rows)
+
+    gw = Gateway(workers=1, write=write)
+    clock = gw.clocks[0]
+
+    inserted, errors, bad = gw._write_batch(clock, *_batch(_uplink("fail", 1, emptied=True, overflow=True)))
+    assert (inserted, errors, bad) == (None, 1, 0)
+    #The dropped batch's empty and overflow never reached the archive, so they aren't carried forward
+    inserted, _, _ = gw._write_batch(clock, *_batch(_uplink("fail", 2)))
+    assert inserted is None
+
+    gw.write = lambda rows: written.append(rows) or len(rows)
+    assert gw._write_batch(clock, *_batch(_uplink("fail", 3))) == (1, 0, 0)
+    row = written[-1].iloc[0]
+    assert pd.isna(row["last_emptied"]) and pd.isna(row["last_overflow"])
+
+    gw._write_batch(clock, *_batch(_uplink("ok", 4, emptied=True), _uplink("ok", 5)))
+    gw._write_batch(clock, *_batch(_uplink("ok", 6)))
+    assert written[-1].iloc[0]["last_emptied"] == pd.Timestamp("2026-03-02T00:04:00Z")
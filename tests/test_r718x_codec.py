@@ -0,0 +1,82 @@
+import base64
+
+import numpy as np
+import pytest
+
+from Controller.gateway import decode_uplinks
+from Model import r718x_codec as codec
+from Model.NetvoxR718x import NetvoxR718x
+
+
+COLUMNS = {
+    "fill_level_percent": [0.0, 37.0, 85.0, 100.0],
+    "temperature_c": [-12.34, 0.0, 22.5, 61.07],
+    "battery_v": [3.6, 3.312, 2.95, 3.0],
+    "fill_threshold": [85, 80, 85, 0],
+    "overflow": [False, False, True, True],
+    "overflow_count": [0, 3, 65535, 65537],
+    "emptied": [False, True, False, False],
+}
+
+
+def test_batch_round_trip():
+    buf = codec.encode_frames(COLUMNS)
+    assert len(buf) == 4 * codec.FRAME_SIZE == 48
+    cols = codec.decode_frames(buf)
+    assert cols["valid"].all()
+    for key in ("fill_level_percent", "temperature_c", "battery_v", "fill_threshold", "overflow", "emptied"):
+        np.testing.assert_allclose(cols[key], COLUMNS[key], err_msg=key)
+    #The counter is 16 bits on the wire
+    assert cols["overflow_count"].tolist() == [0, 3, 65535, 1]
+
+
+def test_alarm_flags():
+    cols = codec.decode_frames(codec.encode_frames(COLUMNS))
+    assert cols["fill_alarm"].tolist() == [False, False, True, False]
+    assert cols["low_battery"].tolist() == [False, False, True, False]
+
+
+def test_fill_is_rounded_and_clamped():
+    cols = dict(COLUMNS, fill_level_percent=[-5.0, 37.4, 84.6, 130.0])
+    assert codec.decode_frames(codec.encode_frames(cols))["fill_level_percent"].tolist() == [0, 37, 85, 100]
+
+
+def test_single_frame_matches_batch():
+    reading = NetvoxR718x("S1", fill_level_percent=42.0, temperature_c=18.25, battery_v=3.41).to_dict()
+    frame = codec.encode_frame(reading, emptied=True)
+    assert frame == codec.encode_frames({k: [v] for k, v in reading.items() if k in COLUMNS} | {"emptied": [True]})
+    one = codec.decode_frame(frame)
+    assert one["fill_level_percent"] == 42.0
+    assert one["temperature_c"] == pytest.approx(reading["temperature_c"])
+    assert one["battery_v"] == pytest.approx(3.41)
+    assert one["emptied"] is True
+
+
+def test_frame_is_sixteen_unpadded_base64_chars():
+    b64 = base64.b64encode(codec.encode_frames(COLUMNS)).decode()
+    assert codec.FRAME_B64_LEN == 16 and len(b64) == 64 and "=" not in b64
+    #So each frame's base64 is a slice of the batch's
+    first = base64.b64encode(codec.encode_frame({k: v[0] for k, v in COLUMNS.items()})).decode()
+    assert b64[:16] == first
+
+
+def test_invalid_frames():
+    buf = bytearray(codec.encode_frames(COLUMNS))
+    buf[codec.FRAME_SIZE + 1] = 0x00
+    with pytest.raises(codec.FrameError):
+        codec.decode_frames(bytes(buf))
+    assert codec.decode_frames(bytes(buf), strict=False)["valid"].tolist() == [True, False, True, True]
+    with pytest.raises(codec.FrameError):
+        codec.decode_frames(bytes(buf[:-1]))
+    with pytest.raises(codec.FrameError):
+        codec.decode_frame(bytes(buf[:codec.FRAME_SIZE * 2]))
+
+
+def test_decode_uplinks_drops_bad_payloads():
+    frames = [base64.b64encode(codec.encode_frame({k: v[i] for k, v in COLUMNS.items()})).decode() for i in range(3)]
+    payloads = [frames[0], "!!!!notbase64!!!", frames[2]]
+    times = ["2026-03-02T00:00:00Z", "2026-03-02T00:01:00Z", None]
+    df = decode_uplinks(["a", "b", "c"], times, payloads)
+    assert df["sensor_id"].tolist() == ["a", "c"]
+    assert df["fill_level_percent"].tolist() == [0.0, 85.0]
+    assert df["timestamp"].notna().all()
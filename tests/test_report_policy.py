@@ -0,0 +1,78 @@
+import pandas as pd
+
+from Model.report_policy import ReportGate, ReportPolicy
+
+
+T0 = pd.Timestamp("2026-03-02 00:00", tz="UTC")
+
+
+def _row(minutes=0, sensor="S1", **kw):
+    row = {
+        "sensor_id": sensor,
+        "timestamp": T0 + pd.Timedelta(minutes=minutes),
+        "fill_level_percent": 40.0,
+        "temperature_c": 20.0,
+        "battery_v": 3.6,
+        "last_emptied": pd.NaT,
+        "overflow": False,
+        "overflow_count": 0,
+        "fill_threshold": 85,
+    }
+    row.update(kw)
+    return row
+
+
+def test_first_row_is_sent():
+    assert ReportPolicy().reason(None, _row()) == "first"
+
+
+def test_deadbands():
+    p = ReportPolicy(fill_deadband=2.0, temp_deadband=1.0, battery_deadband=0.01)
+    last = _row()
+    assert p.reason(last, _row(5, fill_level_percent=41.9)) is None
+    assert p.reason(last, _row(5, fill_level_percent=42.0)) == "fill"
+    assert p.reason(last, _row(5, fill_level_percent=38.0)) == "fill"
+    assert p.reason(last, _row(5, temperature_c=20.5)) is None
+    assert p.reason(last, _row(5, temperature_c=21.0)) == "temperature"
+    assert p.reason(last, _row(5, battery_v=3.59)) == "battery"
+
+
+def test_events_bypass_deadbands():
+    p = ReportPolicy()
+    last = _row()
+    assert p.reason(last, _row(5, last_emptied=T0)) == "event"
+    assert p.reason(last, _row(5, overflow=True)) == "event"
+    assert p.reason(last, _row(5, fill_threshold=90)) == "event"
+
+
+def test_heartbeat_counts_the_next_tick():
+    p = ReportPolicy(heartbeat_sec=1800)
+    last = _row()
+    assert p.reason(last, _row(25)) is None
+    #The next tick (10 min away) would leave the gap past the heartbeat, so send now
+    assert p.reason(last, _row(25), horizon_sec=600) == "heartbeat"
+    assert p.reason(last, _row(31)) == "heartbeat"
+
+
+def test_gate_measures_deadband_from_the_last_sent_row():
+    gate = ReportGate(ReportPolicy(fill_deadband=2.0, heartbeat_sec=3600))
+    #Creeping 1 point per tick: each step is under the deadband, the drift is not
+    rows = [_row(m, fill_level_percent=40.0 + m / 5) for m in range(0, 30, 5)]
+    sent = gate.filter(rows)
+    assert [r["fill_level_percent"] for r in sent] == [40.0, 42.0, 44.0]
+    assert (gate.sent, gate.suppressed) == (3, 3)
+
+
+def test_gate_policies_are_per_sensor():
+    gate = ReportGate(ReportPolicy(fill_deadband=10.0))
+    gate.set_policy("S2", ReportPolicy(fill_deadband=1.0))
+    gate.filter([_row(sensor="S1"), _row(sensor="S2")])
+    sent = gate.filter([_row(5, sensor="S1", fill_level_percent=45.0), _row(5, sensor="S2", fill_level_percent=45.0)])
+    assert [r["sensor_id"] for r in sent] == ["S2"]
+
+
+def test_seeded_archive_row_with_naive_timestamps():
+    gate = ReportGate(ReportPolicy(heartbeat_sec=1800))
+    gate.seed(_row(timestamp=T0.tz_localize(None), last_emptied=T0.tz_localize(None)))
+    assert gate.filter([_row(10, last_emptied=T0)]) == []
+    assert len(gate.filter([_row(40, last_emptied=T0)])) == 1
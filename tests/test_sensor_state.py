@@ -0,0 +1,34 @@
+import pandas as pd
+
+from Model import sensor_state
+
+
+T0 = pd.Timestamp("2026-03-02 00:00", tz="UTC")
+TEMPLATE = sensor_state.empty_state({"sensor_id": "object", "last_ts": "datetime64[ns, UTC]", "n": "int64"})
+
+
+def _readings(rows):
+    return pd.DataFrame(rows, columns=["sensor_id", "timestamp"]).assign(
+        timestamp=lambda df: T0 + pd.to_timedelta(df["timestamp"], unit="h"))
+
+
+def test_batch_state_adds_new_sensors():
+    state = pd.DataFrame({"sensor_id": ["S1", "S9"], "last_ts": [T0.isoformat()] * 2, "n": [3, 4]})
+    st = sensor_state.batch_state(state, pd.Series(["S2", "S1", "S2"]), TEMPLATE)
+    assert st.index.tolist() == ["S1", "S2"]
+    assert st.loc["S1", "last_ts"] == T0 and pd.isna(st.loc["S2", "last_ts"])
+
+
+def test_stale_readings_are_dropped_before_the_rounds():
+    st = sensor_state.batch_state(pd.DataFrame({"sensor_id": ["S1"], "last_ts": [T0], "n": [1]}),
+                                  pd.Series(["S1", "S2"]), TEMPLATE)
+    rd = sensor_state.drop_stale(_readings([("S1", 2), ("S1", 0), ("S2", 1), ("S1", 1), ("S2", 1), ("S1", -1)]), st)
+    assert list(zip(rd["sensor_id"], rd["timestamp"].dt.hour)) == [("S2", 1), ("S1", 1), ("S1", 2)]
+
+    seen = []
+    for prev, rnd in sensor_state.rounds(st, rd):
+        seen.append((prev["last_ts"].isna().tolist(), rnd.index.tolist()))
+        st.loc[rnd.index, "last_ts"] = rnd["timestamp"]
+    #The second round sees what the first one wrote
+    assert seen == [([True, False], ["S2", "S1"]), ([False], ["S1"])]
+    assert st.loc["S1", "last_ts"] == T0 + pd.Timedelta(hours=2)
@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+
+from Model.spatial_index import BinGridIndex, haversine_m
+
+
+def _bins(n=500, seed=1):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "bin_id": [f"B{i}" for i in range(n)],
+        "sensor_id": [f"S{i}" for i in range(n)],
+        "lat": rng.uniform(-37.83, -37.79, n),
+        "lng": rng.uniform(144.93, 144.99, n),
+    })
+
+
+def test_within_bbox_matches_a_full_scan():
+    bins = _bins()
+    index = BinGridIndex(bins, cell_deg=0.002)
+    for box in [(-37.82, 144.95, -37.80, 144.97), (-37.7950, 144.9301, -37.7901, 144.9333), (-38, 144, -37, 146)]:
+        min_lat, min_lng, max_lat, max_lng = box
+        expected = bins[bins["lat"].between(min_lat, max_lat) & bins["lng"].between(min_lng, max_lng)]
+        got = index.within_bbox(*box)
+        assert sorted(got["sensor_id"]) == sorted(expected["sensor_id"])
+
+
+def test_huge_bbox_falls_back_to_every_bin():
+    index = BinGridIndex(_bins(50), cell_deg=0.0001)
+    assert len(index.within_bbox(-90, -180, 90, 180)) == 50
+
+
+def test_nearest_matches_brute_force():
+    bins = _bins()
+    index = BinGridIndex(bins, cell_deg=0.001)
+    for lat, lng in [(-37.81, 144.96), (-37.70, 145.10), (-37.83, 144.93)]:
+        d = haversine_m(lat, lng, bins["lat"].to_numpy(), bins["lng"].to_numpy())
+        expected = bins["sensor_id"].to_numpy()[np.argsort(d, kind="stable")[:7]]
+        got = index.nearest(lat, lng, k=7)
+        assert got["sensor_id"].tolist() == expected.tolist()
+        np.testing.assert_allclose(got["distance_m"], np.sort(d)[:7])
+
+
+def test_nearest_edge_cases():
+    index = BinGridIndex(_bins(3))
+    assert len(index.nearest(-37.81, 144.96, k=10)) == 3
+    assert index.nearest(-37.81, 144.96, k=0).empty
+    empty = BinGridIndex(_bins(0))
+    assert len(empty) == 0 and empty.nearest(0, 0).empty and empty.within_bbox(-90, -180, 90, 180).empty
+
+
+def test_bins_without_coordinates_are_skipped():
+    bins = _bins(5)
+    bins.loc[2, "lat"] = np.nan
+    assert len(BinGridIndex(bins)) == 4
+
+
+def test_per_cell_counts_and_means():
+    bins = pd.DataFrame({
+        "bin_id": ["a", "b", "c"],
+        "sensor_id": ["S1", "S2", "S3"],
+        "lat": [-37.8105, -37.8101, -37.8005],
+        "lng": [144.9601, 144.9609, 144.9605],
+    })
+    index = BinGridIndex(bins, cell_deg=0.001)
+    live = pd.DataFrame({"Fill": [20.0, 60.0, 90.0]}, index=pd.Index(["S1", "S2", "S3"], name="DeviceID"))
+    cells = index.per_cell(live)
+    assert cells["bins"].tolist() == [2, 1]
+    assert cells["mean_fill"].tolist() == [40.0, 90.0]
+    assert index.per_cell(cell_deg=0.1)["bins"].tolist() == [3]